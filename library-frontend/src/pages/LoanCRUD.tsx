@@ -24,6 +24,8 @@ export default function LoanCRUD() {
   const [books, setBooks] = useState<Book[]>([]);
   const [members, setMembers] = useState<Member[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
   const [editingLoan, setEditingLoan] = useState<Loan | null>(null);
@@ -52,11 +54,15 @@ export default function LoanCRUD() {
       setLoading(true);
       const [loansRes, membersRes, booksRes] = await Promise.all([
         axios.get("http://localhost:8000/api/method/library_management.api.loan.get_loans", { withCredentials: true }),
-        axios.get("http://localhost:8000/api/method/library_management.api.member.get_members", { withCredentials: true }),
+        axios.get("http://localhost:8000/api/method/library_management.api.member.get_members", {
+          params: { page_length: 500 },
+          withCredentials: true,
+        }),
         axios.get("http://localhost:8000/api/method/library_management.api.book.get_books", { withCredentials: true }),
       ]);
-      setLoans(loansRes.data.message);
-      setMembers(membersRes.data.message);
+      setLoans(loansRes.data.message.data);
+      setNextCursor(loansRes.data.message.next_cursor);
+      setMembers(membersRes.data.message.data);
       setBooks(booksRes.data.message);
     } catch {
       setError("❌ Could not fetch data. Please check your connection or permissions.");
@@ -65,6 +71,23 @@ export default function LoanCRUD() {
     }
   };
 
+  const loadMoreLoans = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const res = await axios.get("http://localhost:8000/api/method/library_management.api.loan.get_loans", {
+        params: { cursor: nextCursor },
+        withCredentials: true,
+      });
+      setLoans((prev) => [...prev, ...res.data.message.data]);
+      setNextCursor(res.data.message.next_cursor);
+    } catch {
+      setError("❌ Could not load more loans.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleInputChange = (e: React.ChangeEvent<HTMLInputElement | HTMLSelectElement>) => {
     setForm({ ...form, [e.target.name]: e.target.value });
     setError(null);
@@ -307,6 +330,15 @@ export default function LoanCRUD() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <button
+              onClick={loadMoreLoans}
+              disabled={loadingMore}
+              className="mt-3 px-4 py-2 border rounded hover:bg-gray-50 disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          )}
         </div>
       )}
     </div>
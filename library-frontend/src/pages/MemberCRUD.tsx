@@ -12,6 +12,9 @@ type Member = {
 export default function MemberCRUD() {
   const [members, setMembers] = useState<Member[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [search, setSearch] = useState("");
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
   const [editingMember, setEditingMember] = useState<Member | null>(null);
@@ -32,8 +35,28 @@ export default function MemberCRUD() {
   const isLibrarian = roles.includes("Librarian");
 
   useEffect(() => {
-    fetchMembers();
-  }, []);
+    const query = search.trim();
+    if (!query) {
+      fetchMembers();
+      return;
+    }
+    // Wait for a pause in typing before querying the search index
+    const timer = setTimeout(() => searchMembers(query), 250);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  const searchMembers = async (query: string) => {
+    try {
+      const res = await axios.get(
+        "http://localhost:8000/api/method/library_management.api.member.search_members",
+        { params: { query, limit: 50 }, withCredentials: true }
+      );
+      setMembers(res.data.message);
+      setNextCursor(null);
+    } catch {
+      setError("❌ Failed to search members.");
+    }
+  };
 
   const fetchMembers = async () => {
     try {
@@ -42,7 +65,8 @@ export default function MemberCRUD() {
         "http://localhost:8000/api/method/library_management.api.member.get_members",
         { withCredentials: true }
       );
-      setMembers(res.data.message);
+      setMembers(res.data.message.data);
+      setNextCursor(res.data.message.next_cursor);
     } catch {
       setError("❌ Failed to load members. Please check your permissions.");
     } finally {
@@ -50,6 +74,23 @@ export default function MemberCRUD() {
     }
   };
 
+  const loadMoreMembers = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const res = await axios.get(
+        "http://localhost:8000/api/method/library_management.api.member.get_members",
+        { params: { cursor: nextCursor }, withCredentials: true }
+      );
+      setMembers((prev) => [...prev, ...res.data.message.data]);
+      setNextCursor(res.data.message.next_cursor);
+    } catch {
+      setError("❌ Failed to load more members.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleInputChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     setForm({ ...form, [e.target.name]: e.target.value });
     setError(null);
@@ -253,6 +294,13 @@ export default function MemberCRUD() {
       )}
 
       <h3 className="text-lg font-semibold mb-2">Member List</h3>
+      <input
+        type="search"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        placeholder="Search by name, membership ID, email or phone"
+        className="w-full md:w-1/2 border rounded px-3 py-2 mb-3"
+      />
       {loading ? (
         <p>Loading members...</p>
       ) : members.length === 0 ? (
@@ -296,6 +344,15 @@ export default function MemberCRUD() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <button
+              onClick={loadMoreMembers}
+              disabled={loadingMore}
+              className="mt-3 px-4 py-2 border rounded hover:bg-gray-50 disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -25,6 +25,8 @@ export default function ReservationCRUD() {
   const [books, setBooks] = useState<Book[]>([]);
   const [members, setMembers] = useState<Member[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
   const [form, setForm] = useState({ book: "", member: "" });
@@ -46,7 +48,8 @@ export default function ReservationCRUD() {
         "http://localhost:8000/api/method/library_management.api.reservation.get_reservations",
         { withCredentials: true }
       );
-      setReservations(res.data.message);
+      setReservations(res.data.message.data);
+      setNextCursor(res.data.message.next_cursor);
       setError(null);
     } catch {
       setError("❌ Failed to load reservations.");
@@ -55,6 +58,23 @@ export default function ReservationCRUD() {
     }
   };
 
+  const loadMoreReservations = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const res = await axios.get(
+        "http://localhost:8000/api/method/library_management.api.reservation.get_reservations",
+        { params: { cursor: nextCursor }, withCredentials: true }
+      );
+      setReservations((prev) => [...prev, ...res.data.message.data]);
+      setNextCursor(res.data.message.next_cursor);
+    } catch {
+      setError("❌ Failed to load more reservations.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchBooks = async () => {
     try {
       const res = await axios.get(
@@ -277,6 +297,15 @@ export default function ReservationCRUD() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <button
+              onClick={loadMoreReservations}
+              disabled={loadingMore}
+              className="mt-3 px-4 py-2 border rounded hover:bg-gray-50 disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          )}
         </div>
       )}
     </div>
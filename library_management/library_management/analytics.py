@@ -0,0 +1,305 @@
+# file: library_management/analytics.py
+#
+# Circulation analytics rollups.
+#
+# `__loan_rollup` holds pre-aggregated loan counts keyed by
+# (dimension, period, key). A loan counts in the period of its loan date:
+#   day     - per day, key ""
+#   month   - per month, key ""
+#   book    - per month and book
+#   author  - per month and the book's author
+#   member  - per month and member (loans of that member)
+#   members - per month, key "": number of members with a loan that month
+# `loans` is the number of loans and `loan_days` the sum of their lengths in
+# days (return date - loan date + 1), so averages are loan_days / loans.
+#
+# Loan (and Book author) doc_events and the bulk loan endpoints apply each
+# write as a delta: the old version of the loan is subtracted and the new one
+# added. A nightly job recomputes the most recent RECONCILE_MONTHS from both
+# loan tiers to repair any drift, e.g. from writes that bypass the hooks.
+# Archiving moves loans out of `tabLoan` without touching the rollups, so
+# archived loans stay counted.
+#
+# Analytics endpoints read only this table: a five-year monthly trend is 60
+# `month` rows plus 60 `members` rows.
+
+import frappe
+from frappe.utils import add_months, cint, date_diff, get_first_day, getdate, nowdate
+
+from library_management.loan_archive import history_query
+
+ROLLUP_TABLE = "__loan_rollup"
+RECONCILE_MONTHS = 3
+
+DAY = "day"
+MONTH = "month"
+BOOK = "book"
+AUTHOR = "author"
+MEMBER = "member"
+MEMBERS = "members"
+
+# Loan fields a rollup depends on.
+_LOAN_FIELDS = ("book", "member", "loan_date", "return_date", "docstatus")
+# The first day of the month of `loan_date`, without DATE_FORMAT's % signs.
+_MONTH_SQL = "DATE_SUB(`loan_date`, INTERVAL DAYOFMONTH(`loan_date`) - 1 DAY)"
+_LOAN_DAYS_SQL = "IFNULL(DATEDIFF(`return_date`, `loan_date`) + 1, 0)"
+
+
+def create_rollup_table():
+    """Create the analytics rollup table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{ROLLUP_TABLE}` (
+            `dimension` VARCHAR(8) NOT NULL,
+            `period` DATE NOT NULL,
+            `key` VARCHAR(140) NOT NULL DEFAULT '',
+            `loans` INT NOT NULL DEFAULT 0,
+            `loan_days` BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (`dimension`, `period`, `key`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def apply(removed=(), added=()):
+    """Subtract the loans in `removed` and add those in `added` (dicts with _LOAN_FIELDS).
+
+    Cancelled loans (docstatus 2) contribute nothing, so passing the before
+    and after versions of an edited loan applies exactly the change.
+    """
+    removed = [loan for loan in removed if loan]
+    added = [loan for loan in added if loan]
+    authors = _authors({loan.get("book") for loan in removed + added})
+
+    deltas = {}
+    _add_contributions(deltas, removed, -1, authors)
+    _add_contributions(deltas, added, 1, authors)
+    deltas = {key: delta for key, delta in deltas.items() if delta != [0, 0]}
+    if not deltas:
+        return
+
+    # Keep the distinct-member counts in step with the per-member rows.
+    member_keys = [key for key, delta in deltas.items() if key[0] == MEMBER and delta[0]]
+    before = _member_loans(member_keys)
+    _upsert(deltas)
+
+    active = {}
+    for key in member_keys:
+        old = before.get(key, 0)
+        new = old + deltas[key][0]
+        if old <= 0 < new:
+            active[key[1]] = active.get(key[1], 0) + 1
+        elif new <= 0 < old:
+            active[key[1]] = active.get(key[1], 0) - 1
+    active = {(MEMBERS, period, ""): [count, 0] for period, count in active.items() if count}
+    _upsert(active)
+    _delete_empty([*deltas, *active])
+
+
+def reconcile(months=RECONCILE_MONTHS):
+    """Recompute the rollups of loans from the last `months` months (all history if None) from both tiers.
+
+    Returns the first period recomputed (None for all history).
+    """
+    create_rollup_table()
+    since = get_first_day(add_months(nowdate(), -cint(months))) if months else None
+
+    period_filter = "WHERE `period` >= %(since)s" if since else ""
+    frappe.db.sql(f"DELETE FROM `{ROLLUP_TABLE}` {period_filter}", {"since": since})
+
+    where = "WHERE `docstatus` < 2" + (" AND `loan_date` >= %(since)s" if since else "")
+    loans = f"({history_query(where)}) l"
+    for dimension, period, key, join in (
+        (DAY, "`loan_date`", "''", ""),
+        (MONTH, _MONTH_SQL, "''", ""),
+        (BOOK, _MONTH_SQL, "l.`book`", ""),
+        (AUTHOR, _MONTH_SQL, "IFNULL(b.`author`, '')", "LEFT JOIN `tabBook` b ON b.`name` = l.`book`"),
+        (MEMBER, _MONTH_SQL, "l.`member`", ""),
+    ):
+        frappe.db.sql(f"""
+            INSERT INTO `{ROLLUP_TABLE}` (`dimension`, `period`, `key`, `loans`, `loan_days`)
+            SELECT %(dimension)s, {period} AS p, {key} AS k, COUNT(*), SUM({_LOAN_DAYS_SQL})
+            FROM {loans} {join}
+            GROUP BY p, k
+        """, {"dimension": dimension, "since": since})
+
+    frappe.db.sql(f"""
+        INSERT INTO `{ROLLUP_TABLE}` (`dimension`, `period`, `key`, `loans`, `loan_days`)
+        SELECT %(dimension)s, `period`, '', COUNT(*), 0
+        FROM `{ROLLUP_TABLE}`
+        WHERE `dimension` = %(member)s {"AND `period` >= %(since)s" if since else ""}
+        GROUP BY `period`
+    """, {"dimension": MEMBERS, "member": MEMBER, "since": since})
+    frappe.db.commit()
+    return since
+
+
+def reconcile_recent():
+    """Nightly job: recompute the last RECONCILE_MONTHS of rollups."""
+    reconcile(RECONCILE_MONTHS)
+
+
+# ---------------- Queries ----------------
+
+def get_trend(from_date, to_date, interval=MONTH):
+    """[{period, loans, avg_loan_days, active_members}] per day or month, oldest first.
+
+    active_members is only available per month.
+    """
+    dimension = DAY if interval == DAY else MONTH
+    rows = frappe.db.sql(f"""
+        SELECT t.`period`, t.`loans`, t.`loan_days` / NULLIF(t.`loans`, 0) AS avg_loan_days,
+            m.`loans` AS active_members
+        FROM `{ROLLUP_TABLE}` t
+        LEFT JOIN `{ROLLUP_TABLE}` m
+            ON m.`dimension` = %(members)s AND m.`period` = t.`period` AND m.`key` = ''
+        WHERE t.`dimension` = %(dimension)s AND t.`key` = ''
+            AND t.`period` BETWEEN %(from_date)s AND %(to_date)s
+        ORDER BY t.`period`
+    """, {
+        "dimension": dimension,
+        "members": MEMBERS,
+        "from_date": _period_start(from_date, dimension),
+        "to_date": getdate(to_date),
+    }, as_dict=True)
+    if dimension == DAY:
+        for row in rows:
+            row.pop("active_members", None)
+    return rows
+
+
+def get_top(dimension, from_date, to_date, limit=10):
+    """[{key, loans, avg_loan_days}] of the books, authors or members with the most loans in the range."""
+    return frappe.db.sql(f"""
+        SELECT `key`, SUM(`loans`) AS loans, SUM(`loan_days`) / NULLIF(SUM(`loans`), 0) AS avg_loan_days
+        FROM `{ROLLUP_TABLE}`
+        WHERE `dimension` = %(dimension)s AND `period` BETWEEN %(from_date)s AND %(to_date)s
+        GROUP BY `key`
+        HAVING loans > 0
+        ORDER BY loans DESC, `key`
+        LIMIT %(limit)s
+    """, {
+        "dimension": dimension,
+        "from_date": _period_start(from_date, MONTH),
+        "to_date": getdate(to_date),
+        "limit": cint(limit),
+    }, as_dict=True)
+
+
+# ---------------- doc_events ----------------
+
+def on_loan_update(doc, method=None):
+    previous = doc.get_doc_before_save()
+    if previous and all(previous.get(f) == doc.get(f) for f in _LOAN_FIELDS):
+        return
+    apply(removed=[previous], added=[doc])
+
+
+def on_loan_cancel(doc, method=None):
+    apply(removed=[_as_active(doc)])
+
+
+def on_loan_trash(doc, method=None):
+    if doc.docstatus < 2:
+        apply(removed=[doc])
+
+
+def on_book_update(doc, method=None):
+    """Move a book's loans to its new author when the author changes."""
+    previous = doc.get_doc_before_save()
+    if not previous or previous.author == doc.author:
+        return
+
+    deltas = {}
+    for period, loans, loan_days in frappe.db.sql(f"""
+        SELECT `period`, `loans`, `loan_days`
+        FROM `{ROLLUP_TABLE}`
+        WHERE `dimension` = %s AND `key` = %s
+    """, (BOOK, doc.name)):
+        for author, sign in ((previous.author or "", -1), (doc.author or "", 1)):
+            delta = deltas.setdefault((AUTHOR, period, author), [0, 0])
+            delta[0] += sign * loans
+            delta[1] += sign * loan_days
+    _upsert(deltas)
+    _delete_empty(list(deltas))
+
+
+def on_rename(doc, method=None, old=None, new=None, merge=False):
+    """Follow a renamed Book or Member in its rollup keys (Book/Member after_rename)."""
+    if merge:
+        # Rows of both names would collide; the nightly reconcile rebuilds recent months.
+        return
+    dimension = BOOK if doc.doctype == "Book" else MEMBER
+    frappe.db.sql(f"""
+        UPDATE `{ROLLUP_TABLE}` SET `key` = %s WHERE `dimension` = %s AND `key` = %s
+    """, (new, dimension, old))
+
+
+def _as_active(doc):
+    # on_cancel sees docstatus 2 already; the rollups still count the loan.
+    return frappe._dict({f: doc.get(f) for f in _LOAN_FIELDS}, docstatus=1)
+
+
+def _add_contributions(deltas, loans, sign, authors):
+    for loan in loans:
+        if cint(loan.get("docstatus")) == 2 or not loan.get("loan_date"):
+            continue
+        day = getdate(loan.get("loan_date"))
+        month = get_first_day(day)
+        days = date_diff(loan.get("return_date"), day) + 1 if loan.get("return_date") else 0
+        for key in (
+            (DAY, day, ""),
+            (MONTH, month, ""),
+            (BOOK, month, loan.get("book") or ""),
+            (AUTHOR, month, authors.get(loan.get("book")) or ""),
+            (MEMBER, month, loan.get("member") or ""),
+        ):
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += sign
+            delta[1] += sign * days
+
+
+def _authors(books):
+    books = tuple(filter(None, books))
+    if not books:
+        return {}
+    return dict(frappe.db.sql("SELECT `name`, `author` FROM `tabBook` WHERE `name` IN %s", (books,)))
+
+
+def _upsert(deltas):
+    if not deltas:
+        return
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(deltas))
+    frappe.db.sql(f"""
+        INSERT INTO `{ROLLUP_TABLE}` (`dimension`, `period`, `key`, `loans`, `loan_days`)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            `loans` = `loans` + VALUES(`loans`),
+            `loan_days` = `loan_days` + VALUES(`loan_days`)
+    """, [value for key, (loans, loan_days) in deltas.items() for value in (*key, loans, loan_days)])
+
+
+def _member_loans(keys):
+    """Current loan counts of (MEMBER, period, member) keys, locked until commit."""
+    if not keys:
+        return {}
+    conditions = " OR ".join(["(`period` = %s AND `key` = %s)"] * len(keys))
+    rows = frappe.db.sql(f"""
+        SELECT `period`, `key`, `loans`
+        FROM `{ROLLUP_TABLE}`
+        WHERE `dimension` = %s AND ({conditions})
+        FOR UPDATE
+    """, [MEMBER, *(v for _dimension, period, key in keys for v in (period, key))])
+    return {(MEMBER, getdate(period), key): loans for period, key, loans in rows}
+
+
+def _delete_empty(keys):
+    if not keys:
+        return
+    conditions = " OR ".join(["(`dimension` = %s AND `period` = %s AND `key` = %s)"] * len(keys))
+    frappe.db.sql(f"""
+        DELETE FROM `{ROLLUP_TABLE}` WHERE `loans` <= 0 AND ({conditions})
+    """, [v for key in keys for v in key])
+
+
+def _period_start(value, dimension):
+    value = getdate(value)
+    return get_first_day(value) if dimension == MONTH else value
@@ -0,0 +1,71 @@
+# file: library_management/api/analytics_api.py
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, add_days, cint, getdate, nowdate
+from frappe.exceptions import PermissionError, ValidationError
+from library_management.principal import get_principal
+from library_management import analytics
+
+DEFAULT_MONTHS = 12
+MAX_TOP = 100
+
+
+@frappe.whitelist(allow_guest=False)
+def get_loan_trend(from_date=None, to_date=None, interval="month"):
+    """Loans, average loan length and (monthly) active members per day or month.
+
+    Defaults to the last DEFAULT_MONTHS months. Read from the analytics
+    rollups, so a multi-year trend is one row per period.
+    """
+    _check_librarian()
+    if interval not in (analytics.DAY, analytics.MONTH):
+        frappe.throw(_("Interval must be 'day' or 'month'."), ValidationError)
+
+    from_date, to_date = _date_range(from_date, to_date)
+    return analytics.get_trend(from_date, to_date, interval)
+
+
+@frappe.whitelist(allow_guest=False)
+def get_top_books(from_date=None, to_date=None, limit=10):
+    """The most borrowed books in the date range, with their titles and average loan length."""
+    _check_librarian()
+
+    from_date, to_date = _date_range(from_date, to_date)
+    rows = analytics.get_top(analytics.BOOK, from_date, to_date, _limit(limit))
+    titles = dict(frappe.db.sql("""
+        SELECT `name`, `title` FROM `tabBook` WHERE `name` IN %(books)s
+    """, {"books": tuple(row.key for row in rows)})) if rows else {}
+    return [
+        {"book": row.key, "title": titles.get(row.key), "loans": row.loans, "avg_loan_days": row.avg_loan_days}
+        for row in rows
+    ]
+
+
+@frappe.whitelist(allow_guest=False)
+def get_author_loan_lengths(from_date=None, to_date=None, limit=50):
+    """Loans and average loan length per author in the date range, most borrowed first."""
+    _check_librarian()
+
+    from_date, to_date = _date_range(from_date, to_date)
+    return [
+        {"author": row.key, "loans": row.loans, "avg_loan_days": row.avg_loan_days}
+        for row in analytics.get_top(analytics.AUTHOR, from_date, to_date, _limit(limit))
+    ]
+
+
+def _check_librarian():
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can view circulation analytics."))
+
+
+def _date_range(from_date, to_date):
+    to_date = getdate(to_date or nowdate())
+    from_date = getdate(from_date or add_days(add_months(to_date, -DEFAULT_MONTHS), 1))
+    if to_date < from_date:
+        frappe.throw(_("The end date cannot be before the start date."), ValidationError)
+    return from_date, to_date
+
+
+def _limit(limit):
+    return min(max(cint(limit), 1), MAX_TOP)
@@ -1,23 +1,160 @@
 import frappe
 import json
 from frappe import _
-from frappe.exceptions import PermissionError
+from frappe.utils import add_days, cint, date_diff, getdate, nowdate
+from frappe.exceptions import PermissionError, ValidationError
+from library_management import book_import, list_query, loan_calendar
+from library_management.compact_response import compact
+from library_management.list_query import decode_cursor, encode_cursor
+from library_management.principal import get_principal
+
+# Columns a caller may project or sort the catalog on. `name` is always
+# returned and is the tie-breaker that makes every sort order stable.
+CATALOG_FIELDS = ("name", "title", "author", "isbn", "publish_date")
+CATALOG_SORT_FIELDS = ("name", "title", "author", "publish_date")
+DEFAULT_PAGE_LENGTH = 50
+MAX_PAGE_LENGTH = 500
+MAX_CALENDAR_BOOKS = 500
+DEFAULT_CALENDAR_DAYS = 90
+MAX_CALENDAR_DAYS = 366
+
+# Columns of the slim book records returned by get_books_by_id
+BOOK_RECORD = list_query.ListSpec(
+    "Book",
+    fields=CATALOG_FIELDS[1:],
+    sort_fields=(),
+    default_sort=("name", "asc"),
+)
 
 @frappe.whitelist(allow_guest=True)
+@compact
 def get_books():
     return frappe.get_all("Book", fields=["name", "title", "author", "publish_date", "isbn"])
 
+@frappe.whitelist(allow_guest=True)
+def get_catalog(cursor=None, page_length=DEFAULT_PAGE_LENGTH, fields=None, sort_by="name",
+                sort_order="asc", author=None, publish_date_from=None, publish_date_to=None,
+                isbn_prefix=None):
+    """Return one page of the book catalog using keyset (cursor) pagination.
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+    Each page is a single index range read, so its cost does not grow with the
+    size of `tabBook` the way OFFSET paging does.
+    """
+    page_length = min(max(cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+
+    if sort_by not in CATALOG_SORT_FIELDS:
+        frappe.throw(_("Cannot sort the catalog by {0}.").format(sort_by), ValidationError)
+    sort_order = (sort_order or "asc").lower()
+    if sort_order not in ("asc", "desc"):
+        frappe.throw(_("Sort order must be 'asc' or 'desc'."), ValidationError)
+
+    fields = _parse_catalog_fields(fields)
+    select_fields = list(dict.fromkeys(["name", sort_by, *fields]))
+
+    conditions = []
+    values = {}
+
+    if author:
+        conditions.append("`author` = %(author)s")
+        values["author"] = author
+    if publish_date_from:
+        conditions.append("`publish_date` >= %(publish_date_from)s")
+        values["publish_date_from"] = getdate(publish_date_from)
+    if publish_date_to:
+        conditions.append("`publish_date` <= %(publish_date_to)s")
+        values["publish_date_to"] = getdate(publish_date_to)
+    if isbn_prefix:
+        conditions.append("`isbn` LIKE %(isbn_prefix)s")
+        values["isbn_prefix"] = _escape_like(isbn_prefix.strip()) + "%"
+
+    if cursor:
+        last_value, last_name = decode_cursor(cursor)
+        op = ">" if sort_order == "asc" else "<"
+        values["last_name"] = last_name
+        if sort_by == "name":
+            conditions.append(f"`name` {op} %(last_name)s")
+        else:
+            values["last_value"] = last_value
+            conditions.append(
+                f"(`{sort_by}` {op} %(last_value)s"
+                f" OR (`{sort_by}` = %(last_value)s AND `name` {op} %(last_name)s))"
+            )
+
+    columns = ", ".join(f"`{f}`" for f in select_fields)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_by = f"`{sort_by}` {sort_order}"
+    if sort_by != "name":
+        order_by += f", `name` {sort_order}"
+
+    rows = frappe.db.sql(f"""
+        SELECT {columns}
+        FROM `tabBook`
+        {where}
+        ORDER BY {order_by}
+        LIMIT %(limit)s
+    """, {**values, "limit": page_length + 1}, as_dict=True)
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        next_cursor = encode_cursor(rows[-1][sort_by], rows[-1].name)
+
+    if sort_by not in fields:
+        for row in rows:
+            row.pop(sort_by, None)
+
+    return {"data": rows, "next_cursor": next_cursor}
+
+@frappe.whitelist()
+def get_availability_calendar(books, from_date=None, to_date=None):
+    """Free and busy date ranges of each book between `from_date` and `to_date` (inclusive).
+
+    `books` is a JSON list (or comma-separated string) of up to
+    MAX_CALENDAR_BOOKS names. The range defaults to the next
+    DEFAULT_CALENDAR_DAYS days and may span at most MAX_CALENDAR_DAYS. All
+    books are answered from one loan query.
+    """
+    if isinstance(books, str):
+        books = json.loads(books) if books.strip().startswith("[") else books.split(",")
+    books = list(dict.fromkeys(b.strip() for b in books if b and b.strip()))
+    if not books:
+        frappe.throw(_("At least one book is required."), ValidationError)
+    if len(books) > MAX_CALENDAR_BOOKS:
+        frappe.throw(_("At most {0} books can be requested at once.").format(MAX_CALENDAR_BOOKS), ValidationError)
+
+    from_date = getdate(from_date or nowdate())
+    to_date = getdate(to_date or add_days(from_date, DEFAULT_CALENDAR_DAYS - 1))
+    if to_date < from_date:
+        frappe.throw(_("The end date cannot be before the start date."), ValidationError)
+    if date_diff(to_date, from_date) >= MAX_CALENDAR_DAYS:
+        frappe.throw(_("The date range can span at most {0} days.").format(MAX_CALENDAR_DAYS), ValidationError)
+
+    calendars = loan_calendar.build_index(books, from_date, to_date)
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "books": {
+            book: {
+                "free": calendars[book].free_windows(from_date, to_date),
+                "busy": calendars[book].busy(from_date, to_date),
+            }
+            for book in books
+        },
+    }
+
 @frappe.whitelist()
 def get_book(book_id):
     return frappe.get_doc("Book", book_id)
 
+@frappe.whitelist()
+def get_books_by_id(book_ids):
+    """Slim records of many books in one query; see list_query.get_records."""
+    return list_query.get_records(BOOK_RECORD, book_ids)
+
 @frappe.whitelist()
 def create_book(data):
-    frappe.logger().info(f"📥 Incoming book data: {data}")
-    roles = frappe.get_roles()
-    frappe.logger().info(f"👤 User roles: {roles}")
-    
-    if "Librarian" not in roles:
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can create books."))
 
     data = frappe._dict(json.loads(data))
@@ -32,9 +169,41 @@ def create_book(data):
     doc.insert()
     return doc
 
+@frappe.whitelist()
+def import_books(file_url, file_format=None):
+    """Queue a streaming CSV/JSONL catalog import from an uploaded File.
+
+    Re-submitting the same file resumes an interrupted import instead of
+    starting over. Poll `get_book_import_status` with the returned id.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only Librarians can import books."))
+
+    file_path = frappe.get_doc("File", {"file_url": file_url}).get_full_path()
+    import_id = book_import.default_import_id(file_path)
+
+    frappe.enqueue(
+        "library_management.book_import.import_books",
+        queue="long",
+        timeout=6 * 60 * 60,
+        job_id=f"book_import::{import_id}",
+        deduplicate=True,
+        file_path=file_path,
+        file_format=file_format,
+        import_id=import_id,
+    )
+    return {"import_id": import_id}
+
+@frappe.whitelist()
+def get_book_import_status(import_id):
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only Librarians can import books."))
+
+    return book_import.get_import_status(import_id) or {"import_id": import_id, "status": "queued"}
+
 @frappe.whitelist()
 def update_book(book_id, data):
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can update books."))
 
     data = frappe._dict(json.loads(data))
@@ -45,8 +214,25 @@ def update_book(book_id, data):
 
 @frappe.whitelist()
 def delete_book(book_id):
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can delete books."))
 
     frappe.delete_doc("Book", book_id)
     return {"status": "deleted"}
+
+
+def _parse_catalog_fields(fields):
+    """Normalise the requested projection to a list of known Book columns."""
+    if not fields:
+        return list(CATALOG_FIELDS)
+    if isinstance(fields, str):
+        fields = json.loads(fields) if fields.lstrip().startswith("[") else fields.split(",")
+
+    fields = [f.strip() for f in fields if f and f.strip()]
+    invalid = [f for f in fields if f not in CATALOG_FIELDS]
+    if invalid:
+        frappe.throw(_("Unknown catalog fields: {0}").format(", ".join(invalid)), ValidationError)
+    return ["name", *(f for f in fields if f != "name")]
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
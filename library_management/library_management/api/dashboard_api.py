@@ -0,0 +1,59 @@
+# file: library_management/api/dashboard_api.py
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, nowdate
+from frappe.exceptions import PermissionError
+from library_management.principal import get_principal
+from library_management import report_cache
+from library_management.waitlist import ACTIVE_STATUSES
+
+DEFAULT_DUE_WITHIN_DAYS = 3
+MAX_DUE_WITHIN_DAYS = 90
+
+
+@frappe.whitelist(allow_guest=False)
+def get_dashboard_summary(due_within_days=DEFAULT_DUE_WITHIN_DAYS):
+    """Headline circulation numbers for the librarian dashboard in one round-trip.
+
+    Loans count as active from their loan date through their return date and
+    as overdue once that has passed while they are not returned, the same
+    definitions as the current and overdue loan reports; cancelled loans are
+    left out. Each figure is a range read of an index bounded by running or
+    unreturned loans, never a scan of the loan history. The result is cached
+    in Redis alongside the circulation reports and invalidated by the same
+    writes.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can view the dashboard summary."))
+
+    days = min(max(cint(due_within_days), 0), MAX_DUE_WITHIN_DAYS)
+    return report_cache.get_report(
+        report_cache.DASHBOARD_SUMMARY, f"librarian:{days}", lambda: _query_summary(days)
+    )
+
+
+def _query_summary(days):
+    today = nowdate()
+    summary = frappe.db.sql("""
+        SELECT
+            (SELECT COUNT(*) FROM `tabBook`) AS total_books,
+            (SELECT COUNT(*) FROM `tabLoan`
+                WHERE `return_date` >= %(today)s AND `loan_date` <= %(today)s
+                    AND `docstatus` < 2) AS active_loans,
+            (SELECT COUNT(*) FROM `tabLoan`
+                WHERE `returned_on` IS NULL AND `return_date` < %(today)s
+                    AND `docstatus` < 2) AS overdue_loans,
+            (SELECT COUNT(*) FROM `tabLoan`
+                WHERE `return_date` BETWEEN %(today)s AND %(horizon)s AND `loan_date` <= %(today)s
+                    AND `docstatus` < 2) AS due_soon,
+            (SELECT COUNT(*) FROM `tabReservation`
+                WHERE `status` IN %(open_statuses)s) AS open_reservations,
+            (SELECT COUNT(DISTINCT `member`) FROM `tabLoan`
+                WHERE `return_date` >= %(today)s AND `loan_date` <= %(today)s
+                    AND `docstatus` < 2) AS active_members
+    """, {"today": today, "horizon": add_days(today, days), "open_statuses": ACTIVE_STATUSES}, as_dict=True)[0]
+
+    summary["due_within_days"] = days
+    summary["as_of"] = today
+    return summary
@@ -3,20 +3,66 @@
 import frappe
 import json
 from frappe import _
-from frappe.utils import nowdate
+from frappe.utils import add_days, getdate, now, nowdate
 from frappe.exceptions import PermissionError
+from library_management.availability import close_earlier_loans, refresh_books_availability
+from library_management.compact_response import compact
+from library_management.principal import get_principal
+from library_management import analytics, list_query, loan_calendar, loan_claims, report_cache, waitlist
+
+MAX_BATCH_SIZE = 1000
+
+LOAN_LIST = list_query.ListSpec(
+    "Loan",
+    fields=("book", "member", "loan_date", "return_date", "docstatus"),
+    sort_fields=("loan_date", "return_date"),
+    default_sort=("loan_date", "desc"),
+    filters={
+        "member": ("member", "eq"),
+        "book": ("book", "eq"),
+        "loan_date_from": ("loan_date", "from"),
+        "loan_date_to": ("loan_date", "to"),
+        "return_date_from": ("return_date", "from"),
+        "return_date_to": ("return_date", "to"),
+        "overdue": ("return_date", "overdue"),
+    },
+    lookups={
+        "book_title": ("Book", "book", "title"),
+        "member_fullname": ("Member", "member", "fullname"),
+    },
+)
 
 @frappe.whitelist()
-def get_loans():
-    return frappe.get_all("Loan", fields=["name", "book", "member", "loan_date", "return_date"])
+@compact
+def get_loans(cursor=None, page_length=list_query.DEFAULT_PAGE_LENGTH, sort_by=None, sort_order=None, filters=None):
+    """One page of loans; see list_query.get_page. Members only ever see their own loans."""
+    filters = json.loads(filters) if isinstance(filters, str) and filters.strip() else (filters or {})
+    principal = get_principal()
+    if principal.is_member and not principal.is_librarian:
+        # Same restriction as Loan.get_permission_query_conditions
+        filters["member"] = principal.member or ""
+    return list_query.get_page(LOAN_LIST, filters, cursor, page_length, sort_by, sort_order)
 
 @frappe.whitelist()
 def get_loan(loan_id):
     return frappe.get_doc("Loan", loan_id)
 
+@frappe.whitelist()
+def get_loans_by_id(loan_ids, expand=None):
+    """Slim records of many loans in one query; see list_query.get_records.
+
+    `expand` (e.g. ["book", "member"]) adds book_title / member_fullname.
+    Members only get their own loans; the others are reported as missing.
+    """
+    filters = {}
+    principal = get_principal()
+    if principal.is_member and not principal.is_librarian:
+        filters["member"] = principal.member or ""
+    return list_query.get_records(LOAN_LIST, loan_ids, expand, filters)
+
 @frappe.whitelist()
 def create_loan():
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can create a loan."))
 
     data = frappe.form_dict.get("data")
@@ -30,21 +76,10 @@ def create_loan():
         if not data.get(field):
             frappe.throw(_(f"{field.replace('_', ' ').title()} is required."))
 
-    # Check if book is already on loan
-    existing_doc = frappe.get_all(
-        "Loan",
-        filters={
-            "book": data.book,
-            "return_date": [">=", nowdate()]
-        },
-        fields=["name", "member"]
-    )
-    if existing_doc:
-        member = existing_doc[0].member
-        try:
-            member_name = frappe.get_doc("Member", member).fullname
-        except:
-            member_name = member
+    # Check if the book is on loan during any part of the requested period
+    active_loan = loan_calendar.find_overlap(data.book, data.loan_date, data.return_date)
+    if active_loan:
+        member_name = _member_fullname(active_loan.member)
         frappe.throw(_(f"You cannot loan this book because it is already loaned out to '{member_name}' and has not been returned yet."))
 
     doc = frappe.get_doc({
@@ -59,7 +94,7 @@ def create_loan():
 
 @frappe.whitelist()
 def update_loan():
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can update a loan."))
 
     loan_id = frappe.form_dict.get("loan_id")
@@ -73,30 +108,207 @@ def update_loan():
 
     # Check if trying to update to a book that's already on loan (excluding the current loan)
     if data.book:
-        existing_doc = frappe.get_all(
-            "Loan",
-            filters={
-                "book": data.book,
-                "return_date": [">=", nowdate()],
-                "name": ["!=", loan_id]
-            },
-            fields=["name", "member"]
+        active_loan = loan_calendar.find_overlap(
+            data.book,
+            data.loan_date or current_doc.loan_date,
+            data.return_date or current_doc.return_date,
+            exclude_loan=loan_id,
         )
-        if existing_doc:
-            member = existing_doc[0].member
-            try:
-                member_name = frappe.get_doc("Member", member).fullname
-            except:
-                member_name = member
+        if active_loan:
+            member_name = _member_fullname(active_loan.member)
             frappe.throw(_(f"You cannot reassign this book because it is currently loaned out to '{member_name}' and not yet returned."))
 
     current_doc.update(data)
     current_doc.save()
     return current_doc
 
+@frappe.whitelist()
+def create_loans(data):
+    """Check out many books in one request.
+
+    `data` is a JSON list of {book, member, loan_date, return_date}. Conflicts
+    for the whole batch are detected against one loan calendar index built
+    for all its books, the valid loans are inserted with a multi-row INSERT in
+    the request transaction, and a result is returned for every item in order.
+    Each loan claims its days first (see loan_claims), so a concurrent checkout
+    of the same book makes one of the two fail instead of double-loaning it.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only Librarians can create a loan."))
+
+    items = _parse_batch(data)
+    results = [None] * len(items)
+
+    # A date that does not parse fails its own item, not the whole batch
+    for idx, item in enumerate(items):
+        for field in ("loan_date", "return_date"):
+            if item.get(field):
+                item[field] = _parse_date(item[field])
+                if not item[field]:
+                    results[idx] = {"index": idx, "status": "failed",
+                                    "error": _("{0} is not a valid date.").format(_(field.replace("_", " ").title()))}
+    valid = [item for idx, item in enumerate(items) if not results[idx]]
+
+    books = frappe.db.sql("""
+        SELECT `name`
+        FROM `tabBook`
+        WHERE `name` IN %(books)s
+    """, {"books": tuple({i.get("book") for i in valid if i.get("book")}) or ("",)}, as_dict=True)
+    books = {b.name: b for b in books}
+
+    dated = [i for i in valid if i.get("loan_date") and i.get("return_date")]
+    calendars = loan_calendar.build_index(
+        books, min(i.loan_date for i in dated), max(i.return_date for i in dated)
+    ) if dated else {}
+
+    members = frappe.db.sql("""
+        SELECT `name`, `fullname`
+        FROM `tabMember`
+        WHERE `name` IN %(members)s
+    """, {"members": tuple({i.get("member") for i in valid if i.get("member")} | {
+        loan.member for calendar in calendars.values() for period in calendar.loans for loan in period
+    }) or ("",)}, as_dict=True)
+    members = {m.name: m.fullname for m in members}
+    holds = waitlist.get_ready_holds(books)
+
+    to_insert = []
+    claimed = set()
+    for idx, item in enumerate(items):
+        if results[idx]:
+            continue
+        error = _checkout_error(item, books, members, claimed, holds, calendars)
+        if error:
+            results[idx] = {"index": idx, "status": "failed", "error": error}
+            continue
+
+        claimed.add(item["book"])
+        to_insert.append((idx, (frappe.generate_hash(length=10), item["book"], item["member"], item["loan_date"], item["return_date"])))
+
+    # One claim statement for the whole batch, written in book order
+    taken = loan_claims.claim_many(
+        {"loan": row[0], "book": row[1], "loan_date": row[3], "return_date": row[4]} for idx, row in to_insert
+    )
+    for idx, row in to_insert:
+        if row[0] in taken:
+            results[idx] = {"index": idx, "status": "failed", "error": _("This book is being checked out by another request.")}
+        else:
+            results[idx] = {"index": idx, "status": "created", "loan": row[0]}
+    to_insert = [row for idx, row in to_insert if results[idx]["status"] == "created"]
+
+    if to_insert:
+        timestamp, user = now(), frappe.session.user
+        frappe.db.bulk_insert(
+            "Loan",
+            ["name", "book", "member", "loan_date", "return_date",
+             "docstatus", "owner", "modified_by", "creation", "modified"],
+            [(*row, 0, user, user, timestamp, timestamp) for row in to_insert],
+        )
+        close_earlier_loans((row[1], row[3]) for row in to_insert)
+        refresh_books_availability(row[1] for row in to_insert)
+        waitlist.fulfil((row[1], row[2]) for row in to_insert)
+        analytics.apply(added=[
+            frappe._dict(book=row[1], member=row[2], loan_date=row[3], return_date=row[4], docstatus=0)
+            for row in to_insert
+        ])
+        report_cache.invalidate_for_return_dates(row[4] for row in to_insert)
+
+    return {
+        "created": len(to_insert),
+        "failed": len(items) - len(to_insert),
+        "results": results,
+    }
+
+@frappe.whitelist()
+def return_loans(data):
+    """Check in many loans in one request.
+
+    `data` is a JSON list of {loan, return_date}, where `return_date` is the
+    day the book came back and defaults to today. Loan periods include their
+    return date, so a loan checked in is closed on the day before: the book is
+    free again that same day (a loan returned on its loan date then covers no
+    day at all), and the day itself is kept in `returned_on`. All return dates are written with one UPDATE and the affected
+    books' availability is refreshed in one set-based pass.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only Librarians can update a loan."))
+
+    items = _parse_batch(data)
+    results = [None] * len(items)
+
+    loans = frappe.db.sql("""
+        SELECT `name`, `book`, `member`, `loan_date`, `return_date`, `docstatus`
+        FROM `tabLoan`
+        WHERE `name` IN %(loans)s
+    """, {"loans": tuple({i.get("loan") for i in items if i.get("loan")}) or ("",)}, as_dict=True)
+    loans = {l.name: l for l in loans}
+
+    updates, returned = {}, {}
+    for idx, item in enumerate(items):
+        loan = loans.get(item.get("loan"))
+        returned_on = _parse_date(item.get("return_date") or nowdate())
+        if not loan:
+            error = _("Loan {0} not found.").format(item.get("loan"))
+        elif loan.docstatus == 2:
+            error = _("Loan {0} is cancelled.").format(loan.name)
+        elif not returned_on:
+            error = _("Return Date is not a valid date.")
+        elif returned_on < getdate(loan.loan_date):
+            error = _("Return date cannot be before the loan date.")
+        elif loan.name in updates:
+            error = _("Loan {0} appears more than once in the batch.").format(loan.name)
+        else:
+            updates[loan.name] = add_days(returned_on, -1)
+            returned[loan.name] = returned_on
+            results[idx] = {"index": idx, "status": "returned", "loan": loan.name}
+            continue
+        results[idx] = {"index": idx, "status": "failed", "error": error}
+
+    # A late return extends the loan, so its new period is claimed like a checkout
+    taken = loan_claims.claim_many(
+        {"loan": name, "book": loans[name].book, "loan_date": loans[name].loan_date,
+         "return_date": return_date, "previous": loans[name]}
+        for name, return_date in updates.items()
+    )
+    for idx, result in enumerate(results):
+        if result["status"] == "returned" and result["loan"] in taken:
+            results[idx] = {"index": idx, "status": "failed", "error": _(
+                "Loan {0} cannot run until {1}: the book is loaned out again before then."
+            ).format(result["loan"], add_days(updates.pop(result["loan"]), 1))}
+
+    if updates:
+        cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+        frappe.db.sql(f"""
+            UPDATE `tabLoan`
+            SET `return_date` = CASE `name` {cases} END,
+                `returned_on` = CASE `name` {cases} END,
+                `modified` = %s,
+                `modified_by` = %s
+            WHERE `name` IN %s
+        """, [
+            *(v for pair in updates.items() for v in pair),
+            *(v for name in updates for v in (name, returned[name])),
+            now(), frappe.session.user, tuple(updates),
+        ])
+        refresh_books_availability(loans[name].book for name in updates)
+        for book in {loans[name].book for name in updates}:
+            waitlist.promote_next(book)
+        report_cache.invalidate_for_return_dates(
+            [*updates.values(), *(loans[name].return_date for name in updates)]
+        )
+        analytics.apply(
+            removed=[loans[name] for name in updates],
+            added=[frappe._dict(loans[name], return_date=return_date) for name, return_date in updates.items()],
+        )
+
+    return {
+        "returned": len(updates),
+        "failed": len(items) - len(updates),
+        "results": results,
+    }
+
 @frappe.whitelist()
 def delete_loan():
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only Librarians can delete a loan."))
 
     loan_id = frappe.form_dict.get("loan_id")
@@ -123,3 +335,50 @@ def get_overdue_books():
         fields=["name", "book", "member", "loan_date", "return_date"],
         order_by="return_date asc"
     )
+
+def _member_fullname(member):
+    return frappe.db.get_value("Member", member, "fullname") or member
+
+def _parse_date(value):
+    """`value` as a date, or None if it is not a valid date."""
+    mute = frappe.flags.mute_messages
+    frappe.flags.mute_messages = True
+    try:
+        return getdate(value)
+    except Exception:
+        return None
+    finally:
+        frappe.flags.mute_messages = mute
+
+def _parse_batch(data):
+    items = json.loads(data) if isinstance(data, str) else data
+    if not isinstance(items, list) or not items:
+        frappe.throw(_("Expected a non-empty list of items."))
+    if len(items) > MAX_BATCH_SIZE:
+        frappe.throw(_("A batch can contain at most {0} items.").format(MAX_BATCH_SIZE))
+    return [frappe._dict(item) for item in items]
+
+def _checkout_error(item, books, members, claimed, holds, calendars):
+    """Return why `item` cannot be checked out, or None if it can."""
+    for field in ("book", "member", "loan_date", "return_date"):
+        if not item.get(field):
+            return _(f"{field.replace('_', ' ').title()} is required.")
+
+    book = books.get(item.book)
+    if not book:
+        return _("Book {0} not found.").format(item.book)
+    if item.member not in members:
+        return _("Member {0} not found.").format(item.member)
+    if item.return_date < item.loan_date:
+        return _("Return date cannot be before the loan date.")
+    if loan_claims.too_long(item.loan_date, item.return_date):
+        return _("A loan can run for at most {0} days.").format(loan_claims.max_loan_days())
+    if item.book in claimed:
+        return _("This book appears more than once in the batch.")
+    conflict = calendars[item.book].overlap(item.loan_date, item.return_date)
+    if conflict:
+        member_name = members.get(conflict.member) or conflict.member
+        return _(f"You cannot loan this book because it is already loaned out to '{member_name}' and has not been returned yet.")
+    if holds.get(item.book, item.member) != item.member:
+        return _("This book is being held for another member's reservation.")
+    return None
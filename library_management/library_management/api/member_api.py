@@ -3,9 +3,22 @@ import json
 import re
 from frappe import _
 from frappe.exceptions import PermissionError, ValidationError
+from library_management import list_query, member_search
+from library_management.principal import get_principal
+
+MEMBER_LIST = list_query.ListSpec(
+    "Member",
+    fields=("fullname", "membership_id", "email", "phone"),
+    sort_fields=("fullname", "membership_id", "email"),
+    default_sort=("fullname", "asc"),
+    filters={
+        "membership_id": ("membership_id", "eq"),
+        "email": ("email", "eq"),
+    },
+)
 
 def check_librarian():
-    if "Librarian" not in frappe.get_roles():
+    if not get_principal().is_librarian:
         frappe.throw(_("Only Librarians can perform this action."), PermissionError)
 
 def validate_email(email):
@@ -17,15 +30,27 @@ def validate_phone(phone):
         frappe.throw(_("Phone number must contain only digits and be 7 to 15 characters long."), ValidationError)
 
 @frappe.whitelist()
-def get_members():
+def get_members(cursor=None, page_length=list_query.DEFAULT_PAGE_LENGTH, sort_by=None, sort_order=None, filters=None):
+    check_librarian()
+    return list_query.get_page(MEMBER_LIST, filters, cursor, page_length, sort_by, sort_order)
+
+@frappe.whitelist()
+def search_members(query, limit=20):
+    """Members by full name or membership ID prefix, or by exact email or phone, best match first."""
     check_librarian()
-    return frappe.get_all("Member", fields=["name", "fullname", "membership_id", "email", "phone"])
+    return member_search.search(query, limit)
 
 @frappe.whitelist()
 def get_member(member_id):
     check_librarian()
     return frappe.get_doc("Member", member_id)
 
+@frappe.whitelist()
+def get_members_by_id(member_ids):
+    """Slim records of many members in one query; see list_query.get_records."""
+    check_librarian()
+    return list_query.get_records(MEMBER_LIST, member_ids)
+
 @frappe.whitelist()
 def create_member(data):
     check_librarian()
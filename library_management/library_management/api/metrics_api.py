@@ -0,0 +1,33 @@
+# file: library_management/api/metrics_api.py
+
+import hmac
+
+import frappe
+from frappe import _
+from frappe.exceptions import PermissionError
+from werkzeug.wrappers import Response
+from library_management.principal import get_principal
+from library_management import metrics
+
+
+@frappe.whitelist(allow_guest=True)
+def get_metrics():
+    """Per-endpoint latency and SQL metrics in Prometheus text format.
+
+    A scraper authenticates with `Authorization: Bearer <library_metrics_token>`
+    when that token is set in the site config; otherwise only librarians may
+    read the metrics.
+    """
+    if not _is_scraper() and not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can view metrics."))
+
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def _is_scraper():
+    token = frappe.conf.get("library_metrics_token")
+    if not token:
+        return False
+    header = frappe.get_request_header("Authorization") or ""
+    scheme, _sep, supplied = header.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip().encode(), token.encode())
@@ -1,103 +1,176 @@
+import os
+
 import frappe
 from frappe import _
-from frappe.utils import nowdate
-from frappe.exceptions import PermissionError
+from frappe.utils import cint
+from frappe.exceptions import DoesNotExistError, PermissionError
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import wrap_file
+from library_management.loan_archive import history_query
+from library_management.compact_response import compact
+from library_management.loan_export import circulation_query, export_to_tempfile
+from library_management.principal import get_principal
+from library_management import report_cache, report_jobs
 
 
 @frappe.whitelist(allow_guest=False)
+@compact
 def get_current_loans():
     """Return all loans that are currently active (not overdue)."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can view current loans."))
 
-    return frappe.db.sql("""
-        SELECT
-            l.name AS loan_id,
-            b.title AS book_title,
-            m.fullname AS member_name,
-            l.loan_date,
-            l.return_date
-        FROM `tabLoan` l
-        LEFT JOIN `tabBook` b ON l.book = b.name
-        LEFT JOIN `tabMember` m ON l.member = m.name
-        WHERE l.return_date >= %s
-        ORDER BY l.return_date ASC
-    """, (nowdate(),), as_dict=True)
+    return report_cache.get_report(report_cache.CURRENT_LOANS, "librarian", _query_current_loans)
 
 
 @frappe.whitelist(allow_guest=False)
+@compact
 def get_overdue_loans():
     """Return all loans that are overdue (return_date in the past)."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can view overdue loans."))
 
-    return frappe.db.sql("""
-        SELECT
-            l.name AS loan_id,
-            b.title AS book_title,
-            m.fullname AS member_name,
-            l.loan_date,
-            l.return_date
-        FROM `tabLoan` l
-        LEFT JOIN `tabBook` b ON l.book = b.name
-        LEFT JOIN `tabMember` m ON l.member = m.name
-        WHERE l.return_date < %s
-        ORDER BY l.return_date ASC
-    """, (nowdate(),), as_dict=True)
+    return report_cache.get_report(report_cache.OVERDUE_LOANS, "librarian", _query_overdue_loans)
 
 
 @frappe.whitelist(allow_guest=False)
-def export_member_loans_csv(member_id):
-    """Export all loans for a given member as a CSV file."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+def get_report_cache_stats():
+    """Hit/miss counters of the circulation report cache."""
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can view report cache statistics."))
+
+    return report_cache.get_stats()
+
+
+def _query_current_loans():
+    query, values = circulation_query()
+    return frappe.db.sql(query, values, as_dict=True)
+
+
+def _query_overdue_loans():
+    query, values = circulation_query(overdue=True)
+    return frappe.db.sql(query, values, as_dict=True)
+
+
+@frappe.whitelist(allow_guest=False)
+def export_member_loans_csv(member_id, background=False):
+    """Export all loans for a given member as a CSV file.
+
+    With `background`, queues the export and returns its job status instead
+    (see submit_report_job).
+    """
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can export loan history."))
 
-    loans = frappe.db.sql("""
-        SELECT
-            l.name AS loan_id,
-            b.title AS book_title,
-            l.loan_date,
-            l.return_date
-        FROM `tabLoan` l
-        LEFT JOIN `tabBook` b ON l.book = b.name
-        WHERE l.member = %s
-        ORDER BY l.loan_date DESC
-    """, (member_id,), as_dict=True)
+    if cint(background):
+        return _with_download_url(report_jobs.submit("loan_history", {"member": member_id}))
 
-    if not loans:
+    file, count = export_to_tempfile(member=member_id)
+    if not count:
+        file.close()
         frappe.throw(_("No loans found for this member."))
 
-    # Generate CSV string
-    csv_data = "Loan ID,Book Title,Loan Date,Return Date\n"
-    for loan in loans:
-        csv_data += f"{loan.loan_id},{loan.book_title},{loan.loan_date},{loan.return_date}\n"
+    return _csv_file_response(file, f"loan_history_{member_id}.csv")
+
+
+@frappe.whitelist(allow_guest=False)
+def export_loans_csv(from_date=None, to_date=None, member_id=None, background=False):
+    """Export loan history for the whole library (or one member) as a CSV file.
+
+    `from_date` and `to_date` bound the loan date inclusively. With
+    `background`, queues the export and returns its job status instead.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can export loan history."))
+
+    if cint(background):
+        return _with_download_url(report_jobs.submit(
+            "loan_history", {"member": member_id, "from_date": from_date, "to_date": to_date}
+        ))
+
+    file, _count = export_to_tempfile(member=member_id, from_date=from_date, to_date=to_date)
+    suffix = "_".join(filter(None, [member_id, from_date, to_date])) or "all"
+    return _csv_file_response(file, f"loan_history_{suffix}.csv")
+
+
+@frappe.whitelist(allow_guest=False)
+def submit_report_job(report, filters=None):
+    """Run a report in the background and return its job status.
+
+    `report` is current_loans, overdue_loans or loan_history (filters:
+    member, from_date, to_date). Poll get_report_job_status with the job_id;
+    once completed, the CSV is at its download_url. Submitting a report that
+    is already queued or running returns that job instead of starting another.
+    """
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can run background reports."))
+
+    return _with_download_url(report_jobs.submit(report, filters))
+
+
+@frappe.whitelist(allow_guest=False)
+def get_report_job_status(job_id):
+    """Status, progress (rows written) and, once completed, download_url of a report job."""
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can run background reports."))
+
+    status = report_jobs.get_status(job_id)
+    if not status:
+        frappe.throw(_("Report job {0} not found.").format(job_id), DoesNotExistError)
+    return _with_download_url(status)
+
+
+@frappe.whitelist(allow_guest=False)
+def download_report_job(job_id):
+    """The CSV written by a completed report job."""
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can run background reports."))
+
+    path = report_jobs.get_file_path(job_id)
+    return _csv_file_response(open(path, "rb"), os.path.basename(path))
+
+
+def _with_download_url(status):
+    status["download_url"] = (
+        f"/api/method/library_management.api.report.download_report_job?job_id={status['job_id']}"
+        if status["status"] == report_jobs.COMPLETED else None
+    )
+    return status
+
 
-    frappe.response["filename"] = f"loan_history_{member_id}.csv"
-    frappe.response["filecontent"] = csv_data
-    frappe.response["type"] = "download"
-    frappe.response["doctype"] = None
+def _csv_file_response(file, filename):
+    """Stream an already written CSV file from disk instead of holding it in the response."""
+    response = Response(
+        wrap_file(frappe.local.request.environ, file),
+        mimetype="text/csv",
+        direct_passthrough=True,
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 
 @frappe.whitelist(allow_guest=False)
+@compact
 def get_member_loans(email):
     """Return loan history for the member with the given email."""
-    if "Member" not in frappe.get_roles(frappe.session.user):
+    principal = get_principal()
+    if not principal.is_member:
         raise PermissionError(_("Only members can view their own loan history."))
 
-    member_id = frappe.db.get_value("Member", {"email": email})
+    member_id = principal.member if email == principal.user else frappe.db.get_value("Member", {"email": email})
     if not member_id:
         frappe.throw(_("Member not found."))
 
-    results = frappe.db.sql("""
+    # Both the hot and the archived loan history
+    results = frappe.db.sql(f"""
         SELECT
             l.name AS loan_id,
             b.title AS book_title,
             l.loan_date,
             l.return_date
-        FROM `tabLoan` l
+        FROM ({history_query("WHERE `member` = %(member)s")}) l
         LEFT JOIN `tabBook` b ON l.book = b.name
-        WHERE l.member = %s
         ORDER BY l.loan_date DESC
-    """, (member_id,), as_dict=True)
+    """, {"member": member_id}, as_dict=True)
 
     return results
@@ -3,29 +3,41 @@ import json
 from frappe import _
 from frappe.utils import nowdate
 from frappe.exceptions import PermissionError
+from library_management.availability import get_active_loan
+from library_management.compact_response import compact
+from library_management.principal import get_principal
+from library_management import list_query, waitlist
+
+RESERVATION_LIST = list_query.ListSpec(
+    "Reservation",
+    fields=("reservation_date", "book", "member", "status", "queue_seq"),
+    sort_fields=("reservation_date",),
+    default_sort=("reservation_date", "desc"),
+    filters={
+        "member": ("member", "eq"),
+        "book": ("book", "eq"),
+        "status": ("status", "eq"),
+        "reservation_date_from": ("reservation_date", "from"),
+        "reservation_date_to": ("reservation_date", "to"),
+    },
+    lookups={
+        "book_title": ("Book", "book", "title"),
+        "member_fullname": ("Member", "member", "fullname"),
+    },
+)
 
 
 # ---------------- Librarian APIs ----------------
 
 @frappe.whitelist()
-def get_reservations():
-    """Librarian can view all reservations with book titles and member fullnames."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+@compact
+def get_reservations(cursor=None, page_length=list_query.DEFAULT_PAGE_LENGTH, sort_by=None, sort_order=None,
+                     filters=None):
+    """Librarian can page through all reservations with book titles and member fullnames."""
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can view all reservations."))
 
-    return frappe.db.sql("""
-        SELECT
-            r.name,
-            r.reservation_date,
-            r.book,
-            b.title AS book_title,
-            r.member,
-            m.fullname AS member_fullname
-        FROM `tabReservation` r
-        LEFT JOIN `tabBook` b ON r.book = b.name
-        LEFT JOIN `tabMember` m ON r.member = m.name
-        ORDER BY r.reservation_date DESC
-    """, as_dict=True)
+    return list_query.get_page(RESERVATION_LIST, filters, cursor, page_length, sort_by, sort_order)
 
 
 @frappe.whitelist()
@@ -33,19 +45,58 @@ def get_reservation(reservation_id):
     """Librarians can view any reservation. Members can view their own."""
     doc = frappe.get_doc("Reservation", reservation_id)
 
-    if "Librarian" in frappe.get_roles(frappe.session.user):
+    if get_principal().is_librarian:
         return doc
 
-    member = frappe.get_value("Member", {"email": frappe.session.user})
+    member = get_principal().member
     if doc.member != member:
         frappe.throw(_("You are not permitted to view this reservation."))
     return doc
 
 
+@frappe.whitelist()
+def get_reservations_by_id(reservation_ids, expand=None):
+    """Slim records of many reservations in one query; see list_query.get_records.
+
+    `expand` (e.g. ["book", "member"]) adds book_title / member_fullname.
+    Members only get their own reservations; the others are reported as missing.
+    """
+    principal = get_principal()
+    if principal.is_librarian:
+        filters = {}
+    elif principal.member:
+        filters = {"member": principal.member}
+    else:
+        frappe.throw(_("No member record linked to this user."))
+    return list_query.get_records(RESERVATION_LIST, reservation_ids, expand, filters)
+
+
+@frappe.whitelist()
+def get_waitlist(book):
+    """Librarian view of one book's open reservations, in queue order."""
+    if not get_principal().is_librarian:
+        raise PermissionError(_("Only librarians can view waitlists."))
+
+    return frappe.db.sql("""
+        SELECT
+            r.name,
+            r.member,
+            m.fullname AS member_fullname,
+            r.reservation_date,
+            r.status,
+            r.queue_seq,
+            r.ready_date
+        FROM `tabReservation` r
+        LEFT JOIN `tabMember` m ON r.member = m.name
+        WHERE r.book = %(book)s AND r.status IN %(statuses)s
+        ORDER BY r.status = %(ready)s DESC, r.queue_seq ASC
+    """, {"book": book, "statuses": waitlist.ACTIVE_STATUSES, "ready": waitlist.READY}, as_dict=True)
+
+
 @frappe.whitelist()
 def create_reservation(data):
     """Librarians create reservations with full data input."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can create a reservation."))
 
     if isinstance(data, str):
@@ -54,11 +105,8 @@ def create_reservation(data):
         data = frappe._dict(data)
 
     # Reject if book is available
-    is_on_loan = frappe.db.exists("Loan", {
-        "book": data.book,
-        "return_date": [">=", nowdate()]
-    })
-    if not is_on_loan:
+    active_loan = get_active_loan(data.book)
+    if not active_loan:
         frappe.throw(_("This book is currently available. No need to reserve."))
 
     # Check for duplicate reservation today
@@ -69,14 +117,9 @@ def create_reservation(data):
     }):
         frappe.throw(_("This member has already reserved this book today."))
 
-    # Check if already loaned today
-    if frappe.db.exists("Loan", {
-        "book": data.book,
-        "member": data.member,
-        "loan_date": nowdate(),
-        "return_date": [">=", nowdate()]
-    }):
-        frappe.throw(_("You cannot reserve a book you already borrowed today."))
+    # Check if the member is the one currently borrowing it
+    if active_loan.current_member == data.member:
+        frappe.throw(_("You cannot reserve a book you are currently borrowing."))
 
     doc = frappe.get_doc({
         "doctype": "Reservation",
@@ -91,7 +134,7 @@ def create_reservation(data):
 @frappe.whitelist()
 def update_reservation(reservation_id, data):
     """Librarians can update reservations."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can update reservations."))
 
     if isinstance(data, str):
@@ -108,7 +151,7 @@ def update_reservation(reservation_id, data):
 @frappe.whitelist()
 def delete_reservation(reservation_id):
     """Librarians can delete reservations."""
-    if "Librarian" not in frappe.get_roles(frappe.session.user):
+    if not get_principal().is_librarian:
         raise PermissionError(_("Only librarians can delete reservations."))
 
     frappe.delete_doc("Reservation", reservation_id)
@@ -120,34 +163,55 @@ def delete_reservation(reservation_id):
 @frappe.whitelist()
 def get_my_reservations():
     """Members can view their own reservations."""
-    member = frappe.get_value("Member", {"email": frappe.session.user})
+    member = get_principal().member
     if not member:
         frappe.throw(_("No member record linked to this user."))
 
+    # queue_position: 0 once the book is held for the member, else 1-based place in line
     return frappe.db.sql("""
         SELECT
             r.name,
             r.book,
             r.reservation_date,
-            b.title AS book_title
+            b.title AS book_title,
+            r.status,
+            CASE r.status
+                WHEN %(ready)s THEN 0
+                WHEN %(waiting)s THEN 1 + (
+                    SELECT COUNT(*)
+                    FROM `tabReservation` q
+                    WHERE q.book = r.book AND q.status = %(waiting)s AND q.queue_seq < r.queue_seq
+                )
+            END AS queue_position
         FROM `tabReservation` r
         LEFT JOIN `tabBook` b ON r.book = b.name
-        WHERE r.member = %s
+        WHERE r.member = %(member)s
         ORDER BY r.reservation_date DESC
-    """, (member,), as_dict=True)
+    """, {"member": member, "ready": waitlist.READY, "waiting": waitlist.WAITING}, as_dict=True)
+
+
+@frappe.whitelist()
+def get_my_queue_position(reservation_id):
+    """Members see where one of their reservations stands: 0 = ready for pickup."""
+    member = get_principal().member
+    if not member:
+        frappe.throw(_("No member record linked to this user."))
+
+    if frappe.db.get_value("Reservation", reservation_id, "member") != member:
+        frappe.throw(_("You are not permitted to view this reservation."))
+
+    return {"reservation": reservation_id, "queue_position": waitlist.get_position(reservation_id)}
 
 
 @frappe.whitelist()
 def create_my_reservation(book_name):
     """Members create a reservation only if book is currently on loan."""
-    member = frappe.get_value("Member", {"email": frappe.session.user})
+    member = get_principal().member
     if not member:
         frappe.throw(_("No member record linked to this user."))
 
-    if not frappe.db.exists("Loan", {
-        "book": book_name,
-        "return_date": [">=", nowdate()]
-    }):
+    active_loan = get_active_loan(book_name)
+    if not active_loan:
         frappe.throw(_("This book is currently available. No need to reserve."))
 
     if frappe.db.exists("Reservation", {
@@ -157,13 +221,8 @@ def create_my_reservation(book_name):
     }):
         frappe.throw(_("You have already reserved this book today."))
 
-    if frappe.db.exists("Loan", {
-        "book": book_name,
-        "member": member,
-        "loan_date": nowdate(),
-        "return_date": [">=", nowdate()]
-    }):
-        frappe.throw(_("You cannot reserve a book you already borrowed today."))
+    if active_loan.current_member == member:
+        frappe.throw(_("You cannot reserve a book you are currently borrowing."))
 
     doc = frappe.get_doc({
         "doctype": "Reservation",
@@ -178,7 +237,7 @@ def create_my_reservation(book_name):
 @frappe.whitelist()
 def cancel_my_reservation(reservation_id):
     """Members can cancel their own reservations."""
-    member = frappe.get_value("Member", {"email": frappe.session.user})
+    member = get_principal().member
     if not member:
         frappe.throw(_("No member record linked to this user."))
 
@@ -0,0 +1,26 @@
+# file: library_management/api/search_api.py
+
+import frappe
+from frappe import _
+
+from library_management import book_search
+
+
+@frappe.whitelist(allow_guest=True)
+def search_books(query, limit=20):
+    """Ranked full-text search over book titles and authors."""
+    return book_search.search(query, limit)
+
+
+@frappe.whitelist(allow_guest=True)
+def autocomplete_books(prefix, limit=10):
+    """Title suggestions for a partially typed search box."""
+    return book_search.autocomplete(prefix, limit)
+
+
+@frappe.whitelist(allow_guest=True)
+def get_books_by_isbn(isbn):
+    """Look up books by ISBN; hyphens, spaces and ISBN-10 vs ISBN-13 spelling are ignored."""
+    if not isbn:
+        frappe.throw(_("ISBN is required."))
+    return book_search.find_by_isbn(isbn)
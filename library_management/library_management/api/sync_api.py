@@ -0,0 +1,41 @@
+# file: library_management/api/sync_api.py
+
+import frappe
+from frappe import _
+from frappe.exceptions import PermissionError, ValidationError
+from library_management.api.loan_api import LOAN_LIST
+from library_management.api.member_api import MEMBER_LIST
+from library_management.api.reservation_api import RESERVATION_LIST
+from library_management.principal import get_principal
+from library_management import change_feed
+
+# doctype -> columns synced, the same as its list endpoint
+FEEDS = {
+    "Book": ("title", "author", "isbn", "publish_date"),
+    "Loan": LOAN_LIST.fields,
+    "Member": MEMBER_LIST.fields,
+    "Reservation": RESERVATION_LIST.fields,
+}
+
+
+@frappe.whitelist(allow_guest=True)
+def get_changes(doctype, sync_token=None, page_length=change_feed.DEFAULT_PAGE_LENGTH):
+    """Rows of `doctype` created or modified since `sync_token`, and the names of rows deleted since.
+
+    Without a token, every row is returned. Call again with the returned
+    `sync_token` while `has_more` is set, and on the next poll. If `reset` is
+    set, the token was too old: drop the cached rows and keep the ones returned.
+    Books are public; members sync only their own loans and reservations.
+    """
+    if doctype not in FEEDS:
+        frappe.throw(_("Cannot sync {0}.").format(doctype), ValidationError)
+
+    principal = get_principal()
+    member = None
+    if doctype != "Book" and not principal.is_librarian:
+        if doctype not in change_feed.MEMBER_SCOPED or not principal.is_member:
+            raise PermissionError(_("You are not permitted to sync {0}.").format(_(doctype)))
+        # Same restriction as get_loans / get_my_reservations
+        member = principal.member or ""
+
+    return change_feed.get_changes(doctype, FEEDS[doctype], sync_token, page_length, member=member)
@@ -0,0 +1,179 @@
+# file: library_management/availability.py
+#
+# Materialized per-book availability. Each Book row carries the loan covering
+# today (`current_loan`, loan_date <= today <= return_date), its borrower
+# (`current_member`) and that loan's return date (`due_date`). The columns are
+# refreshed from Loan doc_events in the same transaction as the Loan write, so
+# "is this book on loan?" is a primary-key read of tabBook instead of a range
+# scan over tabLoan. A loan booked for a later date leaves the book free until
+# it starts; `refresh_lapsed_availability` moves the columns on once a day as
+# loans start and end.
+
+import frappe
+from frappe.utils import getdate, nowdate
+
+from library_management import report_cache
+
+AVAILABILITY_FIELDS = ("current_loan", "current_member", "due_date")
+
+
+def get_availability(book):
+    """Return {current_loan, current_member, due_date} for `book` (all None if never loaned)."""
+    return frappe.db.get_value("Book", book, AVAILABILITY_FIELDS, as_dict=True) or frappe._dict()
+
+
+def get_active_loan(book, on_date=None, exclude_loan=None):
+    """Return the availability row if `book` is on loan on `on_date` (default today), else None.
+
+    Today is answered from the materialized row. Other dates, or excluding the
+    book's current loan (e.g. when that loan is being edited), look up the
+    loan covering `on_date` directly.
+    """
+    on_date = getdate(on_date or nowdate())
+    if on_date == getdate(nowdate()):
+        state = get_availability(book)
+        if not (exclude_loan and state.current_loan == exclude_loan):
+            if state.current_loan and getdate(state.due_date) >= on_date:
+                return state
+            return None
+
+    loan = _covering_loan(book, on_date, exclude_loan=exclude_loan)
+    if not loan:
+        return None
+    return frappe._dict(current_loan=loan.name, current_member=loan.member, due_date=loan.return_date)
+
+
+# ---------------- Loan doc_events ----------------
+
+def on_loan_update(doc, method=None):
+    """Refresh availability for the loan's book, and its previous book if it changed."""
+    if doc.docstatus < 2:
+        close_earlier_loans([(doc.book, doc.loan_date)])
+    refresh_book_availability(doc.book)
+
+    previous = doc.get_doc_before_save()
+    if previous and previous.book and previous.book != doc.book:
+        refresh_book_availability(previous.book)
+
+
+def on_loan_cancel(doc, method=None):
+    refresh_book_availability(doc.book)
+
+
+def on_loan_trash(doc, method=None):
+    # on_trash runs before the row is deleted, so leave it out explicitly.
+    refresh_book_availability(doc.book, exclude_loan=doc.name)
+
+
+# ---------------- Maintenance ----------------
+
+def refresh_book_availability(book, exclude_loan=None):
+    """Recompute the materialized availability columns of one book."""
+    if not book:
+        return
+    loan = _covering_loan(book, nowdate(), exclude_loan=exclude_loan)
+    frappe.db.set_value("Book", book, {
+        "current_loan": loan.name if loan else None,
+        "current_member": loan.member if loan else None,
+        "due_date": loan.return_date if loan else None,
+    }, update_modified=False)
+
+
+def refresh_books_availability(books=None):
+    """Recompute availability for `books` (every book if None) with two set-based UPDATEs."""
+    if books is not None:
+        books = tuple(set(books))
+        if not books:
+            return
+    book_filter = "WHERE b.name IN %(books)s" if books else ""
+    loan_filter = "AND `book` IN %(books)s" if books else ""
+    values = {"books": books, "today": nowdate()}
+
+    frappe.db.sql(f"""
+        UPDATE `tabBook` b
+        SET b.current_loan = NULL, b.current_member = NULL, b.due_date = NULL
+        {book_filter}
+    """, values)
+    frappe.db.sql(f"""
+        UPDATE `tabBook` b
+        JOIN (
+            SELECT `book`, MAX(`name`) AS loan
+            FROM `tabLoan`
+            WHERE `docstatus` < 2 AND `return_date` >= %(today)s AND `loan_date` <= %(today)s {loan_filter}
+            GROUP BY `book`
+        ) cur ON cur.book = b.name
+        JOIN `tabLoan` l ON l.name = cur.loan
+        SET b.current_loan = l.name, b.current_member = l.member, b.due_date = l.return_date
+    """, values)
+
+
+def close_earlier_loans(pairs):
+    """Mark loans of each (book, loan_date) that ended before that date as returned.
+
+    A book lent again must have come back by then, even if it was never checked
+    in. Their `returned_on` is set to the new loan's date, the latest it can be.
+    """
+    latest = {}
+    for book, loan_date in pairs:
+        if book and loan_date:
+            latest[book] = max(latest.get(book, getdate(loan_date)), getdate(loan_date))
+    if not latest:
+        return
+    values = [v for pair in latest.items() for v in pair]
+    frappe.db.sql(f"""
+        UPDATE `tabLoan`
+        SET `returned_on` = CASE `book` {" ".join(["WHEN %s THEN %s"] * len(latest))} END
+        WHERE `returned_on` IS NULL AND ({" OR ".join(["(`book` = %s AND `return_date` < %s)"] * len(latest))})
+    """, values + values)
+    if frappe.db.sql("SELECT ROW_COUNT()")[0][0]:
+        # They drop out of the overdue loans
+        report_cache.invalidate(report_cache.OVERDUE_LOANS, report_cache.DASHBOARD_SUMMARY)
+
+
+def refresh_lapsed_availability():
+    """Daily job: move availability on for books whose loan ended or started since the last refresh.
+
+    Loans start and end by the date changing, which fires no doc_event. Both
+    the books still showing a loan that has ended and the books showing none
+    while a loan covers today are picked up, so a missed day is caught up.
+    """
+    today = nowdate()
+    books = frappe.db.sql_list("""
+        SELECT `name` FROM `tabBook` WHERE `due_date` < %(today)s
+        UNION
+        SELECT l.`book`
+        FROM `tabLoan` l
+        JOIN `tabBook` b ON b.`name` = l.`book`
+        WHERE l.`docstatus` < 2 AND l.`return_date` >= %(today)s AND l.`loan_date` <= %(today)s
+            AND b.`current_loan` IS NULL
+    """, {"today": today})
+    refresh_books_availability(books)
+    frappe.db.commit()
+
+
+def rebuild_availability():
+    """Recompute availability for every book.
+
+    Returns the number of books that currently have a loan recorded.
+    """
+    refresh_books_availability()
+    frappe.db.commit()
+    return frappe.db.count("Book", {"current_loan": ["is", "set"]})
+
+
+def _covering_loan(book, on_date, exclude_loan=None):
+    conditions = ""
+    values = {"book": book, "on_date": on_date}
+    if exclude_loan:
+        conditions = "AND `name` != %(exclude_loan)s"
+        values["exclude_loan"] = exclude_loan
+
+    rows = frappe.db.sql(f"""
+        SELECT `name`, `member`, `return_date`
+        FROM `tabLoan`
+        WHERE `book` = %(book)s AND `return_date` >= %(on_date)s AND `loan_date` <= %(on_date)s
+            AND `docstatus` < 2 {conditions}
+        ORDER BY `return_date` DESC, `name` DESC
+        LIMIT 1
+    """, values, as_dict=True)
+    return rows[0] if rows else None
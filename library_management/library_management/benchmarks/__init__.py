@@ -0,0 +1,32 @@
+# Benchmarks are run from the bench CLI (see library_management/commands.py)
+# against a disposable site; they write synthetic data.
+
+# Vocabulary for synthetic titles and names.
+WORDS = (
+    "river shadow garden empire winter silent broken golden hidden ancient city night "
+    "ocean forest secret last house stone fire glass paper iron dream memory light "
+    "kingdom storm journey island mountain letter north summer daughter stranger"
+).split()
+SURNAMES = (
+    "smith johnson garcia brown okafor tanaka muller rossi kowalski haile dubois "
+    "nguyen silva larsen ivanova patel kim mensah"
+).split()
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Return {"p50": ..., ...} (nearest-rank) for a list of latency samples in ms."""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        rank = max(round(p / 100 * len(ordered)) - 1, 0)
+        result[f"p{p}"] = round(ordered[min(rank, len(ordered) - 1)], 3)
+    return result
+
+
+def synthetic_isbn(i):
+    """Deterministic, valid 979-prefixed ISBN-13 for synthetic book `i`."""
+    body = f"979{i:09d}"
+    total = sum(int(c) * (3 if n % 2 else 1) for n, c in enumerate(body))
+    return body + str((10 - total % 10) % 10)
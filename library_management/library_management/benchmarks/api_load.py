@@ -0,0 +1,467 @@
+# file: library_management/benchmarks/api_load.py
+# bench --site <site> benchmark-api --concurrency 8 --requests 200 --output baseline.json
+#
+# Drives every whitelisted method in library_management.api against a site
+# seeded by benchmarks.dataset and reports, per endpoint, latency percentiles,
+# throughput and the number of SQL statements per call.
+#
+# Calls are made in-process from `concurrency` threads, each with its own
+# site connection, as the logged-in librarian or one of the benchmark member
+# users. Every call runs in its own transaction and is rolled back afterwards,
+# so write endpoints can be measured repeatedly without drifting the dataset.
+
+import json
+import random
+import threading
+import time
+from types import ModuleType
+
+import frappe
+from frappe.utils import add_days, add_to_date, now, now_datetime, nowdate
+
+from library_management import change_feed
+from library_management.benchmarks import SURNAMES, WORDS, dataset, percentiles
+
+API_MODULES = (
+    "analytics_api", "auth_api", "book_api", "dashboard_api", "loan_api", "member_api",
+    "metrics_api", "register_api", "report_api", "reservation_api", "search_api", "sync_api",
+)
+
+# Whitelisted methods the in-process driver cannot call meaningfully.
+SKIPPED = {
+    "auth_api.login": "creates an HTTP session; measure through the web server",
+    "auth_api.logout": "needs an HTTP session",
+    "register_api.register_member": "creates and commits a User and API keys per call",
+    "book_api.import_books": "enqueues a background job for an uploaded File",
+    "report_api.export_member_loans_csv": "returns a WSGI file response; use export-loans for the writer",
+    "report_api.export_loans_csv": "returns a WSGI file response; use export-loans for the writer",
+    "report_api.submit_report_job": "enqueues a background job",
+    "report_api.get_report_job_status": "needs a submitted job",
+    "report_api.download_report_job": "returns a WSGI file response for a completed job",
+}
+
+# Endpoints that return a whole table are capped at this many calls per run.
+UNBOUNDED_CALLS = 3
+
+
+def run(concurrency=8, requests=200, endpoints=None, output=None, baseline=None, rng_seed=42):
+    """Benchmark each endpoint in turn; return (and optionally save) the results dict.
+
+    `endpoints` limits the run to the given "module.function" labels. With
+    `baseline`, the path of an earlier results file, each metric also gets its
+    relative change against that run.
+    """
+    rng = random.Random(rng_seed)
+    site = frappe.local.site
+    ctx = _context()
+
+    scenarios = {label: s for label, s in SCENARIOS.items() if not endpoints or label in endpoints}
+    results = {
+        "meta": {
+            "site": site,
+            "timestamp": now(),
+            "concurrency": concurrency,
+            "requests": requests,
+            "dataset": {doctype: frappe.db.count(doctype) for doctype in ("Book", "Member", "Loan", "Reservation")},
+        },
+        "endpoints": {},
+        "skipped": SKIPPED,
+        "uncovered": sorted(set(whitelisted_methods()) - set(SCENARIOS) - set(SKIPPED)),
+    }
+
+    for label, scenario in scenarios.items():
+        calls = min(requests, UNBOUNDED_CALLS) if scenario.get("unbounded") else requests
+        results["endpoints"][label] = _drive(site, scenario, ctx, calls, concurrency, rng.random())
+
+    if baseline:
+        with open(baseline) as f:
+            results["comparison"] = compare(json.load(f), results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True, default=str)
+    return results
+
+
+def compare(baseline, current):
+    """Relative change (current / baseline - 1) of each shared endpoint metric."""
+    deltas = {}
+    for label, metrics in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            continue
+        deltas[label] = {
+            key: round(value / before[key] - 1, 4)
+            for key, value in metrics.items()
+            if isinstance(value, (int, float)) and isinstance(before.get(key), (int, float)) and before[key]
+        }
+    return deltas
+
+
+def whitelisted_methods():
+    """Every "module.function" label in library_management.api that is whitelisted."""
+    labels = []
+    for module_name in API_MODULES:
+        module = frappe.get_module(f"library_management.api.{module_name}")
+        for name, fn in vars(module).items():
+            if callable(fn) and not isinstance(fn, ModuleType) and fn in frappe.whitelisted \
+                    and fn.__module__ == module.__name__:
+                labels.append(f"{module_name}.{name}")
+    return labels
+
+
+# ---------------- driver ----------------
+
+def _drive(site, scenario, ctx, calls, concurrency, seed):
+    fn = frappe.get_attr(f"library_management.api.{scenario['method']}")
+    samples, queries, errors = [], [], []
+    lock = threading.Lock()
+    shares = [calls // concurrency + (1 if i < calls % concurrency else 0) for i in range(concurrency)]
+
+    def worker(index, share):
+        rng = random.Random(f"{seed}:{index}")
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            counter = _count_queries()
+            for _ in range(share):
+                frappe.set_user(_user_for(scenario, ctx, rng))
+                # Fresh per-request state, as for a real request
+                frappe.local.__dict__.pop("library_principals", None)
+                try:
+                    request = scenario["make"](ctx, rng)
+                    frappe.local.form_dict = frappe._dict(request.get("form_dict") or {})
+                    counter[0] = 0
+                    start = time.perf_counter()
+                    fn(**request.get("kwargs", {}))
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        samples.append(elapsed)
+                        queries.append(counter[0])
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{type(e).__name__}: {e}")
+                finally:
+                    frappe.db.rollback()
+        finally:
+            frappe.destroy()
+
+    threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(shares) if n]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    return {
+        **percentiles(samples),
+        "calls": len(samples),
+        "errors": len(errors),
+        "error_sample": errors[:3],
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else None,
+        "throughput_rps": round(len(samples) / wall, 2) if wall else None,
+        "queries_per_call": round(sum(queries) / len(queries), 2) if queries else None,
+        "max_queries": max(queries) if queries else None,
+    }
+
+
+def _count_queries():
+    """Count statements issued on this thread's connection; returns the mutable counter."""
+    counter = [0]
+    real_sql = frappe.db.sql
+
+    def counting_sql(*args, **kwargs):
+        counter[0] += 1
+        return real_sql(*args, **kwargs)
+
+    frappe.db.sql = counting_sql
+    return counter
+
+
+def _user_for(scenario, ctx, rng):
+    if scenario["user"] == "member":
+        return rng.choice(ctx.member_users)
+    if scenario["user"] == "guest":
+        return "Guest"
+    return dataset.LIBRARIAN_USER
+
+
+def _context():
+    """Names of benchmark rows the scenarios pick from."""
+    today = nowdate()
+    users = dataset.get_users()
+    on_loan = frappe.db.sql("""
+        SELECT `name`, `current_loan`, `current_member`
+        FROM `tabBook`
+        WHERE `name` LIKE %s AND `due_date` >= %s
+        LIMIT 2000
+    """, (dataset.BOOK_PREFIX + "%", today), as_dict=True)
+    return frappe._dict(
+        books=_sample("Book", dataset.BOOK_PREFIX),
+        members=_sample("Member", dataset.MEMBER_PREFIX),
+        loans=_sample("Loan", dataset.LOAN_PREFIX),
+        reservations=_sample("Reservation", dataset.RESERVATION_PREFIX) or [""],
+        on_loan=on_loan,
+        available=frappe.db.sql_list("""
+            SELECT `name` FROM `tabBook`
+            WHERE `name` LIKE %s AND (`due_date` IS NULL OR `due_date` < %s)
+            LIMIT 2000
+        """, (dataset.BOOK_PREFIX + "%", today)),
+        member_users=[u for u in users if u != dataset.LIBRARIAN_USER] or [dataset.LIBRARIAN_USER],
+    )
+
+
+def _sample(doctype, prefix, limit=5000):
+    return frappe.db.sql_list(f"SELECT `name` FROM `tab{doctype}` WHERE `name` LIKE %s LIMIT {limit}", (prefix + "%",))
+
+
+# ---------------- scenarios ----------------
+# label -> {method, user: librarian | member | guest, make(ctx, rng) -> {kwargs, form_dict}, unbounded}
+# `make` runs as the scenario's user, inside the call's transaction but outside
+# the timed section, so it may insert the rows a delete/cancel endpoint needs.
+
+def _member_of(user):
+    return user.split("@")[0]
+
+
+def _new_book(rng):
+    return frappe.get_doc({
+        "doctype": "Book",
+        "title": f"Bench {rng.choice(WORDS).title()}",
+        "author": "Bench Author",
+        "isbn": f"{rng.randrange(10 ** 12, 10 ** 13)}",
+        "publish_date": "2000-01-01",
+    }).insert(ignore_permissions=True)
+
+
+def _new_member(rng):
+    frappe.local.skip_member_user_creation = True
+    try:
+        suffix = rng.randrange(10 ** 9)
+        return frappe.get_doc({
+            "doctype": "Member",
+            "fullname": "Bench Temp",
+            "membership_id": f"bench-tmp-{suffix}",
+            "email": f"bench-tmp-{suffix}@example.org",
+            "phone": "1234567890",
+        }).insert(ignore_permissions=True)
+    finally:
+        frappe.local.skip_member_user_creation = False
+
+
+def _own_reservation(ctx, rng):
+    """Insert a reservation for the current member user on a book that is on loan."""
+    member = _member_of(frappe.session.user)
+    for _ in range(10):
+        book = rng.choice(ctx.on_loan)
+        if book.current_member != member:
+            break
+    return frappe.get_doc({
+        "doctype": "Reservation",
+        "book": book.name,
+        "member": member,
+        "reservation_date": nowdate(),
+    }).insert(ignore_permissions=True)
+
+
+def _checkout_items(ctx, rng, count=10):
+    return [{
+        "book": book,
+        "member": rng.choice(ctx.members),
+        "loan_date": nowdate(),
+        "return_date": add_days(nowdate(), 14),
+    } for book in rng.sample(ctx.available, min(count, len(ctx.available)))]
+
+
+def _scenario(method, user, make=None, unbounded=False):
+    return {"method": method, "user": user, "make": make or (lambda ctx, rng: {}), "unbounded": unbounded}
+
+
+def _kwargs(**factories):
+    """make() that calls each factory(ctx, rng) for the keyword argument of the same name."""
+    return lambda ctx, rng: {"kwargs": {key: factory(ctx, rng) for key, factory in factories.items()}}
+
+
+def _any(attr):
+    return lambda ctx, rng: rng.choice(ctx[attr])
+
+
+def _some(attr, count=20):
+    return lambda ctx, rng: json.dumps(rng.sample(ctx[attr], min(count, len(ctx[attr]))))
+
+
+def _book_data(ctx, rng):
+    return json.dumps({
+        "title": f"Bench {rng.choice(WORDS).title()}",
+        "author": "Bench Author",
+        "isbn": f"{rng.randrange(10 ** 12, 10 ** 13)}",
+        "publish_date": "2000-01-01",
+    })
+
+
+def _member_data(ctx, rng):
+    n = rng.randrange(10 ** 9)
+    return json.dumps({
+        "fullname": "Bench New",
+        "membership_id": f"bench-new-{n}",
+        "email": f"bench-new-{n}@example.org",
+        "phone": "1234567890",
+    })
+
+
+def _update_member(ctx, rng):
+    member = rng.choice(ctx.members)
+    return {"kwargs": {
+        "member_id": member,
+        "data": json.dumps({"email": f"{member}@example.com", "phone": "1234567890"}),
+    }}
+
+
+def _create_loan(ctx, rng):
+    return {"form_dict": {"data": json.dumps(_checkout_items(ctx, rng, 1)[0])}}
+
+
+def _update_loan(ctx, rng):
+    return {"form_dict": {
+        "loan_id": rng.choice(ctx.on_loan).current_loan,
+        "data": json.dumps({"return_date": add_days(nowdate(), 21)}),
+    }}
+
+
+def _return_items(ctx, rng):
+    books = rng.sample(ctx.on_loan, min(10, len(ctx.on_loan)))
+    return json.dumps([{"loan": book.current_loan} for book in books])
+
+
+def _on_loan_book(ctx, rng):
+    return rng.choice(ctx.on_loan).name
+
+
+def _sync_poll(ctx, rng):
+    # A client that last synced an hour ago
+    doctype = rng.choice(("Book", "Loan", "Member", "Reservation"))
+    since = str(add_to_date(now_datetime(), hours=-1))
+    return {"kwargs": {"doctype": doctype, "sync_token": change_feed.encode_token(doctype, None, {
+        "modified": since, "name": "", "deleted": since, "round": None,
+    })}}
+
+
+def _isbn(ctx, rng):
+    return frappe.db.get_value("Book", rng.choice(ctx.books), "isbn")
+
+
+SCENARIOS = {
+    "auth_api.get_user_info": _scenario("auth_api.get_user_info", "member"),
+    # books
+    "book_api.get_books": _scenario("book_api.get_books", "guest", unbounded=True),
+    "book_api.get_catalog": _scenario("book_api.get_catalog", "guest", lambda ctx, rng: {
+        "kwargs": {"page_length": 50, "sort_by": "title"},
+    }),
+    "book_api.get_book": _scenario("book_api.get_book", "guest", _kwargs(book_id=_any("books"))),
+    "book_api.get_books_by_id": _scenario("book_api.get_books_by_id", "member", _kwargs(book_ids=_some("books"))),
+    "book_api.get_availability_calendar": _scenario("book_api.get_availability_calendar", "member", _kwargs(
+        books=lambda ctx, rng: json.dumps(rng.sample(ctx.books, min(200, len(ctx.books)))),
+    )),
+    "book_api.create_book": _scenario("book_api.create_book", "librarian", _kwargs(data=_book_data)),
+    "book_api.get_book_import_status": _scenario("book_api.get_book_import_status", "librarian", lambda ctx, rng: {
+        "kwargs": {"import_id": "bench"},
+    }),
+    "book_api.update_book": _scenario("book_api.update_book", "librarian", _kwargs(
+        book_id=_any("books"),
+        data=lambda ctx, rng: json.dumps({"title": f"Bench {rng.choice(WORDS).title()}"}),
+    )),
+    "book_api.delete_book": _scenario("book_api.delete_book", "librarian", _kwargs(
+        book_id=lambda ctx, rng: _new_book(rng).name,
+    )),
+    # analytics
+    "analytics_api.get_loan_trend": _scenario("analytics_api.get_loan_trend", "librarian", _kwargs(
+        from_date=lambda ctx, rng: add_days(nowdate(), -5 * 365),
+    )),
+    "analytics_api.get_top_books": _scenario("analytics_api.get_top_books", "librarian"),
+    "analytics_api.get_author_loan_lengths": _scenario("analytics_api.get_author_loan_lengths", "librarian"),
+    # dashboard
+    "dashboard_api.get_dashboard_summary": _scenario("dashboard_api.get_dashboard_summary", "librarian"),
+    # loans
+    "loan_api.get_loans": _scenario("loan_api.get_loans", "librarian", _kwargs(
+        filters=lambda ctx, rng: {"member": rng.choice(ctx.members)},
+    )),
+    "loan_api.get_loan": _scenario("loan_api.get_loan", "librarian", _kwargs(loan_id=_any("loans"))),
+    "loan_api.get_loans_by_id": _scenario("loan_api.get_loans_by_id", "librarian", _kwargs(
+        loan_ids=_some("loans"), expand=lambda ctx, rng: ["book", "member"],
+    )),
+    "loan_api.create_loan": _scenario("loan_api.create_loan", "librarian", _create_loan),
+    "loan_api.update_loan": _scenario("loan_api.update_loan", "librarian", _update_loan),
+    "loan_api.create_loans": _scenario("loan_api.create_loans", "librarian", _kwargs(
+        data=lambda ctx, rng: json.dumps(_checkout_items(ctx, rng)),
+    )),
+    "loan_api.return_loans": _scenario("loan_api.return_loans", "librarian", _kwargs(data=_return_items)),
+    "loan_api.delete_loan": _scenario("loan_api.delete_loan", "librarian", lambda ctx, rng: {
+        "form_dict": {"loan_id": rng.choice(ctx.loans)},
+    }),
+    "loan_api.get_books_on_loan": _scenario("loan_api.get_books_on_loan", "librarian", unbounded=True),
+    "loan_api.get_overdue_books": _scenario("loan_api.get_overdue_books", "librarian", unbounded=True),
+    # members
+    "member_api.get_members": _scenario("member_api.get_members", "librarian"),
+    "member_api.search_members": _scenario("member_api.search_members", "librarian", _kwargs(
+        query=lambda ctx, rng: rng.choice(WORDS + SURNAMES)[:4],
+    )),
+    "member_api.get_member": _scenario("member_api.get_member", "librarian", _kwargs(member_id=_any("members"))),
+    "member_api.get_members_by_id": _scenario("member_api.get_members_by_id", "librarian", _kwargs(
+        member_ids=_some("members"),
+    )),
+    "member_api.create_member": _scenario("member_api.create_member", "librarian", _kwargs(data=_member_data)),
+    "member_api.update_member": _scenario("member_api.update_member", "librarian", _update_member),
+    "member_api.delete_member": _scenario("member_api.delete_member", "librarian", _kwargs(
+        member_id=lambda ctx, rng: _new_member(rng).name,
+    )),
+    # metrics
+    "metrics_api.get_metrics": _scenario("metrics_api.get_metrics", "librarian"),
+    # reports
+    "report_api.get_current_loans": _scenario("report_api.get_current_loans", "librarian", unbounded=True),
+    "report_api.get_overdue_loans": _scenario("report_api.get_overdue_loans", "librarian", unbounded=True),
+    "report_api.get_report_cache_stats": _scenario("report_api.get_report_cache_stats", "librarian"),
+    "report_api.get_member_loans": _scenario("report_api.get_member_loans", "member", _kwargs(
+        email=lambda ctx, rng: frappe.session.user,
+    )),
+    # reservations
+    "reservation_api.get_reservations": _scenario("reservation_api.get_reservations", "librarian"),
+    "reservation_api.get_reservation": _scenario("reservation_api.get_reservation", "librarian", _kwargs(
+        reservation_id=_any("reservations"),
+    )),
+    "reservation_api.get_reservations_by_id": _scenario("reservation_api.get_reservations_by_id", "librarian", _kwargs(
+        reservation_ids=_some("reservations"), expand=lambda ctx, rng: ["book", "member"],
+    )),
+    "reservation_api.get_waitlist": _scenario("reservation_api.get_waitlist", "librarian", _kwargs(
+        book=_on_loan_book,
+    )),
+    "reservation_api.create_reservation": _scenario("reservation_api.create_reservation", "librarian", _kwargs(
+        data=lambda ctx, rng: {"book": _on_loan_book(ctx, rng), "member": rng.choice(ctx.members)},
+    )),
+    "reservation_api.update_reservation": _scenario("reservation_api.update_reservation", "librarian", _kwargs(
+        reservation_id=_any("reservations"),
+        data=lambda ctx, rng: {"reservation_date": nowdate()},
+    )),
+    "reservation_api.delete_reservation": _scenario("reservation_api.delete_reservation", "librarian", _kwargs(
+        reservation_id=_any("reservations"),
+    )),
+    "reservation_api.get_my_reservations": _scenario("reservation_api.get_my_reservations", "member"),
+    "reservation_api.get_my_queue_position": _scenario("reservation_api.get_my_queue_position", "member", _kwargs(
+        reservation_id=lambda ctx, rng: _own_reservation(ctx, rng).name,
+    )),
+    "reservation_api.create_my_reservation": _scenario("reservation_api.create_my_reservation", "member", _kwargs(
+        book_name=_on_loan_book,
+    )),
+    "reservation_api.cancel_my_reservation": _scenario("reservation_api.cancel_my_reservation", "member", _kwargs(
+        reservation_id=lambda ctx, rng: _own_reservation(ctx, rng).name,
+    )),
+    # search
+    "search_api.search_books": _scenario("search_api.search_books", "guest", _kwargs(
+        query=lambda ctx, rng: " ".join(rng.sample(WORDS, 2)),
+    )),
+    "search_api.autocomplete_books": _scenario("search_api.autocomplete_books", "guest", _kwargs(
+        prefix=lambda ctx, rng: rng.choice(WORDS)[:4],
+    )),
+    "search_api.get_books_by_isbn": _scenario("search_api.get_books_by_isbn", "guest", _kwargs(isbn=_isbn)),
+    # sync
+    "sync_api.get_changes": _scenario("sync_api.get_changes", "librarian", _sync_poll),
+}
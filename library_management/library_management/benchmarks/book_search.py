@@ -0,0 +1,61 @@
+# file: library_management/benchmarks/book_search.py
+# bench --site <site> benchmark-book-search --books 1000000 --queries 1000
+
+import random
+import time
+
+import frappe
+
+from library_management import book_search
+from library_management.benchmarks import SURNAMES, WORDS, percentiles, synthetic_isbn
+
+NAME_PREFIX = "bench-search-"
+SEED_CHUNK_SIZE = 2000
+
+
+def run(books=1_000_000, queries=1000, keep=False, seed=42):
+    """Seed `books` synthetic rows into the search index and time each query type.
+
+    Returns a dict of latency percentiles (ms) keyed by query type.
+    """
+    rng = random.Random(seed)
+    book_search.create_search_table()
+
+    seeded = _seed(books, rng)
+    try:
+        results = {
+            "books_indexed": frappe.db.sql(f"SELECT COUNT(*) FROM `{book_search.SEARCH_TABLE}`")[0][0],
+            "seeded": seeded,
+        }
+        workloads = {
+            "search": lambda: book_search.search(" ".join(rng.sample(WORDS, 2))),
+            "autocomplete": lambda: book_search.autocomplete(rng.choice(WORDS)[: rng.randint(3, 5)]),
+            "isbn": lambda: book_search.find_bysynthetic_isbn(synthetic_isbn(rng.randrange(books))),
+        }
+        for label, fn in workloads.items():
+            samples = []
+            for _ in range(queries):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) * 1000)
+            results[label] = percentiles(samples)
+        return results
+    finally:
+        if not keep:
+            frappe.db.sql(
+                f"DELETE FROM `{book_search.SEARCH_TABLE}` WHERE `name` LIKE %s", (NAME_PREFIX + "%",)
+            )
+            frappe.db.commit()
+
+
+def _seed(books, rng):
+    for start in range(0, books, SEED_CHUNK_SIZE):
+        rows = []
+        for i in range(start, min(start + SEED_CHUNK_SIZE, books)):
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+            author = f"{rng.choice(SURNAMES).title()}, {rng.choice(SURNAMES).title()}"
+            rows.append((f"{NAME_PREFIX}{i:08d}", title, author, synthetic_isbn(i), "2000-01-01"))
+        book_search._insert_rows(rows)
+        frappe.db.commit()
+    return books
+
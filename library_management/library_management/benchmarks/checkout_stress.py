@@ -0,0 +1,126 @@
+# file: library_management/benchmarks/checkout_stress.py
+# bench --site <site> benchmark-checkout-stress --processes 16 --books 5 --attempts 50
+#
+# Concurrency check for checkouts. `processes` worker processes, each with its
+# own site connection, call loan_api.create_loan for a handful of synthetic
+# books with random, heavily overlapping periods over the next WINDOW_DAYS,
+# committing every checkout that succeeds. All workers start at the same
+# instant. Afterwards the loans of those books are checked pairwise for
+# overlapping periods: any pair is a double loan that slipped past the checks.
+
+import json
+import multiprocessing
+import random
+import time
+
+import frappe
+from frappe.utils import add_days, now, nowdate
+
+PREFIX = "stress-"
+BOOK_PREFIX = f"{PREFIX}book-"
+MEMBER = f"{PREFIX}mem-0"
+WINDOW_DAYS = 30
+MAX_LOAN_DAYS = 7
+# Time the workers get to connect before they all start checking out.
+START_DELAY = 2.0
+
+
+def run(processes=16, books=5, attempts=50, keep=False, rng_seed=42):
+    """Run the workers and return {attempts, created, conflicts, errors, double_loans, seconds}."""
+    site, sites_path = frappe.local.site, frappe.local.sites_path
+    book_names = _setup(books)
+    try:
+        start_at = time.time() + START_DELAY
+        args = [(site, sites_path, book_names, attempts, f"{rng_seed}:{i}", start_at) for i in range(processes)]
+        # spawn, not fork: every worker must open its own database connection
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            outcomes = pool.starmap(_worker, args)
+        seconds = time.time() - start_at
+
+        errors = {}
+        for outcome in outcomes:
+            for error, count in outcome["errors"].items():
+                errors[error] = errors.get(error, 0) + count
+        return {
+            "processes": processes,
+            "books": books,
+            "attempts": processes * attempts,
+            "created": sum(o["created"] for o in outcomes),
+            "conflicts": sum(o["conflicts"] for o in outcomes),
+            "errors": errors,
+            "double_loans": count_double_loans(book_names),
+            "seconds": round(seconds, 3),
+        }
+    finally:
+        if not keep:
+            _cleanup(book_names)
+
+
+def count_double_loans(books):
+    """Number of pairs of live loans of the same book with overlapping periods."""
+    return frappe.db.sql("""
+        SELECT COUNT(*)
+        FROM `tabLoan` a
+        JOIN `tabLoan` b ON b.`book` = a.`book` AND b.`name` > a.`name`
+        WHERE a.`book` IN %(books)s AND a.`docstatus` < 2 AND b.`docstatus` < 2
+            AND a.`loan_date` <= b.`return_date` AND b.`loan_date` <= a.`return_date`
+    """, {"books": tuple(books)})[0][0]
+
+
+def _worker(site, sites_path, books, attempts, seed, start_at):
+    rng = random.Random(seed)
+    outcome = {"created": 0, "conflicts": 0, "errors": {}}
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    try:
+        from library_management.api import loan_api
+
+        frappe.set_user("Administrator")
+        time.sleep(max(start_at - time.time(), 0))
+        for _ in range(attempts):
+            loan_date = add_days(nowdate(), rng.randrange(WINDOW_DAYS))
+            frappe.local.form_dict = frappe._dict(data=json.dumps({
+                "book": rng.choice(books),
+                "member": MEMBER,
+                "loan_date": loan_date,
+                "return_date": add_days(loan_date, rng.randrange(MAX_LOAN_DAYS)),
+            }))
+            try:
+                loan_api.create_loan()
+                frappe.db.commit()
+                outcome["created"] += 1
+            except frappe.ValidationError:
+                frappe.db.rollback()
+                outcome["conflicts"] += 1
+            except Exception as e:
+                frappe.db.rollback()
+                outcome["errors"][type(e).__name__] = outcome["errors"].get(type(e).__name__, 0) + 1
+    finally:
+        frappe.destroy()
+    return outcome
+
+
+def _setup(books):
+    timestamp, user = now(), frappe.session.user
+    names = [f"{BOOK_PREFIX}{i:04d}" for i in range(books)]
+    _cleanup(names)
+    frappe.db.bulk_insert(
+        "Book", ["name", "title", "author", "isbn", "publish_date", "owner", "modified_by", "creation", "modified"],
+        [(name, f"Stress Book {i}", "Stress Author", f"{PREFIX}{i:04d}", "2000-01-01", user, user, timestamp, timestamp)
+         for i, name in enumerate(names)],
+    )
+    frappe.db.bulk_insert(
+        "Member", ["name", "fullname", "membership_id", "email", "phone", "owner", "modified_by", "creation", "modified"],
+        [(MEMBER, "Stress Member", MEMBER, f"{MEMBER}@example.com", "000000000", user, user, timestamp, timestamp)],
+    )
+    frappe.db.commit()
+    return names
+
+
+def _cleanup(books):
+    # Through delete_doc so availability, claims and analytics follow.
+    for loan in frappe.get_all("Loan", filters={"book": ["in", books]}, pluck="name"):
+        frappe.delete_doc("Loan", loan, ignore_permissions=True, force=True)
+    frappe.db.sql("DELETE FROM `tabBook` WHERE `name` IN %(books)s", {"books": tuple(books)})
+    frappe.db.sql("DELETE FROM `tabMember` WHERE `name` = %s", (MEMBER,))
+    frappe.db.commit()
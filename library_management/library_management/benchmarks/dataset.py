@@ -0,0 +1,205 @@
+# file: library_management/benchmarks/dataset.py
+# bench --site <site> seed-benchmark-data --books 1000000 --members 200000 --loans 10000000
+#
+# Synthetic library data for the API load benchmark. Rows are written with
+# multi-row INSERTs in committed chunks (doc_events are bypassed), then the
+# derived state those events normally maintain — Book availability, loan
+# claims, the book and member search indexes, waitlist counters and the
+# analytics rollups — is rebuilt in bulk.
+#
+# Distributions, roughly:
+# - loan dates span `years`, skewed towards the present (the library grows);
+# - a small set of books and members account for most loans (popularity skew);
+# - loan periods of one to four weeks, ACTIVE_SHARE of loans still running;
+# - reservations queue on books that are currently on loan.
+
+import random
+
+import frappe
+from frappe.utils import add_days, getdate, now, nowdate
+
+from library_management import analytics, book_search, loan_claims, member_search
+from library_management.availability import rebuild_availability
+from library_management.benchmarks import SURNAMES, WORDS, synthetic_isbn
+
+PREFIX = "bench-"
+BOOK_PREFIX = f"{PREFIX}book-"
+MEMBER_PREFIX = f"{PREFIX}mem-"
+LOAN_PREFIX = f"{PREFIX}loan-"
+RESERVATION_PREFIX = f"{PREFIX}res-"
+LIBRARIAN_USER = "bench-librarian@example.com"
+CHUNK_SIZE = 10_000
+
+ACTIVE_SHARE = 0.03
+LOAN_PERIODS = (7, 14, 14, 21, 28)
+AUDIT_COLUMNS = ("owner", "modified_by", "creation", "modified")
+
+
+def seed(books=1_000_000, members=200_000, loans=10_000_000, reservations=50_000, users=20,
+         years=5, rng_seed=42, progress=None):
+    """Write the synthetic dataset and return the number of rows per doctype."""
+    rng = random.Random(rng_seed)
+    report = progress or (lambda label, done, total: None)
+    columns = AUDIT_COLUMNS
+
+    _insert_chunked("Book", ["name", "title", "author", "isbn", "publish_date", *columns], books, lambda i: (
+        f"{BOOK_PREFIX}{i:08d}",
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title(),
+        f"{rng.choice(SURNAMES).title()}, {rng.choice(SURNAMES).title()}",
+        synthetic_isbn(i),
+        add_days("1950-01-01", rng.randrange(365 * 75)),
+    ), report)
+
+    _insert_chunked("Member", ["name", "fullname", "membership_id", "email", "phone", *columns], members, lambda i: (
+        f"{MEMBER_PREFIX}{i:07d}",
+        f"{rng.choice(SURNAMES).title()} {rng.choice(WORDS).title()}",
+        f"{MEMBER_PREFIX}{i:07d}",
+        _member_email(i),
+        f"{rng.randrange(10 ** 9, 10 ** 10)}",
+    ), report)
+
+    today = getdate(nowdate())
+    span = 365 * years
+
+    def loan_row(i):
+        if rng.random() < ACTIVE_SHARE:
+            loan_date = add_days(today, -rng.randrange(14))
+        else:
+            # rng.random() ** 1.5 puts more loans in recent years
+            loan_date = add_days(today, -14 - int(span * rng.random() ** 1.5))
+        return (
+            f"{LOAN_PREFIX}{i:09d}",
+            _skewed(rng, books, BOOK_PREFIX, 8),
+            _skewed(rng, members, MEMBER_PREFIX, 7),
+            loan_date,
+            add_days(loan_date, rng.choice(LOAN_PERIODS)),
+            0,
+        )
+
+    _insert_chunked("Loan", ["name", "book", "member", "loan_date", "return_date", "docstatus", *columns],
+                    loans, loan_row, report)
+
+    report("availability", 0, 1)
+    rebuild_availability()
+    loan_claims.rebuild()
+
+    on_loan = frappe.db.sql_list("""
+        SELECT `name` FROM `tabBook`
+        WHERE `name` LIKE %s AND `due_date` >= %s
+    """, (BOOK_PREFIX + "%", today))
+    seeded_reservations = _seed_reservations(rng, on_loan, members, reservations, columns, report)
+
+    report("search index", 0, 1)
+    book_search.rebuild_index()
+    member_search.rebuild_index()
+    report("analytics", 0, 1)
+    analytics.reconcile(months=None)
+    _create_users(min(users, members))
+
+    for table in ("tabBook", "tabMember", "tabLoan", "tabReservation"):
+        frappe.db.sql(f"ANALYZE TABLE `{table}`")
+    frappe.db.commit()
+
+    return {
+        "books": books,
+        "members": members,
+        "loans": loans,
+        "reservations": seeded_reservations,
+        "users": min(users, members) + 1,
+    }
+
+
+def clear():
+    """Delete everything `seed` wrote."""
+    for doctype, prefix in (
+        ("Reservation", RESERVATION_PREFIX),
+        ("Loan", LOAN_PREFIX),
+        ("Member", MEMBER_PREFIX),
+        ("Book", BOOK_PREFIX),
+    ):
+        frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE `name` LIKE %s", (prefix + "%",))
+        frappe.db.commit()
+
+    frappe.db.sql(f"DELETE FROM `{book_search.SEARCH_TABLE}` WHERE `name` LIKE %s", (BOOK_PREFIX + "%",))
+    frappe.db.sql(f"DELETE FROM `{member_search.SEARCH_TABLE}` WHERE `member` LIKE %s", (MEMBER_PREFIX + "%",))
+    for user in get_users():
+        frappe.delete_doc("User", user, ignore_permissions=True, force=True)
+    frappe.db.commit()
+    analytics.reconcile(months=None)
+    loan_claims.rebuild()
+
+
+def get_users():
+    """Benchmark users: the librarian followed by the member users."""
+    return frappe.get_all("User", filters={"name": ["like", f"{PREFIX}%@example.com"]}, pluck="name",
+                          order_by="name")
+
+
+def _insert_chunked(doctype, fields, total, make_row, report):
+    for start in range(0, total, CHUNK_SIZE):
+        audit = _audit_values()
+        rows = [(*make_row(i), *audit) for i in range(start, min(start + CHUNK_SIZE, total))]
+        frappe.db.bulk_insert(doctype, fields, rows)
+        frappe.db.commit()
+        report(doctype, start + len(rows), total)
+
+
+def _seed_reservations(rng, on_loan, members, total, columns, report):
+    if not on_loan or not members:
+        return 0
+
+    queue = {}
+    rows = []
+    today = nowdate()
+    for i in range(total):
+        book = rng.choice(on_loan)
+        queue[book] = queue.get(book, 0) + 1
+        rows.append((
+            f"{RESERVATION_PREFIX}{i:08d}", book, _skewed(rng, members, MEMBER_PREFIX, 7),
+            add_days(today, -rng.randrange(14)), "Waiting", queue[book],
+        ))
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        audit = _audit_values()
+        frappe.db.bulk_insert(
+            "Reservation", ["name", "book", "member", "reservation_date", "status", "queue_seq", *columns],
+            [(*row, *audit) for row in chunk],
+        )
+        frappe.db.commit()
+        report("Reservation", start + len(chunk), len(rows))
+
+    for book, seq in queue.items():
+        frappe.db.set_value("Book", book, "waitlist_seq", seq, update_modified=False)
+    frappe.db.commit()
+    return len(rows)
+
+
+def _create_users(count):
+    """One librarian plus `count` Member users linked to the first synthetic members."""
+    specs = [(LIBRARIAN_USER, "Bench Librarian", "Librarian")]
+    specs += [(_member_email(i), f"Bench Member {i}", "Member") for i in range(count)]
+    for email, first_name, role in specs:
+        if frappe.db.exists("User", email):
+            continue
+        frappe.get_doc({
+            "doctype": "User",
+            "email": email,
+            "first_name": first_name,
+            "send_welcome_email": 0,
+            "roles": [{"role": role}],
+        }).insert(ignore_permissions=True)
+    frappe.db.commit()
+
+
+def _member_email(i):
+    return f"{MEMBER_PREFIX}{i:07d}@example.com"
+
+
+def _skewed(rng, count, prefix, width):
+    """A popularity-skewed row name: low indexes are picked far more often."""
+    return f"{prefix}{int(count * rng.random() ** 2):0{width}d}"
+
+
+def _audit_values():
+    timestamp = now()
+    return ("Administrator", "Administrator", timestamp, timestamp)
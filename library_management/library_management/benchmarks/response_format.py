@@ -0,0 +1,78 @@
+# file: library_management/benchmarks/response_format.py
+# bench --site <site> benchmark-response-format --rows 100000
+#
+# Payload size and serialization time of a loan list in the default JSON
+# response versus the compact encodings of compact_response. The rows are
+# synthetic, shaped like get_loans rows with their lookups; nothing is read
+# from or written to the database.
+
+import datetime
+import gzip
+import json
+import random
+import time
+
+from frappe.utils.response import json_handler
+
+from library_management import compact_response
+from library_management.benchmarks import SURNAMES, WORDS
+
+
+def run(rows=100_000, repeat=3, seed=42):
+    """Return {encoding: {bytes, gzip_bytes, ms}} plus each compact encoding's gain over JSON.
+
+    `size_ratio` and `speedup` compare against the default JSON as sent;
+    `gzip_size_ratio` compares the gzipped compact body with it, and
+    `gzip_vs_json_gzip` with the JSON gzipped as well (e.g. by a proxy).
+    """
+    data = _rows(rows, random.Random(seed))
+    encoders = {
+        # What Frappe does with a whitelisted method's return value
+        "json": lambda: json.dumps({"message": data}, default=json_handler, separators=(",", ":")).encode(),
+        "columnar": lambda: compact_response.encode(data, compact_response.COLUMNAR)[0],
+    }
+    try:
+        import msgpack
+        encoders["msgpack"] = lambda: compact_response.encode(data, compact_response.MSGPACK)[0]
+    except ImportError:
+        pass
+
+    results = {"rows": rows}
+    for label, encoder in encoders.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = encoder()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = {
+            "bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body, compresslevel=compact_response.COMPRESS_LEVEL)),
+            "ms": round(min(timings), 3),
+        }
+
+    baseline = results["json"]
+    for label in encoders:
+        if label != "json":
+            results[label]["size_ratio"] = round(baseline["bytes"] / results[label]["bytes"], 2)
+            results[label]["speedup"] = round(baseline["ms"] / results[label]["ms"], 2)
+            results[label]["gzip_size_ratio"] = round(baseline["bytes"] / results[label]["gzip_bytes"], 2)
+            results[label]["gzip_vs_json_gzip"] = round(baseline["gzip_bytes"] / results[label]["gzip_bytes"], 2)
+    return results
+
+
+def _rows(count, rng):
+    today = datetime.date.today()
+    rows = []
+    for _ in range(count):
+        loan_date = today - datetime.timedelta(days=rng.randrange(365))
+        rows.append({
+            "name": f"{rng.getrandbits(40):010x}",
+            "book": f"bench-book-{rng.randrange(1_000_000):08d}",
+            "member": f"bench-mem-{rng.randrange(200_000):07d}",
+            "loan_date": loan_date,
+            "return_date": loan_date + datetime.timedelta(days=rng.choice((7, 14, 21, 28))),
+            "docstatus": 0,
+            "book_title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title(),
+            "member_fullname": f"{rng.choice(SURNAMES).title()} {rng.choice(WORDS).title()}",
+        })
+    return rows
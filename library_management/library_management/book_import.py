@@ -0,0 +1,206 @@
+# file: library_management/book_import.py
+#
+# Streaming Book catalog import from CSV or JSONL.
+#
+# Rows are read one at a time and processed in fixed-size batches, so memory
+# does not depend on file size. Each batch is validated, de-duplicated on the
+# normalized ISBN (within the batch and against the catalog in one query),
+# written with a multi-row INSERT, and committed together with the job's
+# checkpoint. An interrupted job re-run with the same import id skips the rows
+# already committed and carries on.
+
+import csv
+import hashlib
+import json
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import getdate, now
+
+from library_management import book_search, report_cache
+from library_management.isbn import is_valid_isbn, normalize_isbn
+
+DEFAULT_BATCH_SIZE = 1000
+BOOK_FIELDS = ("title", "author", "isbn", "publish_date")
+CHECKPOINT_KEY = "library_management:book_import:{0}"
+
+
+def import_books(file_path, file_format=None, batch_size=DEFAULT_BATCH_SIZE, import_id=None, restart=False,
+                 progress=None):
+    """Import Books from `file_path` and return the final job status dict.
+
+    `file_format` is "csv" or "jsonl" (guessed from the extension if omitted).
+    `progress`, if given, is called with the status dict after every batch.
+    Row-level errors are appended to `<file_path>.errors.csv`.
+    """
+    file_format = (file_format or os.path.splitext(file_path)[1].lstrip(".")).lower()
+    if file_format not in ("csv", "jsonl"):
+        frappe.throw(_("Book import supports .csv and .jsonl files."))
+
+    import_id = import_id or default_import_id(file_path)
+    status = None if restart else get_import_status(import_id)
+    if status and status.get("status") == "completed":
+        return status
+
+    status = status or {
+        "import_id": import_id,
+        "file": file_path,
+        "error_file": f"{file_path}.errors.csv",
+        "status": "running",
+        "rows_read": 0,
+        "inserted": 0,
+        "duplicates": 0,
+        "errors": 0,
+    }
+    status["status"] = "running"
+    resume_after = status["rows_read"]
+    if not resume_after and os.path.exists(status["error_file"]):
+        os.remove(status["error_file"])
+
+    try:
+        with open(file_path, newline="", encoding="utf-8-sig") as source, \
+                open(status["error_file"], "a", newline="", encoding="utf-8") as error_file:
+            errors = csv.writer(error_file)
+            if not resume_after:
+                errors.writerow(["row", "error", "data"])
+            batch = []
+            for row_number, row in enumerate(_read_rows(source, file_format), start=1):
+                if row_number <= resume_after:
+                    continue
+                batch.append((row_number, row))
+                if len(batch) >= batch_size:
+                    _process_batch(batch, status, errors)
+                    _notify(status, progress)
+                    batch = []
+
+            if batch:
+                _process_batch(batch, status, errors)
+
+        status["status"] = "completed"
+        _save_checkpoint(status)
+        frappe.db.commit()
+        _notify(status, progress)
+    except Exception:
+        frappe.db.rollback()
+        status["status"] = "failed"
+        _save_checkpoint(status)
+        frappe.db.commit()
+        frappe.log_error(title=_("Book import {0} failed").format(import_id))
+        raise
+
+    return status
+
+
+def get_import_status(import_id):
+    value = frappe.db.get_global(CHECKPOINT_KEY.format(import_id))
+    return json.loads(value) if value else None
+
+
+def default_import_id(file_path):
+    """Stable id for a file so re-running the same import resumes it."""
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}:{stat.st_size}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _read_rows(source, file_format):
+    if file_format == "csv":
+        reader = csv.DictReader(source)
+        reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames or []]
+        yield from reader
+        return
+
+    for line in source:
+        line = line.strip()
+        if not line:
+            # Blank lines still count so row numbers match the file.
+            yield {}
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield {"__error__": _("Invalid JSON")}
+
+
+def _process_batch(batch, status, errors):
+    """Validate, de-duplicate and insert one batch, then commit it with the checkpoint."""
+    valid = {}
+    rejected = []
+    for row_number, row in batch:
+        book, error = _clean_row(row)
+        if error:
+            rejected.append([row_number, error, json.dumps(row, default=str)])
+            status["errors"] += 1
+        elif book["isbn"] in valid:
+            status["duplicates"] += 1
+        else:
+            valid[book["isbn"]] = book
+
+    if valid:
+        existing = {
+            r[0] for r in frappe.db.sql(f"""
+                SELECT `isbn` FROM `{book_search.SEARCH_TABLE}` WHERE `isbn` IN %(isbns)s
+                UNION
+                SELECT `isbn` FROM `tabBook` WHERE `isbn` IN %(isbns)s
+            """, {"isbns": tuple(valid)})
+        }
+        status["duplicates"] += len(existing & valid.keys())
+        books = [book for isbn, book in valid.items() if isbn not in existing]
+
+        if books:
+            timestamp, user = now(), frappe.session.user
+            for book in books:
+                book["name"] = frappe.generate_hash(length=10)
+            frappe.db.bulk_insert(
+                "Book",
+                ["name", *BOOK_FIELDS, "owner", "modified_by", "creation", "modified"],
+                [(b["name"], *(b[f] for f in BOOK_FIELDS), user, user, timestamp, timestamp) for b in books],
+            )
+            book_search.index_books(books)
+            report_cache.invalidate(report_cache.DASHBOARD_SUMMARY)
+            status["inserted"] += len(books)
+
+    status["rows_read"] = batch[-1][0]
+    _save_checkpoint(status)
+    frappe.db.commit()
+
+    # Written only once the batch is committed, so a resumed job never
+    # reports the same row twice.
+    errors.writerows(rejected)
+
+
+def _clean_row(row):
+    """Return (book, None) for a valid row or (None, error message)."""
+    if not isinstance(row, dict):
+        return None, _("Expected an object per line")
+    if row.get("__error__"):
+        return None, row["__error__"]
+    if not row:
+        return None, _("Empty row")
+
+    book = {f: (str(row.get(f) or "")).strip() for f in BOOK_FIELDS}
+    missing = [f for f in BOOK_FIELDS if not book[f]]
+    if missing:
+        return None, _("Missing {0}").format(", ".join(missing))
+    if not is_valid_isbn(book["isbn"]):
+        return None, _("Invalid ISBN {0}").format(book["isbn"])
+
+    try:
+        book["publish_date"] = getdate(book["publish_date"])
+    except Exception:
+        return None, _("Invalid publish date {0}").format(book["publish_date"])
+
+    book["isbn"] = normalize_isbn(book["isbn"])
+    return book, None
+
+
+def _save_checkpoint(status):
+    status["updated"] = now()
+    frappe.db.set_global(CHECKPOINT_KEY.format(status["import_id"]), json.dumps(status))
+
+
+def _notify(status, progress):
+    if progress:
+        progress(status)
+    frappe.publish_realtime("book_import_progress", status, user=frappe.session.user)
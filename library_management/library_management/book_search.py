@@ -0,0 +1,213 @@
+# file: library_management/book_search.py
+
+import re
+
+import frappe
+from frappe.utils import cint
+
+from library_management.isbn import clean_isbn, normalize_isbn
+
+SEARCH_TABLE = "__book_search"
+REBUILD_CHUNK_SIZE = 5000
+MAX_RESULTS = 100
+FULLTEXT_SETTINGS_KEY = "library_management:book_search:fulltext_settings"
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def create_search_table():
+    """Create the Book search index table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{SEARCH_TABLE}` (
+            `name` VARCHAR(140) NOT NULL,
+            `title` VARCHAR(140),
+            `author` VARCHAR(140),
+            `isbn` VARCHAR(20),
+            `publish_date` DATE,
+            PRIMARY KEY (`name`),
+            KEY `title` (`title`),
+            KEY `isbn` (`isbn`),
+            FULLTEXT KEY `title_author_ft` (`title`, `author`),
+            FULLTEXT KEY `title_ft` (`title`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+# ---------------- Index maintenance (Book doc_events) ----------------
+
+def index_book(doc, method=None):
+    """Upsert a single Book into the search index (Book on_update)."""
+    _insert_rows([_index_row(doc)])
+
+
+def index_books(books):
+    """Upsert many Books (dicts with name/title/author/isbn/publish_date) in one statement.
+
+    For bulk writers that bypass the Book doc_events.
+    """
+    _insert_rows([_index_row(frappe._dict(book)) for book in books])
+
+
+def unindex_book(doc, method=None):
+    """Remove a Book from the search index (Book on_trash)."""
+    frappe.db.sql(f"DELETE FROM `{SEARCH_TABLE}` WHERE `name` = %s", (doc.name,))
+
+
+def reindex_renamed_book(doc, method=None, old=None, new=None, merge=False):
+    """Move the index entry of a renamed Book to its new name (Book after_rename)."""
+    frappe.db.sql(f"DELETE FROM `{SEARCH_TABLE}` WHERE `name` = %s", (old,))
+    _insert_rows([_index_row(frappe.db.get_value(
+        "Book", new, ["name", "title", "author", "isbn", "publish_date"], as_dict=True
+    ))])
+
+
+def rebuild_index(chunk_size=REBUILD_CHUNK_SIZE):
+    """Rebuild the whole search index from `tabBook` in keyset-ordered chunks.
+
+    Returns the number of books indexed.
+    """
+    create_search_table()
+    frappe.db.sql(f"DELETE FROM `{SEARCH_TABLE}`")
+
+    last_name = ""
+    total = 0
+    while True:
+        books = frappe.db.sql("""
+            SELECT `name`, `title`, `author`, `isbn`, `publish_date`
+            FROM `tabBook`
+            WHERE `name` > %s
+            ORDER BY `name`
+            LIMIT %s
+        """, (last_name, chunk_size), as_dict=True)
+        if not books:
+            break
+
+        _insert_rows([_index_row(book) for book in books])
+        frappe.db.commit()
+
+        total += len(books)
+        last_name = books[-1].name
+
+    return total
+
+
+def _index_row(book):
+    return (book.name, book.title, book.author, normalize_isbn(book.isbn), book.publish_date)
+
+
+def _insert_rows(rows):
+    if not rows:
+        return
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    frappe.db.sql(f"""
+        INSERT INTO `{SEARCH_TABLE}` (`name`, `title`, `author`, `isbn`, `publish_date`)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE
+            `title` = VALUES(`title`),
+            `author` = VALUES(`author`),
+            `isbn` = VALUES(`isbn`),
+            `publish_date` = VALUES(`publish_date`)
+    """, [value for row in rows for value in row])
+
+
+# ---------------- Queries ----------------
+
+def search(query, limit=20):
+    """Ranked full-text search over title and author; title matches weigh double."""
+    terms = _tokens(query)
+    if not terms:
+        return []
+
+    # Every term must match; the last one is treated as a prefix so results
+    # keep up with a user who is still typing.
+    boolean_query = " ".join(f"+{t}" for t in terms[:-1]) + f" +{terms[-1]}*"
+    natural_query = " ".join(terms)
+
+    return frappe.db.sql(f"""
+        SELECT
+            `name`, `title`, `author`, `isbn`, `publish_date`,
+            (2 * MATCH(`title`) AGAINST (%(natural)s)
+                + MATCH(`title`, `author`) AGAINST (%(natural)s)) AS score
+        FROM `{SEARCH_TABLE}`
+        WHERE MATCH(`title`, `author`) AGAINST (%(boolean)s IN BOOLEAN MODE)
+        ORDER BY score DESC, `title` ASC
+        LIMIT %(limit)s
+    """, {"natural": natural_query, "boolean": boolean_query.strip(), "limit": _limit(limit)}, as_dict=True)
+
+
+def autocomplete(prefix, limit=10):
+    """Suggest books whose title starts with `prefix`, then books with a word starting with it."""
+    prefix = (prefix or "").strip()
+    if not prefix:
+        return []
+    limit = _limit(limit)
+
+    results = frappe.db.sql(f"""
+        SELECT `name`, `title`, `author`
+        FROM `{SEARCH_TABLE}`
+        WHERE `title` LIKE %s
+        ORDER BY `title` ASC
+        LIMIT %s
+    """, (_escape_like(prefix) + "%", limit), as_dict=True)
+
+    terms = _tokens(prefix)
+    if len(results) < limit and terms:
+        seen = {row.name for row in results}
+        boolean_query = " ".join(f"+{t}" for t in terms[:-1]) + f" +{terms[-1]}*"
+        more = frappe.db.sql(f"""
+            SELECT `name`, `title`, `author`
+            FROM `{SEARCH_TABLE}`
+            WHERE MATCH(`title`) AGAINST (%s IN BOOLEAN MODE)
+            LIMIT %s
+        """, (boolean_query.strip(), limit + len(seen)), as_dict=True)
+        results.extend(row for row in more if row.name not in seen)
+
+    return results[:limit]
+
+
+def find_by_isbn(isbn):
+    """Return books whose ISBN matches `isbn` in either its ISBN-10 or ISBN-13 spelling."""
+    if not clean_isbn(isbn):
+        return []
+    return frappe.db.sql(f"""
+        SELECT `name`, `title`, `author`, `isbn`, `publish_date`
+        FROM `{SEARCH_TABLE}`
+        WHERE `isbn` = %s
+    """, (normalize_isbn(isbn),), as_dict=True)
+
+
+def _tokens(text):
+    """Lower-cased words of `text` that InnoDB FULLTEXT indexes.
+
+    A required (+) term that is a stopword or shorter than
+    innodb_ft_min_token_size matches no row in boolean mode, so such words
+    are dropped: "the last house" searches for +last +house*.
+    """
+    settings = frappe.cache().get_value(FULLTEXT_SETTINGS_KEY, generator=_read_fulltext_settings)
+    stopwords = set(settings["stopwords"])
+    return [
+        t for t in _TOKEN.findall((text or "").lower())
+        if len(t) >= settings["min_token_size"] and t not in stopwords
+    ]
+
+
+def _read_fulltext_settings():
+    min_token_size, enabled, table = frappe.db.sql("""
+        SELECT @@innodb_ft_min_token_size, @@innodb_ft_enable_stopword, @@innodb_ft_server_stopword_table
+    """)[0]
+    if not cint(enabled):
+        stopwords = []
+    elif table:
+        # "database/table", as InnoDB expects it
+        stopwords = frappe.db.sql_list("SELECT `value` FROM `{}`.`{}`".format(*table.split("/", 1)))
+    else:
+        stopwords = frappe.db.sql_list("SELECT `value` FROM `information_schema`.`INNODB_FT_DEFAULT_STOPWORD`")
+    return {"min_token_size": cint(min_token_size), "stopwords": [w.lower() for w in stopwords]}
+
+
+def _limit(limit):
+    return min(max(cint(limit), 1), MAX_RESULTS)
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,205 @@
+# file: library_management/change_feed.py
+#
+# Change feed for client-side caches of Book, Loan, Member and Reservation.
+#
+# A client first pages through the whole list with no sync token. After that
+# it passes the token from its last response and gets only the rows whose
+# `modified` is newer, plus `deleted`: the names of rows deleted since. Rows
+# are read in (modified, name) order from the `modified_name_index`
+# (`member_modified_index` for a member's own loans and reservations), so a
+# poll costs in proportion to what changed, not to the table size.
+#
+# Deletes cannot be read from the table itself, so on_trash (and the loan
+# archive, which removes loans from `tabLoan`) records a tombstone in
+# `__sync_tombstone`. Tombstones are kept for TOMBSTONE_DAYS. A token older
+# than that answers with `reset`: the client drops its cache and syncs again
+# from scratch. A loan or reservation moved to another member leaves the
+# previous member's scoped feed the same way: on_update records a tombstone
+# under that member, and feeds the row still belongs to skip it.
+#
+# `modified` is set when a write starts, not when it commits, so a row can
+# become visible with a timestamp a poll has already passed. Each sync round
+# therefore resumes SETTLE_SECONDS before the point where it started. Rows
+# and deletes from those last seconds may be sent twice; clients apply them
+# as upserts and deletes by name, so a repeat is harmless.
+
+import base64
+import json
+
+import frappe
+from frappe import _
+from frappe.exceptions import ValidationError
+from frappe.utils import add_days, add_to_date, cint, now, now_datetime
+
+TOMBSTONE_TABLE = "__sync_tombstone"
+TOMBSTONE_DAYS = 30
+SETTLE_SECONDS = 30
+DEFAULT_PAGE_LENGTH = 500
+MAX_PAGE_LENGTH = 2000
+
+# Doctypes whose rows belong to a member; members only sync their own.
+MEMBER_SCOPED = ("Loan", "Reservation")
+
+
+def create_tombstone_table():
+    """Create the tombstone table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{TOMBSTONE_TABLE}` (
+            `doctype` VARCHAR(140) NOT NULL,
+            `name` VARCHAR(140) NOT NULL,
+            `member` VARCHAR(140),
+            `deleted` DATETIME(6) NOT NULL,
+            PRIMARY KEY (`doctype`, `name`),
+            KEY `doctype_deleted_index` (`doctype`, `deleted`),
+            KEY `doctype_member_deleted_index` (`doctype`, `member`, `deleted`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def get_changes(doctype, fields, sync_token=None, page_length=DEFAULT_PAGE_LENGTH, member=None):
+    """Return {data, deleted, sync_token, has_more, reset} for one page of changes to `doctype`.
+
+    `fields` are the columns returned besides `name` and `modified`; `member`
+    limits a MEMBER_SCOPED doctype to that member's rows. While `has_more` is
+    set, call again with the returned token right away; `deleted` is filled
+    in on the last page of a round.
+    """
+    page_length = min(max(cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+    settled = str(add_to_date(now_datetime(), seconds=-SETTLE_SECONDS))
+
+    state = decode_token(sync_token, doctype, member) if sync_token else None
+    reset = bool(sync_token) and state is None
+    if state is None:
+        # A full sync: every row, and no deletes to report
+        state = {"modified": None, "name": "", "deleted": None, "round": None}
+    # The point each round resumes from once it has caught up
+    state["round"] = state["round"] or settled
+
+    conditions = []
+    values = {"limit": page_length + 1}
+    if member:
+        conditions.append("`member` = %(member)s")
+        values["member"] = member
+    if state["modified"]:
+        conditions.append("(`modified` > %(modified)s OR (`modified` = %(modified)s AND `name` > %(name)s))")
+        values.update(modified=state["modified"], name=state["name"])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns = ", ".join(f"`{f}`" for f in dict.fromkeys(("name", "modified", *fields)))
+
+    rows = frappe.db.sql(f"""
+        SELECT {columns}
+        FROM `tab{doctype}`
+        {where}
+        ORDER BY `modified`, `name`
+        LIMIT %(limit)s
+    """, values, as_dict=True)
+
+    has_more = len(rows) > page_length
+    if has_more:
+        rows = rows[:page_length]
+        next_state = dict(state, modified=str(rows[-1].modified), name=rows[-1].name)
+        deleted = []
+    else:
+        deleted = get_tombstones(doctype, state["deleted"], member) if state["deleted"] else []
+        next_state = {"modified": state["round"], "name": "", "deleted": state["round"], "round": None}
+
+    return {
+        "data": rows,
+        "deleted": deleted,
+        "sync_token": encode_token(doctype, member, next_state),
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+
+def get_tombstones(doctype, since, member=None):
+    """Names of `doctype` rows deleted after `since` (only `member`'s rows if given).
+
+    Rows that still exist, and still belong to `member` if given, were moved
+    to another member rather than deleted, so they are left out.
+    """
+    conditions = ["t.`doctype` = %(doctype)s", "t.`deleted` > %(since)s"]
+    if member:
+        conditions.append("t.`member` = %(member)s")
+    live = "AND d.`member` = %(member)s" if member else ""
+    return frappe.db.sql_list(f"""
+        SELECT t.`name`
+        FROM `{TOMBSTONE_TABLE}` t
+        WHERE {" AND ".join(conditions)}
+            AND NOT EXISTS (SELECT 1 FROM `tab{doctype}` d WHERE d.`name` = t.`name` {live})
+        ORDER BY t.`deleted`
+    """, {"doctype": doctype, "since": since, "member": member})
+
+
+def add_tombstones(doctype, names):
+    """Record that the `doctype` rows `names` are being deleted. Call before the rows are removed."""
+    names = tuple(names)
+    if not names:
+        return
+    member = "`member`" if doctype in MEMBER_SCOPED else "NULL"
+    frappe.db.sql(f"""
+        REPLACE INTO `{TOMBSTONE_TABLE}` (`doctype`, `name`, `member`, `deleted`)
+        SELECT %(doctype)s, `name`, {member}, %(now)s
+        FROM `tab{doctype}`
+        WHERE `name` IN %(names)s
+    """, {"doctype": doctype, "names": names, "now": now()})
+
+
+def prune_tombstones():
+    """Daily job: forget deletes older than TOMBSTONE_DAYS."""
+    frappe.db.sql(f"DELETE FROM `{TOMBSTONE_TABLE}` WHERE `deleted` < %s", (add_days(now(), -TOMBSTONE_DAYS),))
+    frappe.db.commit()
+
+
+def encode_token(doctype, member, state):
+    payload = json.dumps([doctype, member, state], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_token(token, doctype, member=None):
+    """Return the sync state in `token`, or None if the client has to sync from scratch."""
+    try:
+        token_doctype, token_member, state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        state = {key: state[key] for key in ("modified", "name", "deleted", "round")}
+    except Exception:
+        frappe.throw(_("Invalid sync token."), ValidationError)
+    if token_doctype != doctype:
+        frappe.throw(_("This sync token is for {0}, not {1}.").format(_(token_doctype), _(doctype)), ValidationError)
+
+    # Synced as someone else, or missed deletes that are no longer recorded
+    if token_member != member:
+        return None
+    if state["deleted"] and state["deleted"] < str(add_days(now_datetime(), -TOMBSTONE_DAYS)):
+        return None
+    return state
+
+
+# ---------------- doc_events ----------------
+
+def on_insert(doc, method=None):
+    # A name can be reused; its old tombstone must not delete the new row.
+    frappe.db.sql(f"DELETE FROM `{TOMBSTONE_TABLE}` WHERE `doctype` = %s AND `name` = %s", (doc.doctype, doc.name))
+
+
+def on_update(doc, method=None):
+    """A row moved to another member is gone from the previous member's scoped feed."""
+    previous = doc.get_doc_before_save()
+    if not previous or not previous.get("member") or previous.member == doc.member:
+        return
+    frappe.db.sql(f"""
+        REPLACE INTO `{TOMBSTONE_TABLE}` (`doctype`, `name`, `member`, `deleted`)
+        VALUES (%s, %s, %s, %s)
+    """, (doc.doctype, doc.name, previous.member, now()))
+
+
+def on_trash(doc, method=None):
+    add_tombstones(doc.doctype, [doc.name])
+
+
+def on_rename(doc, method=None, old=None, new=None, merge=False):
+    """The old name is gone and the row lives on under the new one."""
+    frappe.db.sql(f"""
+        REPLACE INTO `{TOMBSTONE_TABLE}` (`doctype`, `name`, `member`, `deleted`)
+        VALUES (%s, %s, %s, %s)
+    """, (doc.doctype, old, doc.get("member") if doc.doctype in MEMBER_SCOPED else None, now()))
+    frappe.db.sql(f"UPDATE `tab{doc.doctype}` SET `modified` = %s WHERE `name` = %s", (now(), new))
@@ -0,0 +1,298 @@
+# file: library_management/commands.py
+# bench CLI commands, e.g. `bench --site mysite rebuild-book-search`
+
+import json
+
+import click
+from frappe.commands import pass_context
+from frappe.exceptions import SiteNotSpecifiedError
+
+
+def _for_each_site(context, fn):
+    import frappe
+
+    if not context.sites:
+        raise SiteNotSpecifiedError
+
+    for site in context.sites:
+        try:
+            frappe.init(site=site)
+            frappe.connect()
+            fn(site)
+        finally:
+            frappe.destroy()
+
+
+@click.command("rebuild-book-search")
+@pass_context
+def rebuild_book_search(context):
+    """Rebuild the Book full-text / prefix / ISBN search index."""
+    from library_management.book_search import rebuild_index
+
+    def run(site):
+        count = rebuild_index()
+        click.echo(f"{site}: indexed {count} books")
+
+    _for_each_site(context, run)
+
+
+@click.command("rebuild-member-search")
+@pass_context
+def rebuild_member_search(context):
+    """Rebuild the Member name / membership ID / email / phone search index."""
+    from library_management.member_search import rebuild_index
+
+    def run(site):
+        count = rebuild_index()
+        click.echo(f"{site}: indexed {count} members")
+
+    _for_each_site(context, run)
+
+
+@click.command("rebuild-loan-analytics")
+@click.option("--months", type=int, default=None, help="Only recompute this many recent months (default: all history)")
+@pass_context
+def rebuild_loan_analytics(context, months=None):
+    """Recompute the circulation analytics rollups from both loan tiers."""
+    from library_management.analytics import reconcile
+
+    def run(site):
+        since = reconcile(months=months)
+        click.echo(f"{site}: analytics rebuilt from {since or 'the first loan'}")
+
+    _for_each_site(context, run)
+
+
+@click.command("rebuild-loan-claims")
+@pass_context
+def rebuild_loan_claims(context):
+    """Recompute the per-day loan claims that stop a book being loaned out twice."""
+    from library_management.loan_claims import rebuild
+
+    def run(site):
+        result = rebuild()
+        click.echo(f"{site}: claimed {result.claimed} loan days")
+        for loan in result.conflicts:
+            click.echo(f"{site}: loan {loan} overlaps an earlier loan of its book")
+
+    _for_each_site(context, run)
+
+
+@click.command("benchmark-checkout-stress")
+@click.option("--processes", default=16, help="Concurrent worker processes")
+@click.option("--books", default=5, help="Books the workers compete for")
+@click.option("--attempts", default=50, help="Checkouts attempted per process")
+@click.option("--keep", is_flag=True, default=False, help="Keep the loans and books written by the run")
+@pass_context
+def benchmark_checkout_stress(context, processes, books, attempts, keep):
+    """Check out a few books from many processes at once and count double loans."""
+    from library_management.benchmarks.checkout_stress import run as run_stress
+
+    def run(site):
+        result = run_stress(processes=processes, books=books, attempts=attempts, keep=keep)
+        click.echo(f"{site}: {json.dumps(result, indent=2)}")
+        if result["double_loans"]:
+            raise click.ClickException(f"{result['double_loans']} overlapping loans were created.")
+
+    _for_each_site(context, run)
+
+
+@click.command("rebuild-book-availability")
+@pass_context
+def rebuild_book_availability(context):
+    """Recompute each Book's current loan, borrower and due date from tabLoan."""
+    from library_management.availability import rebuild_availability
+
+    def run(site):
+        count = rebuild_availability()
+        click.echo(f"{site}: {count} books have a loan on record")
+
+    _for_each_site(context, run)
+
+
+@click.command("import-books")
+@click.argument("file_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "jsonl"]), help="Defaults to the file extension")
+@click.option("--batch-size", default=1000, help="Rows per INSERT / commit")
+@click.option("--import-id", help="Checkpoint id; defaults to one derived from the file path and size")
+@click.option("--restart", is_flag=True, default=False, help="Ignore any saved checkpoint and start from row 1")
+@pass_context
+def import_books(context, file_path, file_format, batch_size, import_id, restart):
+    """Stream a CSV or JSONL file of books (title, author, isbn, publish_date) into the catalog."""
+    from library_management.book_import import import_books as run_import
+
+    def report(status):
+        click.echo(
+            f"rows {status['rows_read']}: {status['inserted']} inserted, "
+            f"{status['duplicates']} duplicates, {status['errors']} errors"
+        )
+
+    def run(site):
+        status = run_import(
+            file_path, file_format=file_format, batch_size=batch_size,
+            import_id=import_id, restart=restart, progress=report,
+        )
+        click.echo(f"{site}: import {status['import_id']} {status['status']}; errors in {status['error_file']}")
+
+    _for_each_site(context, run)
+
+
+@click.command("export-loans")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("--member", help="Only this member's loans")
+@click.option("--from-date", help="Earliest loan date (inclusive)")
+@click.option("--to-date", help="Latest loan date (inclusive)")
+@pass_context
+def export_loans(context, output, member, from_date, to_date):
+    """Stream loan history to a CSV file."""
+    from library_management.loan_export import write_loans_csv
+
+    def run(site):
+        with open(output, "w", newline="", encoding="utf-8") as f:
+            count = write_loans_csv(f, member=member, from_date=from_date, to_date=to_date)
+        click.echo(f"{site}: wrote {count} loans to {output}")
+
+    _for_each_site(context, run)
+
+
+@click.command("benchmark-book-search")
+@click.option("--books", default=1_000_000, help="Number of synthetic books to seed into the index")
+@click.option("--queries", default=1000, help="Number of queries to time per query type")
+@click.option("--keep", is_flag=True, default=False, help="Keep the seeded rows after the run")
+@pass_context
+def benchmark_book_search(context, books, queries, keep):
+    """Seed the search index with synthetic books and report query latency percentiles."""
+    from library_management.benchmarks.book_search import run as run_benchmark
+
+    def run(site):
+        results = run_benchmark(books=books, queries=queries, keep=keep)
+        click.echo(f"{site}: {json.dumps(results, indent=2)}")
+
+    _for_each_site(context, run)
+
+
+@click.command("seed-benchmark-data")
+@click.option("--books", default=1_000_000, help="Synthetic books")
+@click.option("--members", default=200_000, help="Synthetic members")
+@click.option("--loans", default=10_000_000, help="Synthetic loans")
+@click.option("--reservations", default=50_000, help="Synthetic reservations on books that are on loan")
+@click.option("--users", default=20, help="Member users to create for member-scoped endpoints")
+@click.option("--years", default=5, help="Years of loan history")
+@click.option("--seed", "rng_seed", default=42, help="Random seed")
+@pass_context
+def seed_benchmark_data(context, books, members, loans, reservations, users, years, rng_seed):
+    """Bulk-insert a synthetic library for benchmark-api. Use a disposable site."""
+    from library_management.benchmarks.dataset import seed
+
+    def report(label, done, total):
+        click.echo(f"{label}: {done}/{total}")
+
+    def run(site):
+        counts = seed(
+            books=books, members=members, loans=loans, reservations=reservations,
+            users=users, years=years, rng_seed=rng_seed, progress=report,
+        )
+        click.echo(f"{site}: {json.dumps(counts)}")
+
+    _for_each_site(context, run)
+
+
+@click.command("clear-benchmark-data")
+@pass_context
+def clear_benchmark_data(context):
+    """Delete the rows and users written by seed-benchmark-data."""
+    from library_management.benchmarks.dataset import clear
+
+    def run(site):
+        clear()
+        click.echo(f"{site}: benchmark data removed")
+
+    _for_each_site(context, run)
+
+
+@click.command("benchmark-api")
+@click.option("--concurrency", default=8, help="Concurrent callers")
+@click.option("--requests", default=200, help="Calls per endpoint")
+@click.option("--endpoint", "endpoints", multiple=True, help="Only this endpoint, e.g. loan_api.get_loans (repeatable)")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), help="Write the results JSON here")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Earlier results JSON to compare with")
+@pass_context
+def benchmark_api(context, concurrency, requests, endpoints, output, baseline):
+    """Drive every whitelisted API method and report latency, throughput and query counts."""
+    from library_management.benchmarks.api_load import run as run_benchmark
+
+    def run(site):
+        results = run_benchmark(
+            concurrency=concurrency, requests=requests, endpoints=endpoints or None,
+            output=output, baseline=baseline,
+        )
+        click.echo(f"{site}: {json.dumps(results, indent=2, default=str)}")
+
+    _for_each_site(context, run)
+
+
+@click.command("benchmark-response-format")
+@click.option("--rows", default=100_000, help="Rows in the synthetic loan list")
+@click.option("--repeat", default=3, help="Timed runs per encoding (the fastest is reported)")
+@pass_context
+def benchmark_response_format(context, rows, repeat):
+    """Compare payload size and serialization time of default JSON and the compact list encodings."""
+    from library_management.benchmarks.response_format import run as run_benchmark
+
+    def run(site):
+        click.echo(f"{site}: {json.dumps(run_benchmark(rows=rows, repeat=repeat), indent=2)}")
+
+    _for_each_site(context, run)
+
+
+@click.command("archive-loans")
+@click.option("--months", type=int, help="Archive loans that ended more than this many months ago")
+@click.option("--batch-size", default=1000, help="Loans moved per commit")
+@click.option("--dry-run", is_flag=True, default=False, help="Only count the loans that would be archived")
+@pass_context
+def archive_loans(context, months, batch_size, dry_run):
+    """Move finished loans older than the retention period into the loan archive."""
+    from library_management.loan_archive import archive_loans as run_archive
+
+    def run(site):
+        result = run_archive(
+            months=months, batch_size=batch_size, dry_run=dry_run,
+            progress=lambda n: click.echo(f"archived {n} loans"),
+        )
+        click.echo(f"{site}: {json.dumps(result, indent=2, default=str)}")
+
+    _for_each_site(context, run)
+
+
+@click.command("verify-loan-archive")
+@pass_context
+def verify_loan_archive(context):
+    """Print the row counts of the hot and archived loan tiers."""
+    from library_management.loan_archive import verify
+
+    def run(site):
+        counts = verify()
+        click.echo(f"{site}: {counts.hot} hot, {counts.archived} archived, {counts.duplicates} in both")
+        if counts.duplicates:
+            raise click.ClickException("Some loans exist in both tiers.")
+
+    _for_each_site(context, run)
+
+
+commands = [
+    rebuild_book_search,
+    rebuild_member_search,
+    rebuild_book_availability,
+    rebuild_loan_analytics,
+    rebuild_loan_claims,
+    import_books,
+    export_loans,
+    benchmark_book_search,
+    seed_benchmark_data,
+    clear_benchmark_data,
+    benchmark_api,
+    benchmark_checkout_stress,
+    benchmark_response_format,
+    archive_loans,
+    verify_loan_archive,
+]
@@ -0,0 +1,165 @@
+# file: library_management/compact_response.py
+#
+# Opt-in columnar encoding of large list responses.
+#
+# By default a list endpoint returns its rows as JSON objects, so every key is
+# repeated in every row and Frappe's encoder calls its default handler for
+# every date. Endpoints decorated with @compact instead return the rows column
+# by column when the client asks for it:
+#
+#   {"message": {"columns": ["name", "author", ...],
+#                "values": [["b1", "b2", "b3"],
+#                           {"dictionary": ["Smith", "Okafor"], "indexes": [0, 1, 0]}],
+#                "length": 3}}
+#
+# A column is sent as its list of values or, when at most DICTIONARY_RATIO of
+# them are distinct (authors, members, dates), as its distinct values plus
+# the index of each row's value in them; row i of such a column is
+# dictionary[indexes[i]]. A paged result ({"data": rows, "next_cursor": ...})
+# keeps its other keys and only has `data` replaced by that block. Dates,
+# datetimes and Decimals are converted to the same strings and numbers as the
+# default JSON, once per distinct value in dictionary columns.
+#
+# Negotiation, first match wins:
+#   - request parameter `response_format`: "columnar", "msgpack" or "json"
+#   - Accept header: COLUMNAR_TYPE, or one of MSGPACK_TYPES
+# MessagePack needs the optional `msgpack` package; without it the columnar
+# block is sent as JSON, and the Content-Type says which one was sent. A
+# compact body of at least MIN_COMPRESS_BYTES is gzipped when the client
+# accepts gzip.
+
+import datetime
+import functools
+import gzip
+import json
+from decimal import Decimal
+
+import frappe
+from werkzeug.wrappers import Response
+
+PARAM = "response_format"
+JSON = "json"
+COLUMNAR = "columnar"
+MSGPACK = "msgpack"
+
+COLUMNAR_TYPE = "application/vnd.library.columnar+json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+MIN_COMPRESS_BYTES = 1024
+# Columns of repeated values compress well even at the fastest level.
+COMPRESS_LEVEL = 1
+# A column with at most this share of distinct values is dictionary-encoded.
+DICTIONARY_RATIO = 0.5
+DICTIONARY_SAMPLE = 1000
+
+
+def compact(fn):
+    """Decorator for list endpoints: encode the rows column-wise when the client negotiated it."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        result = fn(*args, **kwargs)
+        encoding = negotiate()
+        if not encoding or not _has_rows(result):
+            return result
+        return build_response(result, encoding)
+    return wrapper
+
+
+def negotiate():
+    """COLUMNAR or MSGPACK if the request asked for a compact response, else None."""
+    requested = (frappe.local.form_dict.get(PARAM) or "").strip().lower()
+    if requested in (COLUMNAR, MSGPACK):
+        return requested
+    if requested == JSON:
+        return None
+
+    accept = (frappe.get_request_header("Accept") or "").lower()
+    if any(t in accept for t in MSGPACK_TYPES):
+        return MSGPACK
+    if COLUMNAR_TYPE in accept:
+        return COLUMNAR
+    return None
+
+
+def to_columns(rows):
+    """{columns, values, length} for a list of dict rows that share their keys."""
+    rows = list(rows)
+    columns = list(rows[0]) if rows else []
+    return {
+        "columns": columns,
+        "values": [_encode_column([row.get(column) for row in rows]) for column in columns],
+        "length": len(rows),
+    }
+
+
+def encode(result, encoding):
+    """Return (body bytes, content type) of `result` with its rows in columns."""
+    if isinstance(result, dict):
+        message = {**result, "data": to_columns(result["data"])}
+    else:
+        message = to_columns(result)
+
+    if encoding == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            msgpack = None
+        if msgpack:
+            return msgpack.packb({"message": message}, default=_default), MSGPACK_TYPES[0]
+    body = json.dumps({"message": message}, default=_default, separators=(",", ":"))
+    return body.encode(), COLUMNAR_TYPE
+
+
+def build_response(result, encoding):
+    body, content_type = encode(result, encoding)
+    response = Response(content_type=content_type)
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if len(body) >= MIN_COMPRESS_BYTES and "gzip" in (frappe.get_request_header("Accept-Encoding") or ""):
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        response.headers["Content-Encoding"] = "gzip"
+    response.set_data(body)
+    return response
+
+
+def _encode_column(col):
+    """The column's values, or {dictionary, indexes} if few of them are distinct."""
+    try:
+        # Mostly distinct columns (names, IDs) show it in their first rows already
+        sample = col[:DICTIONARY_SAMPLE]
+        distinct = col if len(set(sample)) > len(sample) * DICTIONARY_RATIO else list(dict.fromkeys(col))
+    except TypeError:
+        # unhashable values (lists, dicts) are sent as they are
+        distinct = col
+
+    if len(distinct) <= len(col) * DICTIONARY_RATIO:
+        positions = {value: i for i, value in enumerate(distinct)}
+        return {"dictionary": _convert(distinct), "indexes": list(map(positions.__getitem__, col))}
+    return _convert(col)
+
+
+def _convert(values):
+    convert = _converter(next((v for v in values if v is not None), None))
+    if not convert:
+        return values
+    return [None if v is None else convert(v) for v in values]
+
+
+def _has_rows(result):
+    if isinstance(result, dict):
+        result = result.get("data")
+    return isinstance(result, list) and all(isinstance(row, dict) for row in result[:1])
+
+
+def _converter(sample):
+    if isinstance(sample, (datetime.date, datetime.time, datetime.timedelta)):
+        # datetime is a date; str() matches Frappe's JSON for all of them
+        return str
+    if isinstance(sample, Decimal):
+        return float
+    return None
+
+
+def _default(value):
+    # Values of a column whose first value had another type
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
@@ -7,11 +7,36 @@ app_description = "Custom Library System"
 app_email = "bbekam60@gmail.com"
 app_license = "mit"
 
+# Installation: composite indexes and auxiliary tables that are not doctypes
+after_install = "library_management.install.after_install"
+
+# Request metrics (collected when site config sets library_metrics_enabled)
+# and per-endpoint token-bucket rate limits
+before_request = [
+    "library_management.metrics.before_request",
+    "library_management.rate_limit.before_request",
+]
+after_request = [
+    "library_management.rate_limit.after_request",
+    "library_management.metrics.after_request",
+]
+
 # Scheduled Tasks: Daily overdue notification emails
 scheduler_events = {
     "daily": [
-        "library_management.overdue_notification.send_overdue_notifications"
-    ]
+        "library_management.overdue_notification.send_overdue_notifications",
+        "library_management.availability.refresh_lapsed_availability",
+        "library_management.waitlist.expire_ready_holds",
+        "library_management.waitlist.promote_lapsed_loans",
+        "library_management.loan_claims.prune",
+        "library_management.change_feed.prune_tombstones",
+    ],
+    "daily_long": [
+        "library_management.analytics.reconcile_recent",
+    ],
+    "weekly_long": [
+        "library_management.loan_archive.run_scheduled_archive",
+    ],
 }
 
 # Override Whitelisted API Methods
@@ -19,32 +44,64 @@ override_whitelisted_methods = {
     # Book APIs
     "library_management.api.book.get_books": "library_management.api.book_api.get_books",
     "library_management.api.book.get_book": "library_management.api.book_api.get_book",
+    "library_management.api.book.get_books_by_id": "library_management.api.book_api.get_books_by_id",
     "library_management.api.book.create_book": "library_management.api.book_api.create_book",
     "library_management.api.book.update_book": "library_management.api.book_api.update_book",
     "library_management.api.book.delete_book": "library_management.api.book_api.delete_book",
+    "library_management.api.book.get_catalog": "library_management.api.book_api.get_catalog",
+    "library_management.api.book.import_books": "library_management.api.book_api.import_books",
+    "library_management.api.book.get_book_import_status": "library_management.api.book_api.get_book_import_status",
+    "library_management.api.book.get_availability_calendar": "library_management.api.book_api.get_availability_calendar",
+
+    # Book search APIs
+    "library_management.api.search.search_books": "library_management.api.search_api.search_books",
+    "library_management.api.search.autocomplete_books": "library_management.api.search_api.autocomplete_books",
+    "library_management.api.search.get_books_by_isbn": "library_management.api.search_api.get_books_by_isbn",
 
     # Member APIs
     "library_management.api.member.get_members": "library_management.api.member_api.get_members",
     "library_management.api.member.get_member": "library_management.api.member_api.get_member",
+    "library_management.api.member.get_members_by_id": "library_management.api.member_api.get_members_by_id",
     "library_management.api.member.create_member": "library_management.api.member_api.create_member",
     "library_management.api.member.update_member": "library_management.api.member_api.update_member",
     "library_management.api.member.delete_member": "library_management.api.member_api.delete_member",
+    "library_management.api.member.search_members": "library_management.api.member_api.search_members",
 
     # Loan APIs
     "library_management.api.loan.get_loans": "library_management.api.loan_api.get_loans",
     "library_management.api.loan.get_loan": "library_management.api.loan_api.get_loan",
+    "library_management.api.loan.get_loans_by_id": "library_management.api.loan_api.get_loans_by_id",
     "library_management.api.loan.create_loan": "library_management.api.loan_api.create_loan",
     "library_management.api.loan.update_loan": "library_management.api.loan_api.update_loan",
     "library_management.api.loan.delete_loan": "library_management.api.loan_api.delete_loan",
     "library_management.api.loan.get_books_on_loan": "library_management.api.loan_api.get_books_on_loan",
     "library_management.api.loan.get_overdue_books": "library_management.api.loan_api.get_overdue_books",
+    "library_management.api.loan.create_loans": "library_management.api.loan_api.create_loans",
+    "library_management.api.loan.return_loans": "library_management.api.loan_api.return_loans",
 
     # Reservation APIs
     "library_management.api.reservation.get_reservations": "library_management.api.reservation_api.get_reservations",
     "library_management.api.reservation.get_reservation": "library_management.api.reservation_api.get_reservation",
+    "library_management.api.reservation.get_reservations_by_id": "library_management.api.reservation_api.get_reservations_by_id",
     "library_management.api.reservation.create_reservation": "library_management.api.reservation_api.create_reservation",
     "library_management.api.reservation.update_reservation": "library_management.api.reservation_api.update_reservation",
     "library_management.api.reservation.delete_reservation": "library_management.api.reservation_api.delete_reservation",
+    "library_management.api.reservation.get_waitlist": "library_management.api.reservation_api.get_waitlist",
+    "library_management.api.reservation.get_my_queue_position": "library_management.api.reservation_api.get_my_queue_position",
+
+    # Analytics APIs
+    "library_management.api.analytics.get_loan_trend": "library_management.api.analytics_api.get_loan_trend",
+    "library_management.api.analytics.get_top_books": "library_management.api.analytics_api.get_top_books",
+    "library_management.api.analytics.get_author_loan_lengths": "library_management.api.analytics_api.get_author_loan_lengths",
+
+    # Dashboard APIs
+    "library_management.api.dashboard.get_dashboard_summary": "library_management.api.dashboard_api.get_dashboard_summary",
+
+    # Metrics APIs
+    "library_management.api.metrics.get_metrics": "library_management.api.metrics_api.get_metrics",
+
+    # Sync APIs
+    "library_management.api.sync.get_changes": "library_management.api.sync_api.get_changes",
 
     # Auth APIs 
     "library_management.api.auth.login": "library_management.api.auth_api.login",
@@ -58,6 +115,12 @@ override_whitelisted_methods = {
     # Report APIs (NEW)
     "library_management.api.report.get_current_loans": "library_management.api.report_api.get_current_loans",
     "library_management.api.report.get_overdue_loans": "library_management.api.report_api.get_overdue_loans",
+    "library_management.api.report.export_member_loans_csv": "library_management.api.report_api.export_member_loans_csv",
+    "library_management.api.report.export_loans_csv": "library_management.api.report_api.export_loans_csv",
+    "library_management.api.report.get_report_cache_stats": "library_management.api.report_api.get_report_cache_stats",
+    "library_management.api.report.submit_report_job": "library_management.api.report_api.submit_report_job",
+    "library_management.api.report.get_report_job_status": "library_management.api.report_api.get_report_job_status",
+    "library_management.api.report.download_report_job": "library_management.api.report_api.download_report_job",
 }
 
 permission_query_conditions = {
@@ -67,6 +130,99 @@ permission_query_conditions = {
 
 doc_events = {
     "Member": {
-        "after_insert": "library_management.library_management.member_hooks.create_user_for_member"
-    }
+        "after_insert": [
+            "library_management.library_management.member_hooks.create_user_for_member",
+            "library_management.change_feed.on_insert",
+        ],
+        "on_update": [
+            "library_management.principal.on_member_change",
+            "library_management.member_search.index_member",
+            "library_management.report_cache.on_member_change",
+        ],
+        "after_rename": [
+            "library_management.principal.on_member_change",
+            "library_management.member_search.reindex_renamed_member",
+            "library_management.analytics.on_rename",
+            "library_management.change_feed.on_rename",
+            "library_management.report_cache.on_member_change",
+        ],
+        "on_trash": [
+            "library_management.principal.on_member_trash",
+            "library_management.member_search.unindex_member",
+            "library_management.change_feed.on_trash",
+            "library_management.report_cache.on_delete",
+        ],
+    },
+    "User": {
+        "on_update": "library_management.principal.on_user_change",
+        "on_trash": "library_management.principal.on_user_change",
+    },
+    "Has Role": {
+        "on_update": "library_management.principal.on_has_role_change",
+        "on_trash": "library_management.principal.on_has_role_change",
+    },
+    "Book": {
+        "after_insert": "library_management.change_feed.on_insert",
+        "on_update": [
+            "library_management.book_search.index_book",
+            "library_management.analytics.on_book_update",
+            "library_management.report_cache.on_book_change",
+        ],
+        "on_trash": [
+            "library_management.book_search.unindex_book",
+            "library_management.change_feed.on_trash",
+            "library_management.report_cache.on_delete",
+        ],
+        "after_rename": [
+            "library_management.book_search.reindex_renamed_book",
+            "library_management.analytics.on_rename",
+            "library_management.loan_claims.on_book_rename",
+            "library_management.change_feed.on_rename",
+            "library_management.report_cache.on_book_change",
+        ],
+    },
+    "Loan": {
+        "after_insert": "library_management.change_feed.on_insert",
+        "on_update": [
+            "library_management.availability.on_loan_update",
+            "library_management.waitlist.on_loan_update",
+            "library_management.analytics.on_loan_update",
+            "library_management.change_feed.on_update",
+            "library_management.report_cache.on_loan_change",
+        ],
+        "on_cancel": [
+            "library_management.availability.on_loan_cancel",
+            "library_management.waitlist.on_loan_end",
+            "library_management.analytics.on_loan_cancel",
+            "library_management.loan_claims.on_loan_cancel",
+            "library_management.report_cache.on_loan_change",
+        ],
+        "on_trash": [
+            "library_management.availability.on_loan_trash",
+            "library_management.waitlist.on_loan_end",
+            "library_management.analytics.on_loan_trash",
+            "library_management.loan_claims.on_loan_trash",
+            "library_management.change_feed.on_trash",
+            "library_management.report_cache.on_loan_trash",
+        ],
+        "after_rename": [
+            "library_management.loan_claims.on_loan_rename",
+            "library_management.change_feed.on_rename",
+            "library_management.report_cache.on_loan_change",
+        ],
+    },
+    "Reservation": {
+        "after_insert": "library_management.change_feed.on_insert",
+        "on_update": [
+            "library_management.waitlist.on_reservation_update",
+            "library_management.change_feed.on_update",
+            "library_management.report_cache.on_reservation_change",
+        ],
+        "on_trash": [
+            "library_management.waitlist.on_reservation_trash",
+            "library_management.change_feed.on_trash",
+            "library_management.report_cache.on_reservation_change",
+        ],
+        "after_rename": "library_management.change_feed.on_rename",
+    },
 }
@@ -0,0 +1,63 @@
+# file: library_management/indexes.py
+#
+# Composite indexes for the circulation access paths. Frappe's doctype JSON can
+# only declare single-column `search_index` fields, so multi-column indexes are
+# declared here and applied by `ensure_indexes()` (install hook + patch).
+
+import frappe
+
+# doctype -> list of (index_name, columns). Column order matters: equality
+# columns first, then the range / ORDER BY column.
+COMPOSITE_INDEXES = {
+    "Loan": [
+        # Loan.validate, create_loan/update_loan, reservation "is on loan" checks
+        ("book_return_date_index", ("book", "return_date")),
+        # Member loan history, exports and reports filtered by member
+        ("member_loan_date_index", ("member", "loan_date")),
+        # Current loan report, dashboard active loans
+        ("return_date_index", ("return_date",)),
+        # Overdue (not returned) loans: report and dashboard count
+        ("returned_on_return_date_index", ("returned_on", "return_date", "docstatus")),
+        # Overdue notification job: members with loans not yet notified, in name order
+        ("notified_overdue_member_index", ("notified_overdue", "member", "return_date")),
+        # Library-wide history exports bounded by loan date
+        ("loan_date_index", ("loan_date",)),
+        # sync_api.get_changes
+        ("modified_name_index", ("modified", "name")),
+        ("member_modified_index", ("member", "modified")),
+    ],
+    "Reservation": [
+        # Reservation.validate duplicate check, create_reservation/create_my_reservation
+        ("book_member_reservation_date_index", ("book", "member", "reservation_date")),
+        # get_my_reservations
+        ("member_reservation_date_index", ("member", "reservation_date")),
+        # Reservation list sorted by date (get_reservations)
+        ("reservation_date_index", ("reservation_date",)),
+        # Waitlist head lookup, Ready holds and queue-position counts
+        ("book_status_queue_seq_index", ("book", "status", "queue_seq")),
+        # Open (Waiting or Ready) reservations on the dashboard
+        ("status_index", ("status",)),
+        # sync_api.get_changes
+        ("modified_name_index", ("modified", "name")),
+        ("member_modified_index", ("member", "modified")),
+    ],
+    "Book": [
+        # loan_archive: a Book's current loan is never archived
+        ("current_loan_index", ("current_loan",)),
+        # sync_api.get_changes
+        ("modified_name_index", ("modified", "name")),
+    ],
+    "Member": [
+        # Member list sorted by name (get_members)
+        ("fullname_index", ("fullname",)),
+        # sync_api.get_changes
+        ("modified_name_index", ("modified", "name")),
+    ],
+}
+
+
+def ensure_indexes():
+    """Create any declared index that is missing. Safe to run repeatedly."""
+    for doctype, indexes in COMPOSITE_INDEXES.items():
+        for index_name, columns in indexes:
+            frappe.db.add_index(doctype, list(columns), index_name=index_name)
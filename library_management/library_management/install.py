@@ -0,0 +1,23 @@
+# file: library_management/install.py
+
+from library_management.book_search import create_search_table, rebuild_index
+from library_management.indexes import ensure_indexes
+from library_management.loan_archive import create_archive_table
+from library_management import analytics, change_feed, loan_claims, member_search
+
+
+def after_install():
+    """Create the app's indexes and auxiliary (non-doctype) tables on a fresh site.
+
+    Patches are marked as already applied on install, so anything a patch
+    sets up for existing sites has to be repeated here.
+    """
+    ensure_indexes()
+    create_search_table()
+    rebuild_index()
+    create_archive_table()
+    member_search.create_search_table()
+    member_search.rebuild_index()
+    analytics.create_rollup_table()
+    loan_claims.create_claim_table()
+    change_feed.create_tombstone_table()
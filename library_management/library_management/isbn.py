@@ -0,0 +1,45 @@
+import re
+
+_ISBN_STRIP = re.compile(r"[\s\-]")
+
+
+def clean_isbn(value):
+    """Strip separators and upper-case the ISBN-10 check character."""
+    if not value:
+        return ""
+    return _ISBN_STRIP.sub("", str(value)).upper()
+
+
+def is_valid_isbn(value):
+    """Return True if `value` is a well-formed ISBN-10 or ISBN-13 with a correct check digit."""
+    isbn = clean_isbn(value)
+
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == "X"):
+        total = sum((10 - i) * int(c) for i, c in enumerate(isbn[:9]))
+        total += 10 if isbn[9] == "X" else int(isbn[9])
+        return total % 11 == 0
+
+    if len(isbn) == 13 and isbn.isdigit():
+        return _isbn13_check_digit(isbn[:12]) == isbn[12]
+
+    return False
+
+
+def normalize_isbn(value):
+    """Return the canonical ISBN-13 form of `value`.
+
+    ISBN-10s are converted to their 978-prefixed ISBN-13 so both spellings of
+    the same edition map to one key. Values that are not valid ISBNs are
+    returned cleaned but otherwise unchanged, so legacy catalog entries can
+    still be matched exactly.
+    """
+    isbn = clean_isbn(value)
+    if len(isbn) == 10 and is_valid_isbn(isbn):
+        body = "978" + isbn[:9]
+        return body + _isbn13_check_digit(body)
+    return isbn
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(first12))
+    return str((10 - total % 10) % 10)
@@ -1,33 +1,58 @@
 import frappe
 from frappe.model.document import Document
 from frappe import throw, _
+from frappe.utils import getdate
+from library_management import loan_claims
+from library_management.loan_calendar import find_overlap
+from library_management.metrics import timed
+from library_management.principal import get_principal
+from library_management.waitlist import get_ready_reservation
 
 class Loan(Document):
+    @timed("Loan.validate")
     def validate(self):
-        # Check if the book is already loaned out and not returned yet
-        existing_loan = frappe.db.exists(
-            "Loan",
-            {
-                "book": self.book,
-                "return_date": [">=", self.loan_date],
-                "name": ["!=", self.name]  # Exclude current doc if editing
-            },
+        return_date = self.return_date or self.loan_date
+        if getdate(return_date) < getdate(self.loan_date):
+            throw(_("Return date cannot be before the loan date."))
+        if loan_claims.too_long(self.loan_date, return_date):
+            throw(_("A loan can run for at most {0} days.").format(loan_claims.max_loan_days()))
+
+        # Check if another loan of the book overlaps this loan's period
+        existing_loan = find_overlap(
+            self.book,
+            self.loan_date,
+            return_date,
+            exclude_loan=self.name  # Exclude current doc if editing
         )
 
         if existing_loan:
             throw(_("This book is already on loan. Please choose a different book or wait until it is returned."))
 
+        # A book promoted off its waitlist is held for that reservation's member
+        if self.is_new() or self.has_value_changed("book") or self.has_value_changed("member"):
+            hold = get_ready_reservation(self.book)
+            if hold and hold.member != self.member:
+                throw(_("This book is being held for another member's reservation."))
+
+        # Enforced by the claim table's key, so a concurrent checkout of the
+        # same book that also passed the checks above cannot commit as well
+        if self.is_new() or any(self.has_value_changed(f) for f in ("book", "loan_date", "return_date")):
+            previous = self.get_doc_before_save()
+            if not loan_claims.claim(self.name, self.book, self.loan_date, return_date, previous=previous):
+                throw(_("This book is already on loan or being checked out. Please choose a different book or try again."))
+
 
 def get_permission_query_conditions(user):
     """
     Restrict members from seeing loans that do not belong to them.
     Admins or users without 'Member' role see all records.
     """
-    if not user or "Member" not in frappe.get_roles(user):
+    principal = get_principal(user) if user else None
+    if not principal or not principal.is_member:
         # No restriction for non-members (e.g., admins)
         return None
 
-    member_id = frappe.db.get_value("Member", {"email": user}, "name")
+    member_id = principal.member
     if member_id:
         return f"`tabLoan`.`member` = '{member_id}'"
 
@@ -1,8 +1,13 @@
 import frappe
 from frappe.model.document import Document
 from frappe import throw, _
+from library_management.availability import get_active_loan
+from library_management.metrics import timed
+from library_management.principal import get_principal
+from library_management import waitlist
 
 class Reservation(Document):
+    @timed("Reservation.validate")
     def validate(self):
         # 1. Prevent duplicate reservation on the same day by the same member for the same book
         duplicate = frappe.db.exists(
@@ -17,15 +22,20 @@ class Reservation(Document):
         if duplicate:
             throw(_("You have already reserved this book on this date."))
 
+        # Moving to another book joins the back of that book's waitlist
+        previous = self.get_doc_before_save()
+        if previous and previous.book != self.book:
+            self.status = waitlist.WAITING
+            self.ready_date = None
+            self.queue_seq = waitlist.next_sequence(self.book)
+
+        # Ready/Fulfilled/Expired reservations are past the point where the book has to be on loan
+        if self.status and self.status != waitlist.WAITING:
+            return
+
         # 2. Prevent reservation if book is currently available (not on loan)
-        is_on_loan = frappe.db.exists(
-            "Loan",
-            {
-                "book": self.book,
-                "return_date": [">=", self.reservation_date]
-            }
-        )
-        if not is_on_loan:
+        active_loan = get_active_loan(self.book, on_date=self.reservation_date)
+        if not active_loan:
             throw(_("This book is available. You do not need to reserve it."))
 
         # 3. Prevent a member from reserving a book they already borrowed and haven't returned yet
@@ -35,21 +45,28 @@ class Reservation(Document):
                 "member": self.member,
                 "book": self.book,
                 "loan_date": ["<=", self.reservation_date],
-                "return_date": [">=", self.reservation_date]
+                "return_date": [">=", self.reservation_date],
+                "docstatus": ["<", 2]
             }
         )
         if overlapping_loan:
             throw(_("You have already borrowed this book and cannot reserve it during the loan period."))
 
+    def before_insert(self):
+        # Join the back of the book's waitlist
+        self.status = waitlist.WAITING
+        self.queue_seq = waitlist.next_sequence(self.book)
+
 def get_permission_query_conditions(user):
     """
     Row-level permission: Members only see their own reservations.
     Admins or other roles can see all.
     """
-    if not user or "Member" not in frappe.get_roles(user):
+    principal = get_principal(user) if user else None
+    if not principal or not principal.is_member:
         return None
 
-    member_id = frappe.db.get_value("Member", {"email": user}, "name")
+    member_id = principal.member
     if member_id:
         return f"`tabReservation`.`member` = '{member_id}'"
     return "1=0"
@@ -0,0 +1,235 @@
+# file: library_management/list_query.py
+#
+# Keyset-paginated list queries shared by the Loan, Member and Reservation
+# list endpoints, and the batch getters that fetch rows of the same lists by
+# name.
+#
+# Each endpoint describes its list with a ListSpec: the table, the columns it
+# returns, the columns it may be sorted on and the filters it accepts. A page
+# is one index range read (`WHERE (sort, name) > cursor ORDER BY sort, name
+# LIMIT n`), so its cost does not depend on how deep into the list the caller
+# is. Display columns from other doctypes (book title, member name) are looked
+# up for the page's rows only instead of being joined into the scan.
+
+import base64
+import json
+
+import frappe
+from frappe import _
+from frappe.exceptions import ValidationError
+from frappe.utils import cint, getdate, nowdate
+
+DEFAULT_PAGE_LENGTH = 50
+MAX_PAGE_LENGTH = 500
+# Totals up to this many rows are counted exactly (with a bounded scan);
+# beyond it the optimizer's row estimate is returned instead.
+EXACT_COUNT_LIMIT = 1000
+
+# Filter kinds: value -> SQL condition on the filter's column
+#   eq:      column = value
+#   from/to: date range bounds, inclusive
+#   overdue: truthy -> past due and not cancelled, falsy -> not yet due
+
+
+class ListSpec:
+    """Static description of one paginated list."""
+
+    def __init__(self, doctype, fields, sort_fields, default_sort, filters=None, lookups=None):
+        self.doctype = doctype
+        self.table = f"tab{doctype}"
+        self.fields = tuple(fields)
+        # `name` is always sortable and is the tie-breaker for every other column.
+        self.sort_fields = tuple(dict.fromkeys(("name", *sort_fields)))
+        self.default_sort = default_sort
+        # filter name -> (column, kind)
+        self.filters = filters or {}
+        # output field -> (doctype, link column, display column)
+        self.lookups = lookups or {}
+
+
+def get_page(spec, filters=None, cursor=None, page_length=DEFAULT_PAGE_LENGTH, sort_by=None, sort_order=None):
+    """Return {data, next_cursor, total, total_is_estimate} for one page of `spec`.
+
+    `total` is only computed for the first page (no `cursor`); pages fetched
+    with a cursor return None so paging through a list never re-counts it.
+    """
+    page_length = min(max(cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+
+    sort_by = sort_by or spec.default_sort[0]
+    if sort_by not in spec.sort_fields:
+        frappe.throw(_("Cannot sort {0} by {1}.").format(_(spec.doctype), sort_by), ValidationError)
+    sort_order = (sort_order or spec.default_sort[1]).lower()
+    if sort_order not in ("asc", "desc"):
+        frappe.throw(_("Sort order must be 'asc' or 'desc'."), ValidationError)
+
+    conditions, values = build_filters(spec, filters)
+    filter_conditions = list(conditions)
+
+    if cursor:
+        last_value, last_name = decode_cursor(cursor)
+        op = ">" if sort_order == "asc" else "<"
+        values["last_name"] = last_name
+        if sort_by == "name":
+            conditions.append(f"`name` {op} %(last_name)s")
+        else:
+            values["last_value"] = last_value
+            conditions.append(
+                f"(`{sort_by}` {op} %(last_value)s"
+                f" OR (`{sort_by}` = %(last_value)s AND `name` {op} %(last_name)s))"
+            )
+
+    columns = ", ".join(f"`{f}`" for f in dict.fromkeys(("name", sort_by, *spec.fields)))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_by = f"`{sort_by}` {sort_order}"
+    if sort_by != "name":
+        order_by += f", `name` {sort_order}"
+
+    rows = frappe.db.sql(f"""
+        SELECT {columns}
+        FROM `{spec.table}`
+        {where}
+        ORDER BY {order_by}
+        LIMIT %(limit)s
+    """, {**values, "limit": page_length + 1}, as_dict=True)
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        next_cursor = encode_cursor(rows[-1][sort_by], rows[-1].name)
+
+    _add_lookups(spec, rows)
+
+    total = total_is_estimate = None
+    if not cursor:
+        total, total_is_estimate = count(spec, filter_conditions, values)
+
+    return {
+        "data": rows,
+        "next_cursor": next_cursor,
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+    }
+
+
+def get_records(spec, names, expand=None, filters=None):
+    """Return {data, missing}: the rows of `spec` named in `names`, in that order, with one query.
+
+    Rows carry the spec's list columns only. `expand` lists the Link columns
+    (e.g. ["book", "member"]) whose display lookups (book_title,
+    member_fullname) are added, one query per linked doctype. `filters`
+    restricts the rows as in get_page; names filtered out count as missing.
+    """
+    names = parse_list(names)
+    if len(names) > MAX_PAGE_LENGTH:
+        frappe.throw(_("At most {0} records can be fetched at once.").format(MAX_PAGE_LENGTH), ValidationError)
+
+    links = {link for _doctype, link, _display in spec.lookups.values()}
+    expand = parse_list(expand)
+    unknown = [field for field in expand if field not in links]
+    if unknown:
+        frappe.throw(_("Cannot expand {0} fields: {1}").format(_(spec.doctype), ", ".join(unknown)), ValidationError)
+
+    conditions, values = build_filters(spec, filters)
+    rows = frappe.db.sql(f"""
+        SELECT {", ".join(f"`{f}`" for f in dict.fromkeys(("name", *spec.fields)))}
+        FROM `{spec.table}`
+        WHERE {" AND ".join(["`name` IN %(names)s", *conditions])}
+    """, {**values, "names": tuple(names)}, as_dict=True) if names else []
+
+    _add_lookups(spec, rows, links=expand)
+    found = {row.name: row for row in rows}
+    return {
+        "data": [found[name] for name in names if name in found],
+        "missing": [name for name in names if name not in found],
+    }
+
+
+def parse_list(value):
+    """A list of unique names from a list, a JSON list or a comma-separated string."""
+    if isinstance(value, str):
+        value = value.strip()
+        value = json.loads(value) if value.startswith("[") else value.split(",")
+    return list(dict.fromkeys(str(v).strip() for v in (value or ()) if v and str(v).strip()))
+
+
+def build_filters(spec, filters):
+    """Translate a {filter name: value} dict (or its JSON) into SQL conditions and values."""
+    if isinstance(filters, str):
+        filters = json.loads(filters) if filters.strip() else {}
+    filters = filters or {}
+
+    unknown = [key for key in filters if key not in spec.filters]
+    if unknown:
+        frappe.throw(_("Unknown {0} filters: {1}").format(_(spec.doctype), ", ".join(unknown)), ValidationError)
+
+    conditions = []
+    values = {}
+    for key, value in filters.items():
+        if value in (None, ""):
+            continue
+        column, kind = spec.filters[key]
+        param = f"f_{key}"
+        if kind == "eq":
+            conditions.append(f"`{column}` = %({param})s")
+            values[param] = value
+        elif kind == "from":
+            conditions.append(f"`{column}` >= %({param})s")
+            values[param] = getdate(value)
+        elif kind == "to":
+            conditions.append(f"`{column}` <= %({param})s")
+            values[param] = getdate(value)
+        elif kind == "overdue":
+            values["today"] = nowdate()
+            if cint(value):
+                conditions.append(f"`{column}` < %(today)s AND `docstatus` < 2")
+            else:
+                conditions.append(f"`{column}` >= %(today)s")
+    return conditions, values
+
+
+def count(spec, conditions, values):
+    """Return (row count, is_estimate) for the filtered list with bounded cost."""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    exact = len(frappe.db.sql(f"""
+        SELECT `name` FROM `{spec.table}` {where} LIMIT {EXACT_COUNT_LIMIT + 1}
+    """, values))
+    if exact <= EXACT_COUNT_LIMIT:
+        return exact, False
+
+    if not conditions:
+        estimate = frappe.db.sql("""
+            SELECT `table_rows`
+            FROM information_schema.tables
+            WHERE `table_schema` = DATABASE() AND `table_name` = %s
+        """, (spec.table,))[0][0]
+    else:
+        plan = frappe.db.sql(f"EXPLAIN SELECT 1 FROM `{spec.table}` {where}", values, as_dict=True)
+        estimate = plan[0].get("rows") if plan else None
+    return max(cint(estimate), exact), True
+
+
+def encode_cursor(sort_value, name):
+    payload = json.dumps([sort_value, name], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        frappe.throw(_("Invalid cursor."), ValidationError)
+    return sort_value, name
+
+
+def _add_lookups(spec, rows, links=None):
+    for field, (doctype, link, display) in spec.lookups.items():
+        if links is not None and link not in links:
+            continue
+        keys = tuple({row[link] for row in rows if row.get(link)})
+        labels = dict(frappe.db.sql(f"""
+            SELECT `name`, `{display}`
+            FROM `tab{doctype}`
+            WHERE `name` IN %(keys)s
+        """, {"keys": keys})) if keys else {}
+        for row in rows:
+            row[field] = labels.get(row.get(link))
@@ -0,0 +1,202 @@
+# file: library_management/loan_archive.py
+#
+# Hot/cold split of the loan history.
+#
+# `tabLoan` is the hot tier: loans that are still running or ended recently.
+# Loans that ended more than `loan_archive_months` (site config, default
+# DEFAULT_RETENTION_MONTHS) ago are moved in batches to the `__loan_archive`
+# table, which has the same columns plus `archived_on`. Circulation checks,
+# availability and the reports therefore only ever read the hot tier, while
+# member history and CSV exports read both through `history_query()`.
+#
+# A loan that is still some Book's `current_loan` is never archived, so the
+# availability columns materialized on Book keep pointing at a hot row.
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, cint, now, nowdate
+
+from library_management import change_feed, report_cache
+
+ARCHIVE_TABLE = "__loan_archive"
+DEFAULT_RETENTION_MONTHS = 24
+BATCH_SIZE = 1000
+
+# Loan columns carried over to the archive.
+LOAN_COLUMNS = (
+    "name", "creation", "modified", "modified_by", "owner", "docstatus", "idx",
+    "book", "member", "loan_date", "return_date", "amended_from", "notified_overdue",
+)
+# Columns readable from both tiers through history_query().
+HISTORY_COLUMNS = ("name", "book", "member", "loan_date", "return_date", "docstatus")
+
+# A candidate ended before the cutoff and is not any Book's current loan.
+_CANDIDATES_FROM = """
+    FROM `tabLoan` l
+    LEFT JOIN `tabBook` b ON b.current_loan = l.name
+    WHERE l.return_date < %(cutoff)s AND b.name IS NULL
+"""
+
+
+def create_archive_table():
+    """Create the loan archive table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{ARCHIVE_TABLE}` (
+            `name` VARCHAR(140) NOT NULL,
+            `creation` DATETIME(6),
+            `modified` DATETIME(6),
+            `modified_by` VARCHAR(140),
+            `owner` VARCHAR(140),
+            `docstatus` INT(1) NOT NULL DEFAULT 0,
+            `idx` INT(8) NOT NULL DEFAULT 0,
+            `book` VARCHAR(140),
+            `member` VARCHAR(140),
+            `loan_date` DATE,
+            `return_date` DATE,
+            `amended_from` VARCHAR(140),
+            `notified_overdue` INT(1) NOT NULL DEFAULT 0,
+            `archived_on` DATETIME(6),
+            PRIMARY KEY (`name`),
+            KEY `member_loan_date_index` (`member`, `loan_date`),
+            KEY `loan_date_index` (`loan_date`),
+            KEY `book_return_date_index` (`book`, `return_date`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def history_query(where=""):
+    """SQL selecting HISTORY_COLUMNS from both tiers; use it as a derived table.
+
+    `where` is applied to each tier separately (unqualified column names), so
+    each branch can use its own indexes.
+    """
+    columns = ", ".join(f"`{c}`" for c in HISTORY_COLUMNS)
+    return f"""
+        SELECT {columns} FROM `tabLoan` {where}
+        UNION ALL
+        SELECT {columns} FROM `{ARCHIVE_TABLE}` {where}
+    """
+
+
+def get_cutoff(months=None):
+    """Loans whose return date is before this date are due for archiving."""
+    months = cint(months) or cint(frappe.conf.get("loan_archive_months")) or DEFAULT_RETENTION_MONTHS
+    return add_months(nowdate(), -months)
+
+
+def archive_loans(months=None, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """Move loans that ended before the retention cutoff into the archive.
+
+    Each batch is copied, verified and deleted from `tabLoan` in one commit;
+    a batch whose row counts do not match is rolled back and the run stops
+    with an error. At the end the rows inserted into the archive and deleted
+    from `tabLoan` over the whole run must both equal the loans selected, or
+    the run fails. With `dry_run`, only counts what would be moved.
+
+    Returns {cutoff, candidates | archived, copied, deleted, batches, dry_run, verified}.
+    """
+    cutoff = get_cutoff(months)
+    batch_size = max(cint(batch_size), 1)
+
+    if dry_run:
+        return {
+            "cutoff": cutoff,
+            "dry_run": True,
+            "candidates": frappe.db.sql(f"""
+                SELECT COUNT(*) {_CANDIDATES_FROM}
+            """, {"cutoff": cutoff})[0][0],
+        }
+
+    archived = copied = deleted = batches = 0
+    while True:
+        names = [r[0] for r in frappe.db.sql(f"""
+            SELECT l.name {_CANDIDATES_FROM}
+            ORDER BY l.return_date, l.name
+            LIMIT %(limit)s
+        """, {"cutoff": cutoff, "limit": batch_size})]
+        if not names:
+            break
+
+        batch_copied, batch_deleted = _archive_batch(names)
+        copied += batch_copied
+        deleted += batch_deleted
+        archived += len(names)
+        batches += 1
+        if progress:
+            progress(archived)
+
+    if archived:
+        # Archived loans drop out of the overdue report.
+        report_cache.invalidate(report_cache.OVERDUE_LOANS)
+        frappe.db.commit()
+
+    if not copied == deleted == archived:
+        frappe.throw(_("Loan archive failed verification: {0} loans selected, {1} archived, {2} deleted.").format(
+            archived, copied, deleted
+        ))
+
+    return {
+        "cutoff": cutoff,
+        "dry_run": False,
+        "archived": archived,
+        "copied": copied,
+        "deleted": deleted,
+        "batches": batches,
+        "verified": True,
+    }
+
+
+def verify():
+    """Row counts of both tiers, plus loans present in both (should be 0).
+
+    Reads both tables in full, so it is for the verify-loan-archive command,
+    not for every archive run.
+    """
+    return frappe._dict(
+        hot=frappe.db.sql("SELECT COUNT(*) FROM `tabLoan`")[0][0],
+        archived=frappe.db.sql(f"SELECT COUNT(*) FROM `{ARCHIVE_TABLE}`")[0][0],
+        duplicates=frappe.db.sql(f"""
+            SELECT COUNT(*)
+            FROM `{ARCHIVE_TABLE}` a
+            JOIN `tabLoan` l ON l.name = a.name
+        """)[0][0],
+    )
+
+
+def run_scheduled_archive():
+    """weekly_long job: archive with the site's configured retention."""
+    if frappe.conf.get("loan_archive_disabled"):
+        return
+    archive_loans()
+
+
+def _archive_batch(names):
+    columns = ", ".join(f"`{c}`" for c in LOAN_COLUMNS)
+    values = {"names": tuple(names), "now": now()}
+
+    frappe.db.sql(f"""
+        INSERT INTO `{ARCHIVE_TABLE}` ({columns}, `archived_on`)
+        SELECT {columns}, %(now)s
+        FROM `tabLoan`
+        WHERE `name` IN %(names)s
+    """, values)
+    inserted = _row_count()
+    copied = frappe.db.sql(f"SELECT COUNT(*) FROM `{ARCHIVE_TABLE}` WHERE `name` IN %(names)s", values)[0][0]
+
+    # Archived loans leave the loan list, so synced clients have to drop them.
+    change_feed.add_tombstones("Loan", names)
+    frappe.db.sql("DELETE FROM `tabLoan` WHERE `name` IN %(names)s", values)
+    deleted = _row_count()
+    remaining = frappe.db.sql("SELECT COUNT(*) FROM `tabLoan` WHERE `name` IN %(names)s", values)[0][0]
+
+    if copied != len(names) or remaining:
+        frappe.db.rollback()
+        frappe.throw(_("Loan archive batch failed verification: {0} of {1} copied, {2} left behind.").format(
+            copied, len(names), remaining
+        ))
+    frappe.db.commit()
+    return inserted, deleted
+
+
+def _row_count():
+    return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
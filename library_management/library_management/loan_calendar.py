@@ -0,0 +1,110 @@
+# file: library_management/loan_calendar.py
+#
+# Interval index over loan periods: availability calendars and overlap checks.
+#
+# A loan occupies its book from `loan_date` through `return_date`, both
+# inclusive. build_index() reads the loans of a set of books that touch a
+# date range in one query (book_return_date_index) and keeps, per book, the
+# busy periods sorted by start with overlapping loans merged. Merged periods
+# are disjoint, so their ends are sorted as well and the period covering or
+# following any date is found by bisecting the ends: an overlap check costs
+# O(log n) and the free windows of a range O(log n + k) for the k periods in
+# it, however many loans the book has had.
+#
+# Unlike the materialized Book availability, which only tracks the loan with
+# the latest return date, this sees every loan, so future-dated loans and the
+# gaps between loans are handled correctly.
+
+import bisect
+from datetime import timedelta
+
+import frappe
+from frappe.utils import getdate
+
+ONE_DAY = timedelta(days=1)
+
+
+class BookCalendar:
+    """Busy periods of one book: parallel sorted lists of starts, ends and the loans in each."""
+
+    def __init__(self, loans=()):
+        self.starts = []
+        self.ends = []
+        self.loans = []
+        for loan in sorted(loans, key=lambda loan: getdate(loan.loan_date)):
+            start, end = getdate(loan.loan_date), getdate(loan.return_date)
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+                self.loans[-1].append(loan)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+                self.loans.append([loan])
+
+    def overlap(self, start, end):
+        """Return a loan overlapping [start, end], or None."""
+        start, end = getdate(start), getdate(end)
+        i = bisect.bisect_left(self.ends, start)
+        if i == len(self.starts) or self.starts[i] > end:
+            return None
+        # The period can intersect the range while none of its loans does on
+        # its own, e.g. with legacy rows returned before they were lent.
+        return next(
+            (loan for loan in self.loans[i]
+                if getdate(loan.loan_date) <= end and getdate(loan.return_date) >= start),
+            None,
+        )
+
+    def busy(self, start, end):
+        """Busy periods intersecting [start, end], clipped to it."""
+        start, end = getdate(start), getdate(end)
+        periods = []
+        i = bisect.bisect_left(self.ends, start)
+        while i < len(self.starts) and self.starts[i] <= end:
+            periods.append((max(self.starts[i], start), min(self.ends[i], end)))
+            i += 1
+        return periods
+
+    def free_windows(self, start, end):
+        """Sub-ranges of [start, end] during which the book is not on loan."""
+        start, end = getdate(start), getdate(end)
+        windows = []
+        cursor = start
+        for busy_start, busy_end in self.busy(start, end):
+            if busy_start > cursor:
+                windows.append((cursor, busy_start - ONE_DAY))
+            cursor = busy_end + ONE_DAY
+        if cursor <= end:
+            windows.append((cursor, end))
+        return windows
+
+
+def build_index(books, from_date, to_date, exclude_loan=None):
+    """Return {book: BookCalendar} of the loans touching [from_date, to_date], for every book in `books`."""
+    books = tuple(set(filter(None, books)))
+    if not books:
+        return {}
+
+    conditions = ""
+    values = {"books": books, "from_date": getdate(from_date), "to_date": getdate(to_date)}
+    if exclude_loan:
+        conditions = "AND `name` != %(exclude_loan)s"
+        values["exclude_loan"] = exclude_loan
+
+    loans = {book: [] for book in books}
+    for loan in frappe.db.sql(f"""
+        SELECT `name`, `book`, `member`, `loan_date`, `return_date`
+        FROM `tabLoan`
+        WHERE `book` IN %(books)s AND `docstatus` < 2
+            AND `return_date` >= %(from_date)s AND `loan_date` <= %(to_date)s
+            {conditions}
+    """, values, as_dict=True):
+        loans[loan.book].append(loan)
+
+    return {book: BookCalendar(book_loans) for book, book_loans in loans.items()}
+
+
+def find_overlap(book, loan_date, return_date, exclude_loan=None):
+    """Return {name, book, member, loan_date, return_date} of a loan of `book` overlapping the period, or None."""
+    calendar = build_index([book], loan_date, return_date, exclude_loan=exclude_loan).get(book)
+    return calendar.overlap(loan_date, return_date) if calendar else None
@@ -0,0 +1,275 @@
+# file: library_management/loan_claims.py
+#
+# Database-enforced single active loan per book.
+#
+# The overlap checks in Loan.validate and the loan endpoints read committed
+# loans, so two desks checking out the same book at the same moment could both
+# pass them. To close that window every loan also claims each day it occupies
+# its book, from today (or its loan date if later) through its return date, as
+# a row of `__loan_claim` whose primary key is (book, day). Claims are written
+# in the same transaction as the loan, so of two overlapping checkouts only one
+# can commit: the other hits a duplicate key, or times out after
+# LOCK_WAIT_SECONDS waiting on the first one's uncommitted row, and fails with
+# a validation error. Checkouts of different books touch disjoint keys and
+# never wait on each other.
+#
+# Past days are not claimed (backdated loans are only checked by the overlap
+# queries), so the table stays proportional to the loans still running; the
+# daily prune() drops the days that have gone by. A loan that is still running
+# may last at most max_loan_days (site config, default MAX_LOAN_DAYS), which
+# also bounds the rows one claim writes.
+
+import frappe
+from frappe.utils import add_days, cint, date_diff, getdate, nowdate
+
+CLAIM_TABLE = "__loan_claim"
+# How long a checkout waits for a concurrent checkout of the same book.
+LOCK_WAIT_SECONDS = 1
+MAX_LOAN_DAYS = 366
+PRUNE_BATCH_SIZE = 5000
+REBUILD_BATCH_SIZE = 1000
+
+
+def create_claim_table():
+    """Create the loan claim table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{CLAIM_TABLE}` (
+            `book` VARCHAR(140) NOT NULL,
+            `day` DATE NOT NULL,
+            `loan` VARCHAR(140) NOT NULL,
+            PRIMARY KEY (`book`, `day`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def claim(loan, book, loan_date, return_date, previous=None):
+    """Claim `book` for `loan` from loan_date through return_date; return False if another loan holds a day.
+
+    `previous` ({book, loan_date, return_date}) is the loan's earlier period,
+    whose claims are released first. On failure nothing is changed.
+    """
+    savepoint = f"loan_claim_{frappe.generate_hash(length=8)}"
+    frappe.db.savepoint(savepoint)
+    try:
+        if previous:
+            release(loan, previous.get("book"), previous.get("loan_date"), previous.get("return_date"))
+        _insert(loan, book, loan_date, return_date)
+    except Exception as e:
+        if not _is_conflict(e):
+            raise
+        frappe.db.rollback(save_point=savepoint)
+        return False
+    frappe.db.release_savepoint(savepoint)
+    return True
+
+
+def claim_many(claims):
+    """Claim the periods of many loans at once; return the names of the loans that could not.
+
+    `claims` are dicts of {loan, book, loan_date, return_date, previous}, as
+    for claim(). All previous periods are released with one DELETE and all new
+    days written with one INSERT, so a batch costs a fixed handful of
+    statements. Loans that lost a day to another loan are left with their
+    previous claims and the batch is claimed again without them.
+    """
+    claims = sorted(claims, key=lambda c: (c["book"], c["loan"]))
+    if not claims:
+        return set()
+
+    savepoint = f"loan_claim_{frappe.generate_hash(length=8)}"
+    frappe.db.savepoint(savepoint)
+    try:
+        _release_many([c for c in claims if c.get("previous")])
+        wanted, failed = {}, set()
+        for c in claims:
+            for book, day, loan in _rows(c["loan"], c["book"], c["loan_date"], c["return_date"]):
+                # Two loans of the batch want the same day: the later one fails
+                if wanted.setdefault((book, day), loan) != loan:
+                    failed.add(loan)
+        _insert_many(wanted)
+        failed |= {wanted[key] for key, owner in _owners(wanted).items() if owner != wanted[key]}
+    except Exception as e:
+        if not _is_conflict(e):
+            raise
+        # Waited too long on a concurrent checkout: find out which loans it blocks
+        frappe.db.rollback(save_point=savepoint)
+        return {c["loan"] for c in claims if not claim(c["loan"], c["book"], c["loan_date"], c["return_date"], c.get("previous"))}
+
+    if failed:
+        frappe.db.rollback(save_point=savepoint)
+        return failed | claim_many([c for c in claims if c["loan"] not in failed])
+    frappe.db.release_savepoint(savepoint)
+    return failed
+
+
+def too_long(loan_date, return_date):
+    """Whether a loan that is still running would last more than max_loan_days."""
+    if not (loan_date and return_date) or getdate(return_date) < getdate(nowdate()):
+        return False
+    return date_diff(return_date, loan_date) + 1 > max_loan_days()
+
+
+def max_loan_days():
+    return cint(frappe.conf.get("max_loan_days")) or MAX_LOAN_DAYS
+
+
+def release(loan, book, loan_date, return_date):
+    """Drop the claims `loan` holds on `book` between its loan and return dates."""
+    if not (loan and book and loan_date):
+        return
+    # Bounded by the primary key so only this book's rows are locked.
+    frappe.db.sql(f"""
+        DELETE FROM `{CLAIM_TABLE}`
+        WHERE `book` = %(book)s AND `day` BETWEEN %(from_date)s AND %(to_date)s AND `loan` = %(loan)s
+    """, {
+        "book": book,
+        "loan": loan,
+        "from_date": getdate(loan_date),
+        "to_date": getdate(return_date or loan_date),
+    })
+
+
+def prune(batch_size=PRUNE_BATCH_SIZE):
+    """Daily job: delete the claims of days before today. Returns the number of rows deleted."""
+    today = getdate(nowdate())
+    deleted = 0
+    while True:
+        keys = frappe.db.sql(f"""
+            SELECT `book`, `day` FROM `{CLAIM_TABLE}` WHERE `day` < %(today)s LIMIT %(limit)s
+        """, {"today": today, "limit": cint(batch_size)})
+        if not keys:
+            return deleted
+        # Delete by primary key so running checkouts are not blocked by range locks.
+        frappe.db.sql(f"DELETE FROM `{CLAIM_TABLE}` WHERE (`book`, `day`) IN %(keys)s", {"keys": tuple(keys)})
+        frappe.db.commit()
+        deleted += len(keys)
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """Recompute every claim from the loans that are still running.
+
+    Returns {claimed, conflicts}: the days claimed and the names of loans that
+    overlap an earlier loan of the same book and so could not claim every day.
+    """
+    create_claim_table()
+    frappe.db.sql(f"DELETE FROM `{CLAIM_TABLE}`")
+
+    claimed, conflicts = 0, []
+    last = ("", "")
+    while True:
+        loans = frappe.db.sql("""
+            SELECT `name`, `book`, `loan_date`, `return_date`
+            FROM `tabLoan`
+            WHERE `docstatus` < 2 AND `return_date` >= %(today)s
+                AND (`loan_date`, `name`) > (%(last_date)s, %(last_name)s)
+            ORDER BY `loan_date`, `name`
+            LIMIT %(limit)s
+        """, {"today": nowdate(), "last_date": last[0] or "0001-01-01", "last_name": last[1],
+              "limit": cint(batch_size)}, as_dict=True)
+        if not loans:
+            break
+        for loan in loans:
+            rows = _rows(loan.name, loan.book, loan.loan_date, loan.return_date)
+            if not rows:
+                continue
+            # Earlier loans win: a later overlapping loan only gets its free days.
+            frappe.db.sql(f"""
+                INSERT IGNORE INTO `{CLAIM_TABLE}` (`book`, `day`, `loan`)
+                VALUES {", ".join(["(%s, %s, %s)"] * len(rows))}
+            """, [v for row in rows for v in row])
+            count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+            claimed += count
+            if count < len(rows):
+                conflicts.append(loan.name)
+        frappe.db.commit()
+        last = (loans[-1].loan_date, loans[-1].name)
+
+    frappe.db.commit()
+    return frappe._dict(claimed=claimed, conflicts=conflicts)
+
+
+# ---------------- doc_events ----------------
+
+def on_loan_cancel(doc, method=None):
+    release(doc.name, doc.book, doc.loan_date, doc.return_date)
+
+
+def on_loan_trash(doc, method=None):
+    release(doc.name, doc.book, doc.loan_date, doc.return_date)
+
+
+def on_loan_rename(doc, method=None, old=None, new=None, merge=False):
+    frappe.db.sql(f"UPDATE `{CLAIM_TABLE}` SET `loan` = %s WHERE `book` = %s AND `loan` = %s",
+                  (new, doc.book, old))
+
+
+def on_book_rename(doc, method=None, old=None, new=None, merge=False):
+    # When merging, days both books had claimed keep the surviving book's claim.
+    frappe.db.sql(f"UPDATE IGNORE `{CLAIM_TABLE}` SET `book` = %s WHERE `book` = %s", (new, old))
+    frappe.db.sql(f"DELETE FROM `{CLAIM_TABLE}` WHERE `book` = %s", (old,))
+
+
+# ---------------- helpers ----------------
+
+def _insert(loan, book, loan_date, return_date):
+    rows = _rows(loan, book, loan_date, return_date)
+    if not rows:
+        return
+    # Rows are in (book, day) order, so two claims on a book wait on each
+    # other instead of deadlocking.
+    frappe.db.sql(f"""
+        SET STATEMENT innodb_lock_wait_timeout = {cint(LOCK_WAIT_SECONDS)} FOR
+        INSERT INTO `{CLAIM_TABLE}` (`book`, `day`, `loan`)
+        VALUES {", ".join(["(%s, %s, %s)"] * len(rows))}
+    """, [v for row in rows for v in row])
+
+
+def _insert_many(wanted):
+    if not wanted:
+        return
+    # Taken days are skipped here and reported by _owners()
+    frappe.db.sql(f"""
+        SET STATEMENT innodb_lock_wait_timeout = {cint(LOCK_WAIT_SECONDS)} FOR
+        INSERT IGNORE INTO `{CLAIM_TABLE}` (`book`, `day`, `loan`)
+        VALUES {", ".join(["(%s, %s, %s)"] * len(wanted))}
+    """, [v for (book, day), loan in sorted(wanted.items()) for v in (book, day, loan)])
+
+
+def _owners(wanted):
+    """{(book, day): loan} currently holding the days in `wanted`."""
+    if not wanted:
+        return {}
+    books = {}
+    for book, day in wanted:
+        first, last = books.get(book, (day, day))
+        books[book] = (min(first, day), max(last, day))
+    conditions = " OR ".join(["(`book` = %s AND `day` BETWEEN %s AND %s)"] * len(books))
+    rows = frappe.db.sql(f"""
+        SELECT `book`, `day`, `loan` FROM `{CLAIM_TABLE}` WHERE {conditions}
+    """, [v for book, (first, last) in books.items() for v in (book, first, last)])
+    return {(book, getdate(day)): loan for book, day, loan in rows if (book, getdate(day)) in wanted}
+
+
+def _release_many(claims):
+    if not claims:
+        return
+    conditions, values = [], []
+    for c in claims:
+        previous = c["previous"]
+        if not (previous.get("book") and previous.get("loan_date")):
+            continue
+        conditions.append("(`book` = %s AND `day` BETWEEN %s AND %s AND `loan` = %s)")
+        values += [previous.get("book"), getdate(previous.get("loan_date")),
+                   getdate(previous.get("return_date") or previous.get("loan_date")), c["loan"]]
+    if conditions:
+        frappe.db.sql(f"DELETE FROM `{CLAIM_TABLE}` WHERE {' OR '.join(conditions)}", values)
+
+
+def _rows(loan, book, loan_date, return_date):
+    start = max(getdate(loan_date), getdate(nowdate()))
+    end = getdate(return_date or loan_date)
+    return [(book, add_days(start, offset), loan) for offset in range((end - start).days + 1)]
+
+
+def _is_conflict(e):
+    return isinstance(e, frappe.QueryTimeoutError) or bool(e.args and frappe.db.is_duplicate_entry(e))
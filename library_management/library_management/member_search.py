@@ -0,0 +1,195 @@
+# file: library_management/member_search.py
+#
+# Member directory search index.
+#
+# `__member_search` holds normalized lookup terms, several per member:
+#   name  - the whole full name ("ada lovelace")
+#   word  - the name from each later word on ("lovelace")
+#   id    - membership ID
+#   email - lower-cased email
+#   phone - digits of the phone number
+# The primary key (kind, term, member) makes every lookup one index range
+# read: prefix matches on names and membership IDs, exact matches on email and
+# phone. Rows are kept in step with Member by doc_events; bulk writers call
+# rebuild_index().
+
+import re
+import unicodedata
+
+import frappe
+from frappe.utils import cint
+
+SEARCH_TABLE = "__member_search"
+REBUILD_CHUNK_SIZE = 5000
+MAX_RESULTS = 100
+
+# Lookups in rank order: (kind, exact match?)
+_LOOKUPS = (
+    ("id", True),
+    ("email", True),
+    ("phone", True),
+    ("name", True),
+    ("id", False),
+    ("name", False),
+    ("word", False),
+)
+_MEMBER_FIELDS = ("name", "fullname", "membership_id", "email", "phone")
+_SPACE = re.compile(r"\s+")
+_NON_DIGIT = re.compile(r"\D")
+
+
+def create_search_table():
+    """Create the Member search index table if it does not exist yet."""
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{SEARCH_TABLE}` (
+            `kind` VARCHAR(8) NOT NULL,
+            `term` VARCHAR(140) NOT NULL,
+            `member` VARCHAR(140) NOT NULL,
+            PRIMARY KEY (`kind`, `term`, `member`),
+            KEY `member` (`member`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC CHARACTER SET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def normalize_name(value):
+    """Lower-case, accents stripped, whitespace collapsed."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return _SPACE.sub(" ", value).strip().lower()
+
+
+def normalize_email(value):
+    return (value or "").strip().lower()
+
+
+def normalize_phone(value):
+    return _NON_DIGIT.sub("", value or "")
+
+
+# ---------------- Index maintenance (Member doc_events) ----------------
+
+def index_member(doc, method=None):
+    """Replace a Member's search terms (Member on_update)."""
+    _delete_terms((doc.name,))
+    _insert_rows(_terms(doc))
+
+
+def unindex_member(doc, method=None):
+    """Remove a Member from the search index (Member on_trash)."""
+    _delete_terms((doc.name,))
+
+
+def reindex_renamed_member(doc, method=None, old=None, new=None, merge=False):
+    """Move the terms of a renamed Member to its new name (Member after_rename)."""
+    _delete_terms((old, new))
+    member = frappe.db.get_value("Member", new, _MEMBER_FIELDS, as_dict=True)
+    if member:
+        _insert_rows(_terms(member))
+
+
+def rebuild_index(chunk_size=REBUILD_CHUNK_SIZE):
+    """Rebuild the whole search index from `tabMember` in keyset-ordered chunks.
+
+    Returns the number of members indexed.
+    """
+    create_search_table()
+    frappe.db.sql(f"DELETE FROM `{SEARCH_TABLE}`")
+
+    last_name = ""
+    total = 0
+    while True:
+        members = frappe.db.sql(f"""
+            SELECT {", ".join(f"`{f}`" for f in _MEMBER_FIELDS)}
+            FROM `tabMember`
+            WHERE `name` > %s
+            ORDER BY `name`
+            LIMIT %s
+        """, (last_name, chunk_size), as_dict=True)
+        if not members:
+            break
+
+        _insert_rows([row for member in members for row in _terms(member)])
+        frappe.db.commit()
+
+        total += len(members)
+        last_name = members[-1].name
+
+    return total
+
+
+def _terms(member):
+    rows = []
+    words = normalize_name(member.fullname).split(" ")
+    if words[0]:
+        rows.append(("name", " ".join(words)))
+        rows.extend(("word", " ".join(words[i:])) for i in range(1, len(words)))
+    rows.append(("id", normalize_name(member.membership_id)))
+    rows.append(("email", normalize_email(member.email)))
+    rows.append(("phone", normalize_phone(member.phone)))
+    return [(kind, term[:140], member.name) for kind, term in dict.fromkeys(rows) if term]
+
+
+def _insert_rows(rows):
+    if not rows:
+        return
+    placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+    frappe.db.sql(f"""
+        INSERT IGNORE INTO `{SEARCH_TABLE}` (`kind`, `term`, `member`)
+        VALUES {placeholders}
+    """, [value for row in rows for value in row])
+
+
+def _delete_terms(members):
+    frappe.db.sql(f"DELETE FROM `{SEARCH_TABLE}` WHERE `member` IN %s", (tuple(members),))
+
+
+# ---------------- Queries ----------------
+
+def search(query, limit=20):
+    """Members matching `query`, best first.
+
+    Exact membership ID, email, phone and full-name matches rank first, then
+    membership IDs and full names starting with the query, then names with a
+    later word (e.g. the surname) starting with it. Each tier is one bounded
+    index range read, and reading stops once `limit` members are found.
+    """
+    limit = min(max(cint(limit), 1), MAX_RESULTS)
+    terms = {
+        "name": normalize_name(query),
+        "word": normalize_name(query),
+        "id": normalize_name(query),
+        "email": normalize_email(query),
+        "phone": normalize_phone(query),
+    }
+
+    ranked = {}
+    for kind, exact in _LOOKUPS:
+        term = terms[kind]
+        if not term or len(ranked) >= limit:
+            continue
+        condition = "`term` = %(term)s" if exact else "`term` LIKE %(prefix)s"
+        names = frappe.db.sql_list(f"""
+            SELECT `member`
+            FROM `{SEARCH_TABLE}`
+            WHERE `kind` = %(kind)s AND {condition}
+            ORDER BY `term`, `member`
+            LIMIT %(limit)s
+        """, {"kind": kind, "term": term, "prefix": _escape_like(term) + "%", "limit": limit})
+        for name in names:
+            ranked.setdefault(name, len(ranked))
+
+    names = list(ranked)[:limit]
+    if not names:
+        return []
+
+    members = frappe.db.sql(f"""
+        SELECT {", ".join(f"`{f}`" for f in _MEMBER_FIELDS)}
+        FROM `tabMember`
+        WHERE `name` IN %(names)s
+    """, {"names": tuple(names)}, as_dict=True)
+    members.sort(key=lambda member: ranked[member.name])
+    return members
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
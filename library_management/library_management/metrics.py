@@ -0,0 +1,246 @@
+# file: library_management/metrics.py
+#
+# Per-call latency and SQL metrics in Prometheus text format.
+#
+# Two kinds of calls are measured:
+# - "api": every request to a whitelisted library_management method, timed
+#   from the before_request to the after_request hook, so it also covers
+#   methods added later without touching their code;
+# - "validate": doctype controller validate() methods wrapped with @timed.
+#
+# Each call records its latency (histogram over BUCKETS), the number and total
+# duration of the SQL statements it ran, the rows it returned and, on failure,
+# its exception type. Statements are counted by wrapping `sql` on the request's
+# database connection once. All counters of a call are written to one Redis
+# hash in a single pipelined round trip, so every worker adds to the same
+# totals; get_metrics renders them on request.
+#
+# Collection is off unless the site config sets `library_metrics_enabled`.
+
+import functools
+import time
+
+import frappe
+
+KEY = "library_management:metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+API = "api"
+VALIDATE = "validate"
+
+_API_PREFIX = "/api/method/"
+_APP_PREFIX = "library_management."
+
+
+def is_enabled():
+    return bool(frappe.conf.get("library_metrics_enabled"))
+
+
+def get_request_method(request):
+    """Short label ("loan_api.get_loans") of an app method request, resolving aliases."""
+    path = getattr(request, "path", "") or ""
+    if not path.startswith(_API_PREFIX):
+        return None
+    method = path[len(_API_PREFIX):]
+    method = (frappe.get_hooks("override_whitelisted_methods").get(method) or [method])[-1]
+    if not method.startswith(_APP_PREFIX):
+        return None
+    return ".".join(method.rsplit(".", 2)[-2:])
+
+
+def timed(name, kind=VALIDATE):
+    """Decorator recording each call of a method under (kind, name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+
+            probe = _sql_probe()
+            queries, sql_seconds = probe.queries, probe.seconds
+            started = time.perf_counter()
+            error = None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                record(
+                    kind, name, time.perf_counter() - started,
+                    queries=probe.queries - queries,
+                    sql_seconds=probe.seconds - sql_seconds,
+                    error=error,
+                )
+        return wrapper
+    return decorator
+
+
+def record(kind, name, seconds, queries=0, sql_seconds=0.0, rows=0, error=None):
+    """Add one call to the shared counters."""
+    cache = frappe.cache()
+    key = cache.make_key(KEY)
+    series = f"{kind}|{name}"
+    try:
+        pipe = cache.pipeline(transaction=False)
+        pipe.hincrby(key, f"{series}|count", 1)
+        pipe.hincrbyfloat(key, f"{series}|sum", seconds)
+        pipe.hincrby(key, f"{series}|bucket|{_bucket(seconds)}", 1)
+        pipe.hincrby(key, f"{series}|queries", queries)
+        pipe.hincrbyfloat(key, f"{series}|sql_seconds", sql_seconds)
+        if rows:
+            pipe.hincrby(key, f"{series}|rows", rows)
+        if error:
+            pipe.hincrby(key, f"{series}|error|{error}", 1)
+        pipe.execute()
+    except Exception:
+        # Losing a sample is better than failing the call it measured.
+        pass
+
+
+def collect():
+    """Return {(kind, name): {count, sum, buckets, queries, sql_seconds, rows, errors}}."""
+    cache = frappe.cache()
+    raw = cache.hgetall(cache.make_key(KEY)) or {}
+    series = {}
+    for field, value in raw.items():
+        kind, name, metric, *rest = frappe.safe_decode(field).split("|")
+        entry = series.setdefault((kind, name), {
+            "count": 0, "sum": 0.0, "buckets": {}, "queries": 0, "sql_seconds": 0.0, "rows": 0, "errors": {},
+        })
+        value = frappe.safe_decode(value)
+        if metric == "bucket":
+            entry["buckets"][rest[0]] = int(value)
+        elif metric == "error":
+            entry["errors"][rest[0]] = int(value)
+        elif metric in ("sum", "sql_seconds"):
+            entry[metric] = float(value)
+        else:
+            entry[metric] = int(value)
+    return series
+
+
+def render():
+    """The collected metrics in Prometheus text exposition format."""
+    series = sorted(collect().items())
+    lines = []
+
+    def family(metric, kind, help_text):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+
+    family("library_call_duration_seconds", "histogram", "Latency of API requests and doctype validate hooks.")
+    for (kind, name), entry in series:
+        labels = _labels(kind=kind, name=name)
+        cumulative = 0
+        for bound in (*BUCKETS, "+Inf"):
+            cumulative += entry["buckets"].get(str(bound), 0)
+            lines.append(f'library_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"library_call_duration_seconds_sum{{{labels}}} {entry['sum']}")
+        lines.append(f"library_call_duration_seconds_count{{{labels}}} {entry['count']}")
+
+    for metric, field, help_text in (
+        ("library_call_sql_queries_total", "queries", "SQL statements executed."),
+        ("library_call_sql_seconds_total", "sql_seconds", "Time spent in SQL statements."),
+        ("library_call_rows_returned_total", "rows", "Rows returned by API responses."),
+    ):
+        family(metric, "counter", help_text)
+        for (kind, name), entry in series:
+            lines.append(f"{metric}{{{_labels(kind=kind, name=name)}}} {entry[field]}")
+
+    family("library_call_errors_total", "counter", "Failed calls by exception type.")
+    for (kind, name), entry in series:
+        for exception, count in sorted(entry["errors"].items()):
+            lines.append(f"library_call_errors_total{{{_labels(kind=kind, name=name, exception=exception)}}} {count}")
+
+    # rate_limit imports this module for get_request_method
+    from library_management.rate_limit import get_rejections
+
+    family("library_rate_limit_rejections_total", "counter", "Requests rejected by endpoint token buckets.")
+    for (name, scope), count in sorted(get_rejections().items()):
+        lines.append(f"library_rate_limit_rejections_total{{{_labels(name=name, scope=scope)}}} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    cache = frappe.cache()
+    cache.delete(cache.make_key(KEY))
+
+
+def _bucket(seconds):
+    for bound in BUCKETS:
+        if seconds <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def _sql_probe():
+    """Statement counter of this request's connection, installed on first use."""
+    db = frappe.local.db
+    probe = getattr(db, "_library_metrics_probe", None)
+    if probe is None:
+        probe = db._library_metrics_probe = frappe._dict(queries=0, seconds=0.0)
+        sql = db.sql
+
+        def timed_sql(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return sql(*args, **kwargs)
+            finally:
+                probe.queries += 1
+                probe.seconds += time.perf_counter() - started
+
+        db.sql = timed_sql
+    return probe
+
+
+def _rows(message):
+    if isinstance(message, (list, tuple)):
+        return len(message)
+    if isinstance(message, dict):
+        data = message.get("data")
+        return len(data) if isinstance(data, (list, tuple)) else 1
+    return 0
+
+
+# ---------------- request hooks ----------------
+
+def before_request():
+    if not is_enabled():
+        return
+    method = get_request_method(frappe.local.request)
+    if not method:
+        return
+    probe = _sql_probe()
+    frappe.local.library_metrics_call = (method, time.perf_counter(), probe.queries, probe.seconds)
+
+
+def after_request(response=None, request=None):
+    call = getattr(frappe.local, "library_metrics_call", None)
+    if not call:
+        return
+    frappe.local.library_metrics_call = None
+    method, started, queries, sql_seconds = call
+    probe = _sql_probe()
+
+    status = getattr(response, "status_code", 200)
+    error = frappe.local.response.get("exc_type") if status >= 400 else None
+    if status >= 400 and not error:
+        error = f"HTTP {status}"
+
+    record(
+        API, method, time.perf_counter() - started,
+        queries=probe.queries - queries,
+        sql_seconds=probe.seconds - sql_seconds,
+        rows=0 if error else _rows(frappe.local.response.get("message")),
+        error=error,
+    )
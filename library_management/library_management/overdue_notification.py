@@ -1,58 +1,149 @@
 import frappe
-from frappe.utils import nowdate
+from frappe.utils import cint, escape_html, nowdate
 from frappe import _
 
-def send_overdue_notifications():
-    print("📬 Running send_overdue_notifications()...")
-
-    overdue_loans = frappe.get_all(
-        "Loan",
-        filters={
-            "return_date": ("<", nowdate()),
-            "notified_overdue": ("!=", 1),
-            "docstatus": 1
-        },
-        fields=["name", "member", "book", "loan_date", "return_date"]
+# Members are split across this many background jobs by CRC32(member) % shards.
+# Override with `overdue_notification_shards` in site_config.json.
+DEFAULT_SHARDS = 4
+# Members handled per query / commit inside a shard.
+MEMBER_BATCH_SIZE = 500
+WATERMARK_KEY = "overdue_notification:{date}:{shard}/{shards}"
+
+logger = frappe.logger("overdue_notification")
+
+
+def send_overdue_notifications(now=False):
+    """Daily entry point: fan the run out into one background job per member shard.
+
+    Pass `now=True` to run every shard inline (tests, bench execute).
+    """
+    shards = cint(frappe.conf.get("overdue_notification_shards")) or DEFAULT_SHARDS
+    today = nowdate()
+    _purge_stale_watermarks(today)
+
+    for shard in range(shards):
+        kwargs = {"shard": shard, "shards": shards, "run_date": today}
+        if now:
+            send_overdue_shard(**kwargs)
+        else:
+            frappe.enqueue(
+                "library_management.overdue_notification.send_overdue_shard",
+                queue="long",
+                job_id=f"overdue_notification::{today}::{shard}/{shards}",
+                deduplicate=True,
+                **kwargs,
+            )
+
+
+def send_overdue_shard(shard, shards, run_date=None):
+    """Send one digest email per member in this shard and flag their loans as notified.
+
+    Members are processed in name order, MEMBER_BATCH_SIZE at a time. Each batch
+    queues its emails, flags its loans and advances the shard's watermark in a
+    single commit, so a crashed run resumes after the last committed member
+    without re-sending anything.
+    """
+    run_date = run_date or nowdate()
+    key = WATERMARK_KEY.format(date=run_date, shard=shard, shards=shards)
+    after = frappe.db.get_global(key) or ""
+    sent = 0
+
+    while True:
+        # Read from notified_overdue_member_index: only loans not yet notified,
+        # in member order, so each batch resumes where the last one stopped.
+        members = [m[0] for m in frappe.db.sql("""
+            SELECT DISTINCT l.member
+            FROM `tabLoan` l
+            WHERE l.return_date < %(today)s
+                AND l.notified_overdue = 0
+                AND l.returned_on IS NULL
+                AND l.docstatus < 2
+                AND l.member > %(after)s
+                AND MOD(CRC32(l.member), %(shards)s) = %(shard)s
+            ORDER BY l.member
+            LIMIT %(limit)s
+        """, {"today": run_date, "after": after, "shards": shards, "shard": shard, "limit": MEMBER_BATCH_SIZE})]
+        if not members:
+            break
+
+        loans = frappe.db.sql("""
+            SELECT
+                l.name, l.member, l.return_date,
+                m.email AS member_email,
+                m.fullname AS member_name,
+                b.title AS book_title
+            FROM `tabLoan` l
+            LEFT JOIN `tabMember` m ON l.member = m.name
+            LEFT JOIN `tabBook` b ON l.book = b.name
+            WHERE l.member IN %(members)s
+                AND l.return_date < %(today)s
+                AND l.notified_overdue = 0
+                AND l.returned_on IS NULL
+                AND l.docstatus < 2
+            ORDER BY l.member, l.return_date
+        """, {"members": tuple(members), "today": run_date}, as_dict=True)
+
+        digests = {}
+        for loan in loans:
+            digests.setdefault(loan.member, []).append(loan)
+
+        notified = []
+        for member, member_loans in digests.items():
+            email = member_loans[0].member_email
+            if not email:
+                logger.warning(f"No email found for member {member}")
+                continue
+            try:
+                _send_digest(email, member_loans)
+            except Exception:
+                frappe.log_error(title=_("Failed to send overdue notification to {0}").format(member))
+                continue
+            notified.extend(loan.name for loan in member_loans)
+            sent += 1
+
+        if notified:
+            frappe.db.sql("""
+                UPDATE `tabLoan`
+                SET `notified_overdue` = 1
+                WHERE `name` IN %(loans)s
+            """, {"loans": tuple(notified)})
+
+        after = members[-1]
+        frappe.db.set_global(key, after)
+        frappe.db.commit()
+
+    frappe.db.set_global(key, None)
+    frappe.db.commit()
+    logger.info(f"Shard {shard}/{shards}: sent {sent} overdue digests")
+    return sent
+
+
+def _send_digest(email, loans):
+    rows = "".join(
+        f"<li><strong>{escape_html(loan.book_title or '')}</strong> &mdash; due {loan.return_date}</li>"
+        for loan in loans
     )
+    frappe.sendmail(
+        recipients=[email],
+        subject=_("Library Book Overdue") if len(loans) == 1 else _("{0} Library Books Overdue").format(len(loans)),
+        message=f"""
+            <p>Dear {escape_html(loans[0].member_name or _("Member"))},</p>
+            <p>This is a reminder that the following loans are past their due date:</p>
+            <ul>{rows}</ul>
+            <p>Please return them as soon as possible to avoid penalties.</p>
+            <br>
+            <p>Thank you,</p>
+            <p>Your Library</p>
+        """,
+    )
+
 
-    print(f"📚 Found {len(overdue_loans)} overdue loans")
-
-    for loan in overdue_loans:
-        try:
-            print(f"🔍 Processing loan {loan.name}")
-
-            member_email = frappe.db.get_value("Member", loan.member, "email")
-            book_title = frappe.db.get_value("Book", loan.book, "title")
-
-            print(f"👤 Member email: {member_email}")
-            print(f"📖 Book title: {book_title}")
-
-            if member_email:
-                frappe.sendmail(
-                    recipients=[member_email],
-                    subject=_("Library Book Overdue"),
-                    message=f"""
-                        <p>Dear Member,</p>
-                        <p>This is a reminder that your loan for the book <strong>{book_title}</strong>
-                        was due on <strong>{loan.return_date}</strong>.</p>
-                        <p>Please return it as soon as possible to avoid penalties.</p>
-                        <br>
-                        <p>Thank you,</p>
-                        <p>Your Library</p>
-                    """,
-                )
-                print(f"✅ Sent notification for Loan: {loan.name} to {member_email}")
-
-                # Mark loan as notified
-                loan_doc = frappe.get_doc("Loan", loan.name)
-                loan_doc.notified_overdue = 1
-                loan_doc.save(ignore_permissions=True)
-
-                print(f"📝 Updated notified_overdue for {loan.name}")
-
-            else:
-                print(f"⚠️ No email found for member {loan.member}")
-
-        except Exception as e:
-            frappe.log_error(f"Failed to send overdue notification for loan {loan.name}: {str(e)}")
-            print(f"❌ Error sending for {loan.name}: {str(e)}")
+def _purge_stale_watermarks(today):
+    """Drop watermarks left behind by crashed runs on earlier days."""
+    frappe.db.sql("""
+        DELETE FROM `tabDefaultValue`
+        WHERE `parent` = '__global'
+            AND `defkey` LIKE 'overdue\\_notification:%%'
+            AND `defkey` NOT LIKE %s
+    """, (f"overdue\\_notification:{today}:%",))
+    frappe.db.commit()
@@ -0,0 +1,5 @@
+from library_management.indexes import ensure_indexes
+
+
+def execute():
+    ensure_indexes()
@@ -0,0 +1,22 @@
+import frappe
+
+
+def execute():
+    """Mark loans as returned when their book has been lent again since they ended.
+
+    Check-ins record `returned_on` from now on. For older loans it is only
+    known that a book lent again came back by then, so they get the next
+    loan's date; loans past due that are still their book's latest stay
+    unreturned, i.e. overdue.
+    """
+    frappe.db.sql("""
+        UPDATE `tabLoan` l
+        JOIN (
+            SELECT a.`name`, MIN(n.`loan_date`) AS next_loan_date
+            FROM `tabLoan` a
+            JOIN `tabLoan` n ON n.`book` = a.`book` AND n.`loan_date` > a.`return_date` AND n.`docstatus` < 2
+            WHERE a.`returned_on` IS NULL
+            GROUP BY a.`name`
+        ) later ON later.`name` = l.`name`
+        SET l.`returned_on` = later.next_loan_date
+    """)
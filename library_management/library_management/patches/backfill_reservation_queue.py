@@ -0,0 +1,37 @@
+import frappe
+
+from library_management import waitlist
+
+
+def execute():
+    """Number existing reservations per book in reservation order and seed each Book's counter."""
+    frappe.db.sql("""
+        UPDATE `tabReservation` r
+        JOIN (
+            SELECT `name`, ROW_NUMBER() OVER (
+                PARTITION BY `book` ORDER BY `reservation_date`, `creation`, `name`
+            ) AS seq
+            FROM `tabReservation`
+        ) ranked ON ranked.`name` = r.`name`
+        SET r.`queue_seq` = ranked.seq,
+            r.`status` = IFNULL(NULLIF(r.`status`, ''), %s)
+    """, (waitlist.WAITING,))
+
+    frappe.db.sql("""
+        UPDATE `tabBook` b
+        JOIN (
+            SELECT `book`, MAX(`queue_seq`) AS seq
+            FROM `tabReservation`
+            GROUP BY `book`
+        ) q ON q.`book` = b.`name`
+        SET b.`waitlist_seq` = q.seq
+    """)
+
+    # Books that are already back on the shelf hand over to their queue head.
+    for book in frappe.db.sql_list("""
+        SELECT DISTINCT r.`book`
+        FROM `tabReservation` r
+        JOIN `tabBook` b ON b.`name` = r.`book`
+        WHERE b.`current_loan` IS NULL OR b.`due_date` < CURDATE()
+    """):
+        waitlist.promote_next(book)
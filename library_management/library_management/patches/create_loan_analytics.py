@@ -0,0 +1,6 @@
+from library_management.analytics import reconcile
+
+
+def execute():
+    # Creates the rollup table and aggregates the whole loan history.
+    reconcile(months=None)
@@ -0,0 +1,5 @@
+from library_management.loan_archive import create_archive_table
+
+
+def execute():
+    create_archive_table()
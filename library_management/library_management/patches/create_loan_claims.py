@@ -0,0 +1,13 @@
+import frappe
+
+from library_management.loan_claims import rebuild
+
+
+def execute():
+    # Creates the claim table and claims the remaining days of running loans.
+    result = rebuild()
+    if result.conflicts:
+        frappe.log_error(
+            title="Overlapping loans found while creating loan claims",
+            message=frappe.as_json(result.conflicts),
+        )
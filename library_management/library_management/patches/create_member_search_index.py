@@ -0,0 +1,6 @@
+from library_management.member_search import create_search_table, rebuild_index
+
+
+def execute():
+    create_search_table()
+    rebuild_index()
@@ -0,0 +1,5 @@
+from library_management.change_feed import create_tombstone_table
+
+
+def execute():
+    create_tombstone_table()
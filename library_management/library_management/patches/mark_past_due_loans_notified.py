@@ -0,0 +1,24 @@
+import frappe
+from frappe.utils import nowdate
+
+BATCH_SIZE = 10000
+
+
+def execute():
+    """Flag loans that were already past due before the digest job covered drafts.
+
+    The job used to read submitted loans only, and loans here are normally
+    left as drafts, so none of these was ever flagged. Without this the first
+    run would email every member about their whole past-due history.
+    """
+    while True:
+        frappe.db.sql("""
+            UPDATE `tabLoan`
+            SET `notified_overdue` = 1
+            WHERE `notified_overdue` = 0 AND `return_date` < %s
+            LIMIT %s
+        """, (nowdate(), BATCH_SIZE))
+        updated = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+        frappe.db.commit()
+        if updated < BATCH_SIZE:
+            break
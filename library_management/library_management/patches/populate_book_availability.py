@@ -0,0 +1,5 @@
+from library_management.availability import rebuild_availability
+
+
+def execute():
+    rebuild_availability()
@@ -0,0 +1,63 @@
+# file: library_management/principal.py
+#
+# Who is calling: the user's roles and linked Member, resolved once per request.
+#
+# Lookups are memoized on frappe.local for the rest of the request and shared
+# across workers through the Redis cache. Member, User and Has Role doc_events
+# drop the shared entry whenever the underlying data changes.
+
+import frappe
+
+CACHE_KEY = "library_management:principal"
+
+
+def get_principal(user=None):
+    """Return frappe._dict(user, roles, member, is_librarian, is_member) for `user` (default: session user)."""
+    user = user or frappe.session.user
+    memo = frappe.local.__dict__.setdefault("library_principals", {})
+    if user not in memo:
+        data = frappe.cache().hget(CACHE_KEY, user, generator=lambda: _load(user))
+        roles = frozenset(data["roles"])
+        memo[user] = frappe._dict(
+            user=user,
+            roles=roles,
+            member=data["member"],
+            is_librarian="Librarian" in roles,
+            is_member="Member" in roles,
+        )
+    return memo[user]
+
+
+def invalidate(*users):
+    """Forget the cached principal for each of `users`."""
+    memo = frappe.local.__dict__.get("library_principals", {})
+    for user in filter(None, users):
+        frappe.cache().hdel(CACHE_KEY, user)
+        memo.pop(user, None)
+
+
+def _load(user):
+    return {
+        "roles": frappe.get_roles(user),
+        "member": frappe.db.get_value("Member", {"email": user}, "name"),
+    }
+
+
+# ---------------- doc_events ----------------
+
+def on_member_change(doc, method=None, *args):
+    previous = doc.get_doc_before_save()
+    invalidate(doc.email, previous.email if previous else None)
+
+
+def on_member_trash(doc, method=None):
+    invalidate(doc.email)
+
+
+def on_user_change(doc, method=None):
+    invalidate(doc.name)
+
+
+def on_has_role_change(doc, method=None):
+    if doc.parenttype == "User":
+        invalidate(doc.parent)
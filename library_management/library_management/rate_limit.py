@@ -0,0 +1,144 @@
+# file: library_management/rate_limit.py
+#
+# Token-bucket throttling of app endpoints.
+#
+# Each limited endpoint has one or more buckets, identified by scope:
+#   ip    - one bucket per client IP
+#   user  - one bucket per logged-in user (Guest callers are not counted)
+#   guest - one bucket shared by every Guest caller, which caps the total
+#           anonymous load so bots cannot starve signed-in librarians
+# A bucket holds up to `capacity` tokens and refills at `rate` tokens per
+# second; a request takes one token from every bucket that applies to it and
+# is rejected with 429 Too Many Requests and a Retry-After header when one is
+# empty. Buckets live in Redis and are updated by a Lua script, so the check
+# is atomic across workers and costs one round trip per bucket.
+#
+# DEFAULT_LIMITS covers the guest endpoints; the site config key
+# `library_rate_limits` ({"module_api.method": {"ip": [capacity, rate]}})
+# adds or overrides endpoints, and `library_rate_limits_disabled` turns
+# throttling off.
+
+import math
+import time
+
+import frappe
+from frappe import _
+from frappe.exceptions import TooManyRequestsError
+
+from library_management.metrics import get_request_method
+
+KEY_PREFIX = "library_management:rate_limit"
+REJECTIONS_KEY = f"{KEY_PREFIX}:rejected"
+
+IP = "ip"
+USER = "user"
+GUEST = "guest"
+SCOPES = (IP, USER, GUEST)
+
+# endpoint -> {scope: (capacity, tokens per second)}
+DEFAULT_LIMITS = {
+    # a full catalog read per call
+    "book_api.get_books": {IP: (20, 0.2), GUEST: (200, 2)},
+    # a password hash per call
+    "auth_api.login": {IP: (10, 0.1), GUEST: (100, 2)},
+    # several inserts and two password hashes per call
+    "register_api.register_member": {IP: (5, 1 / 60), GUEST: (50, 0.5)},
+}
+
+# KEYS[1] bucket; ARGV capacity, rate, now, cost -> {allowed, retry_after seconds}
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def get_limits(method):
+    """{scope: (capacity, rate)} for `method`, with site config overrides applied."""
+    limits = dict(DEFAULT_LIMITS.get(method) or {})
+    for scope, limit in ((frappe.conf.get("library_rate_limits") or {}).get(method) or {}).items():
+        if scope not in SCOPES:
+            continue
+        if limit:
+            limits[scope] = tuple(limit)
+        else:
+            limits.pop(scope, None)
+    return limits
+
+
+def check(method, ip=None, user=None):
+    """Take a token from each bucket of `method`; raise TooManyRequestsError if one is empty."""
+    for scope, (capacity, rate) in get_limits(method).items():
+        if scope == IP:
+            subject = ip
+        elif scope == USER:
+            subject = user if user and user != "Guest" else None
+        else:
+            subject = "all" if not user or user == "Guest" else None
+        if not subject:
+            continue
+
+        allowed, retry_after = take(f"{method}:{scope}:{subject}", capacity, rate)
+        if not allowed:
+            _count_rejection(method, scope)
+            frappe.local.library_retry_after = retry_after
+            raise TooManyRequestsError(_("Too many requests. Please try again in {0} seconds.").format(retry_after))
+
+
+def take(bucket, capacity, rate, cost=1):
+    """Take `cost` tokens from `bucket`; return (allowed, whole seconds until enough tokens are back)."""
+    cache = frappe.cache()
+    allowed, retry_after = cache.eval(
+        _TAKE_SCRIPT, 1, cache.make_key(f"{KEY_PREFIX}:bucket:{bucket}"),
+        capacity, rate, time.time(), cost,
+    )
+    return bool(int(allowed)), math.ceil(float(retry_after))
+
+
+def get_rejections():
+    """Return {(method, scope): rejected requests} since the counters were last reset."""
+    cache = frappe.cache()
+    raw = cache.hgetall(cache.make_key(REJECTIONS_KEY)) or {}
+    rejections = {}
+    for field, value in raw.items():
+        method, _sep, scope = frappe.safe_decode(field).rpartition(":")
+        rejections[(method, scope)] = int(value)
+    return rejections
+
+
+def _count_rejection(method, scope):
+    cache = frappe.cache()
+    cache.hincrby(cache.make_key(REJECTIONS_KEY), f"{method}:{scope}", 1)
+
+
+# ---------------- request hooks ----------------
+
+def before_request():
+    if frappe.conf.get("library_rate_limits_disabled"):
+        return
+    method = get_request_method(frappe.local.request)
+    if method:
+        session = getattr(frappe.local, "session", None)
+        check(method, ip=getattr(frappe.local, "request_ip", None), user=session.user if session else None)
+
+
+def after_request(response=None, request=None):
+    retry_after = getattr(frappe.local, "library_retry_after", None)
+    if retry_after is not None and response is not None:
+        response.headers["Retry-After"] = str(max(retry_after, 1))
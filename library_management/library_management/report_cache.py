@@ -0,0 +1,125 @@
+# file: library_management/report_cache.py
+#
+# Redis cache for the circulation reports in report_api and the dashboard
+# summary in dashboard_api.
+#
+# Entries are keyed by report, date and permission scope. The date in the key
+# makes entries roll over at midnight, when a loan due yesterday stops being
+# "current" and becomes "overdue"; entries also expire shortly after midnight
+# so stale days do not linger. Loan, Book and Member doc_events drop only the
+# reports a write can actually change.
+
+import frappe
+from frappe.utils import add_days, get_datetime, getdate, now_datetime, nowdate
+
+CURRENT_LOANS = "current_loans"
+OVERDUE_LOANS = "overdue_loans"
+DASHBOARD_SUMMARY = "dashboard_summary"
+REPORTS = (CURRENT_LOANS, OVERDUE_LOANS, DASHBOARD_SUMMARY)
+
+KEY_PREFIX = "library_management:report_cache"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+
+# Loan fields that appear in, or decide membership of, a report row.
+_LOAN_FIELDS = ("book", "member", "loan_date", "return_date", "docstatus")
+
+
+def get_report(report, scope, generator):
+    """Return the cached rows for (report, today, scope), computing them with `generator` on a miss."""
+    cache = frappe.cache()
+    key = f"{KEY_PREFIX}:{report}:{nowdate()}:{scope}"
+
+    rows = cache.get_value(key)
+    if rows is not None:
+        _count(report, "hit")
+        return rows
+
+    _count(report, "miss")
+    rows = generator()
+    cache.set_value(key, rows, expires_in_sec=_seconds_until_rollover())
+    return rows
+
+
+def invalidate(*reports):
+    """Drop every cached entry (all dates and scopes) of the given reports (default: all)."""
+    reports = reports or REPORTS
+    _delete(reports)
+    # Another request may refill the cache from pre-commit data before this
+    # transaction commits, so drop the entries once more after the commit.
+    frappe.db.after_commit.add(lambda: _delete(reports))
+
+
+def get_stats():
+    """Return {report: {"hit": n, "miss": n}} since the counters were last reset."""
+    cache = frappe.cache()
+    raw = cache.hgetall(cache.make_key(STATS_KEY)) or {}
+    stats = {report: {"hit": 0, "miss": 0} for report in REPORTS}
+    for field, value in raw.items():
+        report, _, kind = frappe.safe_decode(field).rpartition(":")
+        stats.setdefault(report, {"hit": 0, "miss": 0})[kind] = int(value)
+    return stats
+
+
+def _delete(reports):
+    cache = frappe.cache()
+    for report in reports:
+        cache.delete_keys(f"{KEY_PREFIX}:{report}:")
+
+
+def _count(report, kind):
+    cache = frappe.cache()
+    cache.hincrby(cache.make_key(STATS_KEY), f"{report}:{kind}", 1)
+
+
+def _seconds_until_rollover():
+    midnight = get_datetime(add_days(nowdate(), 1))
+    return max(int((midnight - now_datetime()).total_seconds()), 0) + 60
+
+
+# ---------------- doc_events ----------------
+
+def on_loan_change(doc, method=None, *args):
+    previous = doc.get_doc_before_save()
+    if previous and all(previous.get(f) == doc.get(f) for f in _LOAN_FIELDS):
+        # e.g. only notified_overdue changed
+        return
+    _invalidate_for_loans(doc, previous)
+
+
+def on_loan_trash(doc, method=None):
+    _invalidate_for_loans(doc)
+
+
+def on_book_change(doc, method=None, *args):
+    previous = doc.get_doc_before_save()
+    if previous and previous.title == doc.title:
+        return
+    invalidate()
+
+
+def on_member_change(doc, method=None, *args):
+    previous = doc.get_doc_before_save()
+    if previous and previous.fullname == doc.fullname:
+        return
+    invalidate()
+
+
+def on_delete(doc, method=None):
+    invalidate()
+
+
+def on_reservation_change(doc, method=None, *args):
+    invalidate(DASHBOARD_SUMMARY)
+
+
+def invalidate_for_return_dates(return_dates):
+    """Drop the reports that loans with these return dates fall into today (for bulk writers)."""
+    today = getdate(nowdate())
+    reports = {CURRENT_LOANS if getdate(d) >= today else OVERDUE_LOANS for d in return_dates if d}
+    if reports:
+        invalidate(DASHBOARD_SUMMARY, *reports)
+
+
+def _invalidate_for_loans(*loans):
+    # Covers both the before and after state of an edited loan.
+    invalidate_for_return_dates(loan.return_date for loan in loans if loan)
@@ -0,0 +1,203 @@
+# file: library_management/report_jobs.py
+#
+# Background mode for the circulation reports and loan-history CSV exports.
+#
+# A caller submits a report with its filters and gets back a job status dict
+# keyed by a job id derived from (report, filters). The report is written by a
+# worker on the long queue to a private File, and the caller polls the status
+# (queued -> running -> completed | failed, with the rows written so far) until
+# the file can be downloaded. Submitting a report that is identical to one
+# still queued or running returns the existing job instead of starting a
+# second one, so repeated clicks cost one export.
+#
+# Statuses live in Redis for STATUS_TTL; the Files themselves are kept until
+# someone deletes them.
+
+import hashlib
+import json
+import os
+
+import frappe
+from frappe import _
+from frappe.exceptions import DoesNotExistError, ValidationError
+from frappe.utils import getdate, now
+from frappe.utils.background_jobs import is_job_enqueued
+
+from library_management import loan_export
+
+KEY_PREFIX = "library_management:report_job"
+# How long a job's status (and so its download link) can be looked up.
+STATUS_TTL = 7 * 24 * 60 * 60
+JOB_TIMEOUT = 4 * 60 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+IN_FLIGHT = (QUEUED, RUNNING)
+
+# report -> filters it accepts
+REPORTS = {
+    "current_loans": (),
+    "overdue_loans": (),
+    "loan_history": ("member", "from_date", "to_date"),
+}
+_DATE_FILTERS = ("from_date", "to_date")
+
+
+def submit(report, filters=None):
+    """Queue `report` unless an identical job is already in flight; return the job status."""
+    filters = clean_filters(report, filters)
+    job_id = get_job_id(report, filters)
+
+    existing = get_status(job_id)
+    if existing and existing["status"] in IN_FLIGHT and is_job_enqueued(_queue_job_id(job_id)):
+        return existing
+
+    status = {
+        "job_id": job_id,
+        "report": report,
+        "filters": filters,
+        "status": QUEUED,
+        "rows": 0,
+        "file_url": None,
+        "error": None,
+        "requested_by": frappe.session.user,
+        "queued_at": now(),
+        "finished_at": None,
+    }
+    _save(status)
+    frappe.enqueue(
+        "library_management.report_jobs.run",
+        queue="long",
+        timeout=JOB_TIMEOUT,
+        job_id=_queue_job_id(job_id),
+        deduplicate=True,
+        report_job_id=job_id,
+    )
+    return status
+
+
+def run(report_job_id):
+    """Worker entry point: write the report to a private File and record the outcome."""
+    status = get_status(report_job_id)
+    if not status:
+        return
+
+    status.update(status=RUNNING, rows=0, error=None, started_at=now())
+    _save(status)
+
+    def progress(rows):
+        status["rows"] = rows
+        _save(status)
+
+    file_name = f"{status['report']}_{frappe.generate_hash(length=10)}.csv"
+    path = frappe.get_site_path("private", "files", file_name)
+    try:
+        with open(path, "w", newline="", encoding="utf-8") as target:
+            rows = _write(status["report"], status["filters"], target, progress)
+
+        file_doc = _register_file(file_name, path)
+        frappe.db.commit()
+        status.update(status=COMPLETED, rows=rows, file=file_doc.name, file_url=file_doc.file_url)
+    except Exception as e:
+        frappe.db.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        status.update(status=FAILED, error=str(e))
+        frappe.log_error(title=_("Report job {0} failed").format(report_job_id))
+        raise
+    finally:
+        status["finished_at"] = now()
+        _save(status)
+
+
+def get_status(job_id):
+    cache = frappe.cache()
+    value = cache.get(cache.make_key(_key(job_id)))
+    return json.loads(value) if value else None
+
+
+def get_file_path(job_id):
+    """Path on disk of a completed job's CSV."""
+    status = get_status(job_id)
+    if not status:
+        frappe.throw(_("Report job {0} not found.").format(job_id), DoesNotExistError)
+    if status["status"] != COMPLETED:
+        frappe.throw(_("Report job {0} is {1}.").format(job_id, status["status"]), ValidationError)
+    return frappe.get_doc("File", status["file"]).get_full_path()
+
+
+def clean_filters(report, filters):
+    """Validate the filters of `report` (dict or JSON) and drop empty ones."""
+    if report not in REPORTS:
+        frappe.throw(_("Unknown report: {0}").format(report), ValidationError)
+    if isinstance(filters, str):
+        filters = json.loads(filters) if filters.strip() else {}
+    filters = filters or {}
+
+    unknown = [key for key in filters if key not in REPORTS[report]]
+    if unknown:
+        frappe.throw(_("Unknown {0} filters: {1}").format(report, ", ".join(unknown)), ValidationError)
+
+    cleaned = {}
+    for key, value in filters.items():
+        if value in (None, ""):
+            continue
+        cleaned[key] = str(getdate(value)) if key in _DATE_FILTERS else value
+    return cleaned
+
+
+def get_job_id(report, filters):
+    """Identical (report, filters) requests map to the same job id."""
+    payload = json.dumps([report, filters], sort_keys=True, separators=(",", ":"))
+    return f"{report}-{hashlib.sha1(payload.encode()).hexdigest()[:16]}"
+
+
+def _write(report, filters, target, progress):
+    if report == "loan_history":
+        return loan_export.write_loans_csv(target, progress=progress, **filters)
+    return loan_export.write_circulation_csv(target, overdue=report == "overdue_loans", progress=progress)
+
+
+def _save(status):
+    cache = frappe.cache()
+    cache.set(cache.make_key(_key(status["job_id"])), json.dumps(status, default=str), ex=STATUS_TTL)
+
+
+def _key(job_id):
+    return f"{KEY_PREFIX}:{job_id}"
+
+
+def _queue_job_id(job_id):
+    return f"report_job::{job_id}"
+
+
+def _register_file(file_name, path):
+    """Insert the File row for an export already on disk.
+
+    File.insert would run the upload pipeline, which reads the whole export
+    into memory, rejects it above max_file_size and writes a second copy, so
+    the row is written directly; the content is hashed in chunks instead.
+    """
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "file_url": f"/private/files/{file_name}",
+        "is_private": 1,
+        "folder": "Home",
+        "file_type": "CSV",
+        "file_size": os.path.getsize(path),
+        "content_hash": _md5(path),
+    })
+    file_doc.set_new_name()
+    file_doc.db_insert()
+    return file_doc
+
+
+def _md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,6 +1,7 @@
 # file: library_management/tests/test_library.py
 
 import frappe
+import json
 import unittest
 from unittest.mock import patch
 from frappe.exceptions import ValidationError, PermissionError
@@ -28,6 +29,15 @@ class TestLibrarySystem(unittest.TestCase):
     def tearDown(self):
         frappe.db.rollback()
 
+    def _other_member(self):
+        return frappe.get_doc({
+            "doctype": "Member",
+            "fullname": "Other Member",
+            "membership_id": "TM002",
+            "email": "other@example.com",
+            "phone": "123456789"
+        }).insert(ignore_permissions=True)
+
     def test_create_loan_success(self):
         loan = frappe.get_doc({
             "doctype": "Loan",
@@ -158,9 +168,1015 @@ class TestLibrarySystem(unittest.TestCase):
             "return_date": "2025-06-05"
         }).insert(ignore_permissions=True)
 
-        from library_management.overdue_notification import send_overdue_notification
-        send_overdue_notification()
+        from library_management.overdue_notification import send_overdue_notifications
+        # The job commits per batch; keep everything inside the test transaction.
+        with patch.object(frappe.db, "commit"):
+            send_overdue_notifications(now=True)
 
         self.assertTrue(mock_sendmail.called)
-        args, kwargs = mock_sendmail.call_args
-        self.assertIn("test@example.com", kwargs["recipients"])
+        self.assertIn("test@example.com", mock_sendmail.call_args.kwargs["recipients"])
+        self.assertEqual(frappe.db.get_value("Loan", loan.name, "notified_overdue"), 1)
+
+    @patch("frappe.sendmail")
+    def test_overdue_notification_sends_one_digest_per_member(self, mock_sendmail):
+        from library_management.overdue_notification import send_overdue_notifications
+
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Second Overdue Book",
+            "author": "Test Author",
+            "isbn": "1234567892",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+        for book in (self.book.name, other.name):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": book,
+                "member": self.member.name,
+                "loan_date": "2025-06-01",
+                "return_date": "2025-06-05"
+            }).insert(ignore_permissions=True)
+
+        with patch.object(frappe.db, "commit"):
+            send_overdue_notifications(now=True)
+        member_calls = [c for c in mock_sendmail.call_args_list if "test@example.com" in c.kwargs["recipients"]]
+        self.assertEqual(len(member_calls), 1)
+        self.assertIn("Second Overdue Book", member_calls[0].kwargs["message"])
+
+        # Already flagged, so a second run sends nothing more.
+        with patch.object(frappe.db, "commit"):
+            send_overdue_notifications(now=True)
+        self.assertEqual(len([c for c in mock_sendmail.call_args_list if "test@example.com" in c.kwargs["recipients"]]), 1)
+
+    def test_catalog_keyset_pagination(self):
+        from library_management.api.book_api import get_catalog
+
+        for i in range(3):
+            frappe.get_doc({
+                "doctype": "Book",
+                "title": f"Catalog Book {i}",
+                "author": "Catalog Author",
+                "isbn": f"978000000000{i}",
+                "publish_date": "2022-01-01"
+            }).insert(ignore_permissions=True)
+
+        seen = []
+        cursor = None
+        while True:
+            page = get_catalog(cursor=cursor, page_length=2, author="Catalog Author",
+                               fields=["title"], sort_by="title")
+            seen.extend(row.title for row in page["data"])
+            self.assertNotIn("isbn", page["data"][0])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, ["Catalog Book 0", "Catalog Book 1", "Catalog Book 2"])
+
+    def test_catalog_isbn_prefix_filter(self):
+        from library_management.api.book_api import get_catalog
+
+        page = get_catalog(isbn_prefix="123456")
+        self.assertIn(self.book.name, [row.name for row in page["data"]])
+
+    def test_book_search_index_follows_book_writes(self):
+        from library_management import book_search
+
+        self.assertIn(self.book.name, [b.name for b in book_search.autocomplete("Test Bo")])
+
+        self.book.title = "Renamed Volume"
+        self.book.save()
+        self.assertIn(self.book.name, [b.name for b in book_search.autocomplete("Renamed")])
+        self.assertNotIn(self.book.name, [b.name for b in book_search.autocomplete("Test Bo")])
+
+        frappe.delete_doc("Book", self.book.name)
+        self.assertEqual(book_search.autocomplete("Renamed"), [])
+
+    def test_book_search_drops_words_fulltext_does_not_index(self):
+        from library_management import book_search
+
+        # Required stopwords and short words would match nothing in boolean mode
+        self.assertEqual(book_search._tokens("The Last House of Us"), ["last", "house"])
+        self.assertEqual(book_search.search("the of"), [])
+
+    def test_isbn_lookup_matches_isbn10_and_isbn13(self):
+        from library_management import book_search
+
+        book = frappe.get_doc({
+            "doctype": "Book",
+            "title": "ISBN Book",
+            "author": "Test Author",
+            "isbn": "0-306-40615-2",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+
+        self.assertEqual([b.name for b in book_search.find_by_isbn("978-0306406157")], [book.name])
+        self.assertEqual([b.name for b in book_search.find_by_isbn("0306406152")], [book.name])
+
+    def test_book_availability_follows_loan_writes(self):
+        from library_management import availability
+        from frappe.utils import add_days, nowdate
+
+        today = nowdate()
+        # A loan booked for next week leaves the book free today
+        later = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(today, 7),
+            "return_date": add_days(today, 10)
+        }).insert(ignore_permissions=True)
+        self.assertIsNone(frappe.db.get_value("Book", self.book.name, "current_loan"))
+        self.assertIsNone(availability.get_active_loan(self.book.name))
+        self.assertEqual(availability.get_active_loan(self.book.name, on_date=add_days(today, 8)).current_loan, later.name)
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(today, -2),
+            "return_date": add_days(today, 4)
+        }).insert(ignore_permissions=True)
+
+        state = frappe.db.get_value("Book", self.book.name, ["current_loan", "current_member", "due_date"], as_dict=True)
+        self.assertEqual(state.current_loan, loan.name)
+        self.assertEqual(state.current_member, self.member.name)
+        self.assertEqual(str(state.due_date), add_days(today, 4))
+
+        frappe.delete_doc("Loan", loan.name)
+        self.assertIsNone(frappe.db.get_value("Book", self.book.name, "current_loan"))
+
+        # Once next week's loan starts, the daily refresh picks it up
+        frappe.db.set_value("Loan", later.name, "loan_date", today)
+        with patch.object(frappe.db, "commit"):
+            availability.refresh_lapsed_availability()
+        self.assertEqual(frappe.db.get_value("Book", self.book.name, "current_loan"), later.name)
+
+    def test_bulk_checkout_reports_per_item_results(self):
+        from library_management.api.loan_api import create_loans
+        from frappe.utils import add_days, nowdate
+
+        today = nowdate()
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Second Book",
+            "author": "Test Author",
+            "isbn": "1234567891",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+
+        result = create_loans(json.dumps([
+            {"book": self.book.name, "member": self.member.name, "loan_date": today, "return_date": add_days(today, 6)},
+            {"book": self.book.name, "member": self.member.name, "loan_date": add_days(today, 1), "return_date": add_days(today, 7)},
+            {"book": other.name, "member": self.member.name, "loan_date": today, "return_date": add_days(today, 6)},
+            {"book": "missing-book", "member": self.member.name, "loan_date": today, "return_date": add_days(today, 6)},
+            {"book": other.name, "member": self.member.name, "loan_date": "2025-07-32", "return_date": add_days(today, 6)},
+        ]))
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(
+            [r["status"] for r in result["results"]], ["created", "failed", "created", "failed", "failed"]
+        )
+        self.assertEqual(frappe.db.get_value("Book", other.name, "current_loan"), result["results"][2]["loan"])
+
+    def test_checked_in_book_can_be_loaned_again_the_same_day(self):
+        from library_management.api.loan_api import create_loans, return_loans
+        from frappe.utils import add_days, nowdate
+
+        today = nowdate()
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(today, -3),
+            "return_date": add_days(today, 7)
+        }).insert(ignore_permissions=True)
+
+        result = return_loans(json.dumps([{"loan": loan.name}]))
+        self.assertEqual(result["returned"], 1)
+        self.assertEqual(str(frappe.db.get_value("Loan", loan.name, "return_date")), add_days(today, -1))
+        # Free again today, so the next reservation could be promoted right away
+        self.assertIsNone(frappe.db.get_value("Book", self.book.name, "current_loan"))
+
+        result = create_loans(json.dumps([
+            {"book": self.book.name, "member": self.member.name, "loan_date": today, "return_date": add_days(today, 7)},
+        ]))
+        self.assertEqual([r["status"] for r in result["results"]], ["created"])
+
+    def test_book_import_dedupes_and_resumes(self):
+        import os
+        import tempfile
+        from library_management.book_import import import_books
+
+        rows = [
+            "title,author,isbn,publish_date",
+            "Imported One,Author A,978-0-306-40615-7,2020-01-01",
+            "Imported Dup,Author A,0306406152,2020-01-01",
+            "Bad ISBN,Author B,12345,2020-01-01",
+            "Imported Two,Author C,9780804429573,2021-05-05",
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("\n".join(rows) + "\n")
+        self.addCleanup(os.remove, f.name)
+        self.addCleanup(lambda: os.path.exists(f.name + ".errors.csv") and os.remove(f.name + ".errors.csv"))
+
+        # The import commits per batch, so undo its rows (and this test's
+        # fixtures, committed along with them) explicitly.
+        def cleanup():
+            for name in frappe.get_all("Book", {"isbn": ["in", ["9780306406157", "9780804429573"]]}, pluck="name"):
+                frappe.delete_doc("Book", name, force=True)
+            frappe.delete_doc("Book", self.book.name, force=True)
+            frappe.delete_doc("Member", self.member.name, force=True)
+            frappe.db.commit()
+        self.addCleanup(cleanup)
+
+        status = import_books(f.name, batch_size=2, restart=True)
+
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual((status["inserted"], status["duplicates"], status["errors"]), (2, 1, 1))
+        self.assertTrue(frappe.db.exists("Book", {"isbn": "9780306406157"}))
+
+        # A second run of the same file is a no-op resume.
+        self.assertEqual(import_books(f.name)["inserted"], 2)
+
+    def test_loan_export_quotes_fields(self):
+        import csv
+        import io
+        from library_management.loan_export import write_loans_csv
+
+        self.book.title = 'Eats, Shoots "and" Leaves'
+        self.book.save()
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": "2025-07-14",
+            "return_date": "2025-07-20"
+        }).insert(ignore_permissions=True)
+
+        out = io.StringIO()
+        self.assertEqual(write_loans_csv(out, member=self.member.name), 1)
+
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(rows[0], ["Loan ID", "Book Title", "Loan Date", "Return Date"])
+        self.assertEqual(rows[1][1], 'Eats, Shoots "and" Leaves')
+
+    def test_principal_is_resolved_once_per_request(self):
+        from library_management.principal import get_principal, invalidate
+        from library_management.library_management.doctype.loan.loan import get_permission_query_conditions
+
+        invalidate(self.member.email)
+        real_sql = frappe.db.sql
+        queries = []
+
+        def counting_sql(*args, **kwargs):
+            queries.append(args[0])
+            return real_sql(*args, **kwargs)
+
+        with patch.object(frappe.db, "sql", counting_sql):
+            first = get_principal(self.member.email)
+            cold = len(queries)
+            for _ in range(5):
+                get_permission_query_conditions(self.member.email)
+                get_principal(self.member.email)
+
+        self.assertEqual(first.member, self.member.name)
+        self.assertGreater(cold, 0)
+        self.assertEqual(len(queries), cold)
+
+        # Member writes drop the cached entry.
+        self.member.phone = "987654321"
+        self.member.save()
+        frappe.local.library_principals = {}
+        with patch.object(frappe.db, "sql", counting_sql):
+            get_principal(self.member.email)
+        self.assertGreater(len(queries), cold)
+
+    def test_report_cache_hits_and_invalidates_on_loan_write(self):
+        from library_management import report_cache
+        from library_management.api.report_api import get_current_loans
+        from frappe.utils import add_days, nowdate
+
+        report_cache.invalidate()
+        before = report_cache.get_stats()[report_cache.CURRENT_LOANS]
+
+        get_current_loans()
+        get_current_loans()
+        after = report_cache.get_stats()[report_cache.CURRENT_LOANS]
+        self.assertEqual(after["miss"] - before["miss"], 1)
+        self.assertEqual(after["hit"] - before["hit"], 1)
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+        self.assertIn(loan.name, [row.loan_id for row in get_current_loans()])
+
+    def test_dashboard_summary_counts(self):
+        from library_management import report_cache
+        from library_management.api.dashboard_api import get_dashboard_summary
+        from library_management.api.loan_api import return_loans
+        from frappe.utils import add_days, nowdate
+
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Overdue Book",
+            "author": "Test Author",
+            "isbn": "1234567894",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+        report_cache.invalidate()
+        before = get_dashboard_summary(due_within_days=3)
+
+        overdue = frappe.get_doc({
+            "doctype": "Loan",
+            "book": other.name,
+            "member": self.member.name,
+            "loan_date": add_days(nowdate(), -10),
+            "return_date": add_days(nowdate(), -5)
+        }).insert(ignore_permissions=True)
+        for start, end in ((0, 2), (10, 12)):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": self.book.name,
+                "member": self.member.name,
+                "loan_date": add_days(nowdate(), start),
+                "return_date": add_days(nowdate(), end)
+            }).insert(ignore_permissions=True)
+        frappe.get_doc({
+            "doctype": "Reservation",
+            "book": self.book.name,
+            "member": self._other_member().name,
+            "reservation_date": nowdate()
+        }).insert(ignore_permissions=True)
+
+        after = get_dashboard_summary(due_within_days=3)
+        # The loan booked for later is not active yet
+        self.assertEqual(after.active_loans - before.active_loans, 1)
+        self.assertEqual(after.due_soon - before.due_soon, 1)
+        # Counted like the overdue loans report: past due and not returned
+        self.assertEqual(after.overdue_loans - before.overdue_loans, 1)
+        self.assertEqual(after.open_reservations - before.open_reservations, 1)
+
+        return_loans(json.dumps([{"loan": overdue.name}]))
+        self.assertEqual(get_dashboard_summary(due_within_days=3).overdue_loans, before.overdue_loans)
+
+    def test_waitlist_positions_and_promotion(self):
+        from library_management import waitlist
+        from frappe.utils import add_days, nowdate
+
+        members = [self.member] + [frappe.get_doc({
+            "doctype": "Member",
+            "fullname": f"Waitlist Member {i}",
+            "membership_id": f"WL00{i}",
+            "email": f"waitlist{i}@example.com",
+            "phone": "123456789"
+        }).insert(ignore_permissions=True) for i in range(3)]
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": members[0].name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+
+        # The borrower cannot queue for their own loan
+        with self.assertRaises(ValidationError):
+            frappe.get_doc({
+                "doctype": "Reservation",
+                "book": self.book.name,
+                "member": members[0].name,
+                "reservation_date": nowdate()
+            }).insert(ignore_permissions=True)
+
+        queue = [frappe.get_doc({
+            "doctype": "Reservation",
+            "book": self.book.name,
+            "member": m.name,
+            "reservation_date": nowdate()
+        }).insert(ignore_permissions=True) for m in members[1:]]
+        self.assertEqual([waitlist.get_position(r.name) for r in queue], [1, 2, 3])
+
+        # Cancelling the middle entry closes the gap without renumbering
+        frappe.delete_doc("Reservation", queue[1].name)
+        self.assertEqual(waitlist.get_position(queue[2].name), 2)
+        self.assertEqual(frappe.db.get_value("Reservation", queue[2].name, "queue_seq"), queue[2].queue_seq)
+
+        # Ending the loan hands the book to the head of the queue
+        frappe.delete_doc("Loan", loan.name)
+        self.assertEqual(frappe.db.get_value("Reservation", queue[0].name, "status"), waitlist.READY)
+        self.assertEqual(waitlist.get_position(queue[2].name), 1)
+
+        with self.assertRaises(ValidationError):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": self.book.name,
+                "member": members[3].name,
+                "loan_date": nowdate(),
+                "return_date": add_days(nowdate(), 7)
+            }).insert(ignore_permissions=True)
+
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": members[1].name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+        self.assertEqual(frappe.db.get_value("Reservation", queue[0].name, "status"), waitlist.FULFILLED)
+
+    def test_lapsed_loan_promotion_catches_up_on_missed_days(self):
+        from library_management import waitlist
+        from frappe.utils import add_days, nowdate
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+        reservation = frappe.get_doc({
+            "doctype": "Reservation",
+            "book": self.book.name,
+            "member": self._other_member().name,
+            "reservation_date": nowdate()
+        }).insert(ignore_permissions=True)
+
+        # The loan ran out three days ago and the daily job has not run since
+        ended = add_days(nowdate(), -3)
+        frappe.db.set_value("Loan", loan.name, {"loan_date": add_days(ended, -7), "return_date": ended})
+        frappe.db.set_value("Book", self.book.name, "due_date", ended)
+
+        with patch.object(frappe.db, "commit"):
+            waitlist.promote_lapsed_loans()
+        self.assertEqual(frappe.db.get_value("Reservation", reservation.name, "status"), waitlist.READY)
+
+    def test_moved_reservations_requeue_and_ready_holds_expire(self):
+        from library_management import waitlist
+        from library_management.api.reservation_api import update_reservation
+        from frappe.utils import add_days, nowdate
+
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Other Book",
+            "author": "Test Author",
+            "isbn": "1234567895",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+        members = [self._other_member()] + [frappe.get_doc({
+            "doctype": "Member",
+            "fullname": f"Hold Member {i}",
+            "membership_id": f"HM00{i}",
+            "email": f"hold{i}@example.com",
+            "phone": "123456789"
+        }).insert(ignore_permissions=True) for i in range(2)]
+
+        loans = [frappe.get_doc({
+            "doctype": "Loan",
+            "book": book.name,
+            "member": self.member.name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True) for book in (self.book, other)]
+        queue = [frappe.get_doc({
+            "doctype": "Reservation",
+            "book": self.book.name,
+            "member": m.name,
+            "reservation_date": nowdate()
+        }).insert(ignore_permissions=True) for m in members]
+
+        # Moving a reservation puts it at the back of the other book's queue
+        update_reservation(queue[2].name, {"book": other.name})
+        self.assertEqual(frappe.db.get_value("Reservation", queue[2].name, "queue_seq"),
+                         frappe.db.get_value("Book", other.name, "waitlist_seq"))
+        self.assertEqual(waitlist.get_position(queue[2].name), 1)
+
+        frappe.delete_doc("Loan", loans[0].name)
+        self.assertEqual(frappe.db.get_value("Reservation", queue[0].name, "status"), waitlist.READY)
+
+        # An uncollected hold expires and the book goes to the next in line
+        frappe.db.set_value("Reservation", queue[0].name, "ready_date", add_days(nowdate(), -waitlist.hold_days() - 1))
+        with patch.object(frappe.db, "commit"):
+            waitlist.expire_ready_holds()
+        self.assertEqual(frappe.db.get_value("Reservation", queue[0].name, "status"), waitlist.EXPIRED)
+        self.assertEqual(frappe.db.get_value("Reservation", queue[1].name, "status"), waitlist.READY)
+
+    def test_loan_list_pages_with_filters(self):
+        from library_management.api.loan_api import get_loans
+        from frappe.utils import getdate
+
+        for i in range(3):
+            book = frappe.get_doc({
+                "doctype": "Book",
+                "title": f"List Book {i}",
+                "author": "List Author",
+                "isbn": f"97800000000{i}",
+                "publish_date": "2022-01-01"
+            }).insert(ignore_permissions=True)
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": book.name,
+                "member": self.member.name,
+                "loan_date": f"2025-07-0{i + 1}",
+                "return_date": f"2025-07-1{i + 1}"
+            }).insert(ignore_permissions=True)
+
+        filters = json.dumps({"member": self.member.name, "overdue": 1})
+        first = get_loans(page_length=2, sort_by="loan_date", sort_order="asc", filters=filters)
+        self.assertEqual(first["total"], 3)
+        self.assertFalse(first["total_is_estimate"])
+        self.assertEqual([row.loan_date for row in first["data"]], [getdate("2025-07-01"), getdate("2025-07-02")])
+        self.assertEqual(first["data"][0].book_title, "List Book 0")
+
+        second = get_loans(cursor=first["next_cursor"], page_length=2, sort_by="loan_date",
+                           sort_order="asc", filters=filters)
+        self.assertEqual(len(second["data"]), 1)
+        self.assertIsNone(second["next_cursor"])
+        self.assertIsNone(second["total"])
+
+        with self.assertRaises(ValidationError):
+            get_loans(sort_by="member")
+
+    def test_loan_archive_moves_old_loans_and_keeps_history(self):
+        from library_management import loan_archive
+        from library_management.api.report_api import get_member_loans
+        from library_management.loan_export import write_loans_csv
+        from frappe.utils import add_days, add_months, nowdate
+        import io
+
+        old = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_months(nowdate(), -40),
+            "return_date": add_days(add_months(nowdate(), -40), 14)
+        }).insert(ignore_permissions=True)
+        # The newer loan stays the book's current loan, so only `old` is archivable
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(nowdate(), -3),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+
+        with patch.object(frappe.db, "commit"):
+            dry = loan_archive.archive_loans(months=24, dry_run=True)
+            self.assertGreaterEqual(dry["candidates"], 1)
+            self.assertTrue(frappe.db.exists("Loan", old.name))
+
+            result = loan_archive.archive_loans(months=24)
+
+        self.assertGreaterEqual(result["archived"], 1)
+        self.assertTrue(result["verified"])
+        self.assertEqual(result["copied"], result["archived"])
+        self.assertEqual(result["deleted"], result["archived"])
+        self.assertFalse(frappe.db.exists("Loan", old.name))
+        self.assertEqual(frappe.db.get_value("Book", self.book.name, "current_member"), self.member.name)
+
+        frappe.set_user(self.member.email)
+        try:
+            history = get_member_loans(self.member.email)
+        finally:
+            frappe.set_user("Administrator")
+        self.assertIn(old.name, [row.loan_id for row in history])
+
+        out = io.StringIO()
+        write_loans_csv(out, member=self.member.name)
+        self.assertIn(old.name, out.getvalue())
+
+    def test_api_benchmark_covers_every_whitelisted_method(self):
+        from library_management.benchmarks import api_load
+
+        methods = set(api_load.whitelisted_methods())
+        self.assertIn("loan_api.get_loans", methods)
+        self.assertEqual(methods - set(api_load.SCENARIOS) - set(api_load.SKIPPED), set())
+        self.assertEqual(set(api_load.SCENARIOS) - methods, set())
+
+    def test_metrics_record_validate_calls_in_prometheus_format(self):
+        from library_management import metrics
+        from frappe.utils import add_days, nowdate
+
+        metrics.reset()
+        with patch.dict(frappe.conf, {"library_metrics_enabled": 1}):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": self.book.name,
+                "member": self.member.name,
+                "loan_date": nowdate(),
+                "return_date": add_days(nowdate(), 7)
+            }).insert(ignore_permissions=True)
+            with self.assertRaises(ValidationError):
+                frappe.get_doc({
+                    "doctype": "Loan",
+                    "book": self.book.name,
+                    "member": self.member.name,
+                    "loan_date": nowdate(),
+                    "return_date": add_days(nowdate(), 7)
+                }).insert(ignore_permissions=True)
+
+        entry = metrics.collect()[(metrics.VALIDATE, "Loan.validate")]
+        self.assertEqual(entry["count"], 2)
+        self.assertGreater(entry["queries"], 0)
+        self.assertEqual(sum(entry["errors"].values()), 1)
+
+        text = metrics.render()
+        self.assertIn('library_call_duration_seconds_count{kind="validate",name="Loan.validate"} 2', text)
+        self.assertIn('library_call_duration_seconds_bucket{kind="validate",name="Loan.validate",le="+Inf"} 2', text)
+        self.assertIn('library_call_errors_total{kind="validate",name="Loan.validate",exception=', text)
+        metrics.reset()
+
+    def test_report_job_deduplicates_and_writes_file(self):
+        import os
+        from library_management import report_jobs
+        from frappe.utils import add_days, nowdate
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+
+        with patch.object(frappe, "enqueue") as enqueue, \
+                patch("library_management.report_jobs.is_job_enqueued", return_value=True):
+            first = report_jobs.submit("loan_history", {"member": self.member.name, "to_date": ""})
+            second = report_jobs.submit("loan_history", json.dumps({"member": self.member.name}))
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertEqual(enqueue.call_count, 1)
+
+        with patch.object(frappe.db, "commit"):
+            report_jobs.run(first["job_id"])
+        status = report_jobs.get_status(first["job_id"])
+        self.assertEqual(status["status"], report_jobs.COMPLETED)
+        self.assertEqual(status["rows"], 1)
+
+        path = report_jobs.get_file_path(first["job_id"])
+        # The export itself is registered, not a copy made by the upload pipeline
+        self.assertEqual(frappe.db.get_value("File", status["file"], "file_url"), status["file_url"])
+        self.assertEqual(frappe.db.get_value("File", status["file"], "content_hash"), report_jobs._md5(path))
+        try:
+            with open(path) as f:
+                self.assertIn(loan.name, f.read())
+        finally:
+            os.remove(path)
+        frappe.cache().delete(frappe.cache().make_key(f"{report_jobs.KEY_PREFIX}:{first['job_id']}"))
+
+        with self.assertRaises(ValidationError):
+            report_jobs.submit("loan_history", {"book": self.book.name})
+
+    def test_member_search_matches_name_id_email_and_phone(self):
+        from library_management.api.member_api import search_members
+
+        for query in ("test mem", "memb", "tm00", "TM001", " TEST@example.com", "123-456-789"):
+            self.assertIn(self.member.name, [m.name for m in search_members(query)], query)
+        self.assertEqual(search_members("TM001")[0].name, self.member.name)
+        self.assertNotIn(self.member.name, [m.name for m in search_members("test@example")])
+
+        self.member.fullname = "Renamed Person"
+        self.member.save()
+        self.assertNotIn(self.member.name, [m.name for m in search_members("test mem")])
+        self.assertIn(self.member.name, [m.name for m in search_members("person")])
+
+        frappe.delete_doc("Member", self.member.name, ignore_permissions=True, force=True)
+        self.assertEqual(search_members("TM001"), [])
+
+    def test_availability_calendar_and_future_dated_loans(self):
+        from library_management.api.book_api import get_availability_calendar
+        from frappe.utils import add_days, getdate, nowdate
+
+        today = getdate(nowdate())
+        # A loan booked for next week leaves this week free...
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(today, 7),
+            "return_date": add_days(today, 13)
+        }).insert(ignore_permissions=True)
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": today,
+            "return_date": add_days(today, 6)
+        }).insert(ignore_permissions=True)
+
+        # ...but not a period overlapping it.
+        with self.assertRaises(ValidationError):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": self.book.name,
+                "member": self.member.name,
+                "loan_date": add_days(today, 13),
+                "return_date": add_days(today, 20)
+            }).insert(ignore_permissions=True)
+
+        calendar = get_availability_calendar(json.dumps([self.book.name]), today, add_days(today, 29))
+        entry = calendar["books"][self.book.name]
+        self.assertEqual(entry["busy"], [
+            (today, getdate(add_days(today, 6))),
+            (getdate(add_days(today, 7)), getdate(add_days(today, 13))),
+        ])
+        self.assertEqual(entry["free"], [(getdate(add_days(today, 14)), getdate(add_days(today, 29)))])
+
+    def test_book_calendar_overlap_tolerates_inverted_legacy_loans(self):
+        from library_management.loan_calendar import BookCalendar
+
+        calendar = BookCalendar([
+            frappe._dict(name=name, loan_date=f"2025-01-{start:02d}", return_date=f"2025-01-{end:02d}")
+            for name, start, end in (("a", 1, 2), ("b", 6, 1), ("c", 5, 9), ("d", 1, 5))
+        ])
+        # Merged into one period, but no single loan spans this (inverted) range
+        self.assertIsNone(calendar.overlap("2025-01-07", "2025-01-04"))
+        self.assertEqual(calendar.overlap("2025-01-08", "2025-01-09").name, "c")
+
+    def test_rate_limit_rejects_when_bucket_is_empty(self):
+        from frappe.exceptions import TooManyRequestsError
+        from library_management import rate_limit
+
+        ip = f"test-{frappe.generate_hash(length=8)}"
+        limits = {"library_rate_limits": {"book_api.get_books": {"ip": [2, 0.001], "guest": None}}}
+        before = rate_limit.get_rejections().get(("book_api.get_books", "ip"), 0)
+
+        with patch.dict(frappe.conf, limits):
+            self.assertEqual(rate_limit.get_limits("book_api.get_books"), {"ip": (2, 0.001)})
+            rate_limit.check("book_api.get_books", ip=ip, user="Guest")
+            rate_limit.check("book_api.get_books", ip=ip, user="Guest")
+            with self.assertRaises(TooManyRequestsError):
+                rate_limit.check("book_api.get_books", ip=ip, user="Guest")
+            # Other clients have their own bucket
+            rate_limit.check("book_api.get_books", ip=f"{ip}-other", user="Guest")
+
+        self.assertGreater(frappe.local.library_retry_after, 0)
+        self.assertEqual(rate_limit.get_rejections()[("book_api.get_books", "ip")], before + 1)
+        frappe.local.library_retry_after = None
+
+    def test_analytics_rollups_follow_loan_writes(self):
+        from library_management import analytics
+        from frappe.utils import add_days, get_first_day, getdate, nowdate
+
+        today = getdate(nowdate())
+        month = get_first_day(today)
+
+        def rollups():
+            return {
+                (dimension, key): (loans, loan_days)
+                for dimension, key, loans, loan_days in frappe.db.sql(f"""
+                    SELECT `dimension`, `key`, `loans`, `loan_days`
+                    FROM `{analytics.ROLLUP_TABLE}`
+                    WHERE `period` = %s
+                """, (month,))
+            }
+
+        before = rollups()
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": today,
+            "return_date": add_days(today, 6)
+        }).insert(ignore_permissions=True)
+        after = rollups()
+        self.assertEqual(after[(analytics.BOOK, self.book.name)], (1, 7))
+        self.assertEqual(after[(analytics.MEMBER, self.member.name)], (1, 7))
+        self.assertEqual(after[(analytics.MEMBERS, "")][0], before.get((analytics.MEMBERS, ""), (0, 0))[0] + 1)
+
+        loan.return_date = add_days(today, 2)
+        loan.save()
+        self.assertEqual(rollups()[(analytics.AUTHOR, "Test Author")][1] - before.get((analytics.AUTHOR, "Test Author"), (0, 0))[1], 3)
+
+        # The nightly reconcile recomputes the same numbers from the loan tables.
+        incremental = rollups()
+        with patch.object(frappe.db, "commit"):
+            analytics.reconcile(months=1)
+        self.assertEqual(rollups(), incremental)
+
+        frappe.delete_doc("Loan", loan.name, ignore_permissions=True)
+        self.assertEqual(rollups(), before)
+
+    def test_loan_claims_reject_an_overlap_the_checks_missed(self):
+        from frappe.utils import add_days, nowdate
+        from library_management import loan_claims
+
+        today = nowdate()
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": today,
+            "return_date": add_days(today, 6)
+        }).insert(ignore_permissions=True)
+        claimed = frappe.db.sql(f"SELECT COUNT(*) FROM `{loan_claims.CLAIM_TABLE}` WHERE `loan` = %s", loan.name)
+        self.assertEqual(claimed[0][0], 7)
+
+        # As if a concurrent checkout had run its overlap query before this loan existed
+        with patch("library_management.library_management.doctype.loan.loan.find_overlap", return_value=None):
+            with self.assertRaises(ValidationError):
+                frappe.get_doc({
+                    "doctype": "Loan",
+                    "book": self.book.name,
+                    "member": self.member.name,
+                    "loan_date": add_days(today, 5),
+                    "return_date": add_days(today, 9)
+                }).insert(ignore_permissions=True)
+
+        # Shortening the loan frees the later days for the next checkout
+        loan.return_date = add_days(today, 2)
+        loan.save()
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": add_days(today, 5),
+            "return_date": add_days(today, 9)
+        }).insert(ignore_permissions=True)
+
+        frappe.delete_doc("Loan", loan.name, ignore_permissions=True)
+        self.assertFalse(frappe.db.sql(f"SELECT 1 FROM `{loan_claims.CLAIM_TABLE}` WHERE `loan` = %s", loan.name))
+
+    def test_batch_checkout_claims_in_one_pass_and_bounds_loan_length(self):
+        from frappe.utils import add_days, nowdate
+        from library_management import loan_claims
+        from library_management.api.loan_api import create_loans
+
+        today = nowdate()
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Claimed Book",
+            "author": "Test Author",
+            "isbn": "1234567893",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+        # Holds a day of `other` without a loan row, as a concurrent checkout would
+        frappe.db.sql(f"INSERT INTO `{loan_claims.CLAIM_TABLE}` VALUES (%s, %s, 'elsewhere')", (other.name, today))
+
+        result = create_loans(json.dumps([
+            {"book": self.book.name, "member": self.member.name, "loan_date": today, "return_date": add_days(today, 3)},
+            {"book": other.name, "member": self.member.name, "loan_date": today, "return_date": add_days(today, 3)},
+        ]))
+        self.assertEqual([r["status"] for r in result["results"]], ["created", "failed"])
+        claimed = frappe.db.sql(f"SELECT `book`, COUNT(*) FROM `{loan_claims.CLAIM_TABLE}` "
+                                "WHERE `book` IN %s GROUP BY `book`", ((self.book.name, other.name),))
+        self.assertEqual(dict(claimed), {self.book.name: 4, other.name: 1})
+
+        with self.assertRaises(ValidationError):
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": other.name,
+                "member": self.member.name,
+                "loan_date": add_days(today, 30),
+                "return_date": "2099-12-31"
+            }).insert(ignore_permissions=True)
+
+    def test_change_feed_returns_changes_and_deletes_since_token(self):
+        from library_management.api import sync_api
+
+        def sync(token=None):
+            data, deleted = {}, []
+            while True:
+                page = sync_api.get_changes("Book", sync_token=token, page_length=2000)
+                data.update({row.name: row for row in page["data"]})
+                deleted += page["deleted"]
+                token = page["sync_token"]
+                if not page["has_more"]:
+                    return data, deleted, token
+
+        books, deleted, token = sync()
+        self.assertIn(self.book.name, books)
+        self.assertEqual(deleted, [])
+
+        other = frappe.get_doc({
+            "doctype": "Book",
+            "title": "Other Book",
+            "author": "Other Author",
+            "isbn": "0987654321",
+            "publish_date": "2022-01-01"
+        }).insert(ignore_permissions=True)
+        frappe.delete_doc("Book", other.name, ignore_permissions=True)
+        self.book.title = "Renamed Test Book"
+        self.book.save()
+
+        changes, deleted, token = sync(token)
+        self.assertEqual(changes[self.book.name].title, "Renamed Test Book")
+        self.assertNotIn(other.name, changes)
+        self.assertEqual(deleted, [other.name])
+
+        with self.assertRaises(ValidationError):
+            sync_api.get_changes("Loan", sync_token=token)
+
+    def test_change_feed_drops_loans_moved_to_another_member(self):
+        from library_management import change_feed
+        from frappe.utils import add_days, nowdate
+
+        loan = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 7)
+        }).insert(ignore_permissions=True)
+        mine = change_feed.get_changes("Loan", ["book"], member=self.member.name, page_length=2000)
+        everyone = change_feed.get_changes("Loan", ["book"], page_length=2000)
+        self.assertIn(loan.name, [row.name for row in mine["data"]])
+
+        loan.member = self._other_member().name
+        loan.save()
+
+        mine = change_feed.get_changes("Loan", ["book"], mine["sync_token"], page_length=2000, member=self.member.name)
+        self.assertEqual(mine["deleted"], [loan.name])
+        everyone = change_feed.get_changes("Loan", ["book"], everyone["sync_token"], page_length=2000)
+        self.assertIn(loan.name, [row.name for row in everyone["data"]])
+        self.assertEqual(everyone["deleted"], [])
+
+    def test_batch_getters_return_slim_records_in_order(self):
+        from library_management.api import loan_api
+
+        loans = [
+            frappe.get_doc({
+                "doctype": "Loan",
+                "book": self.book.name,
+                "member": self.member.name,
+                "loan_date": f"2025-06-0{i + 1}",
+                "return_date": f"2025-06-0{i + 1}"
+            }).insert(ignore_permissions=True)
+            for i in range(3)
+        ]
+        names = [loans[2].name, "missing-loan", loans[0].name]
+
+        result = loan_api.get_loans_by_id(json.dumps(names))
+        self.assertEqual([row.name for row in result["data"]], [loans[2].name, loans[0].name])
+        self.assertEqual(result["missing"], ["missing-loan"])
+        self.assertNotIn("book_title", result["data"][0])
+        self.assertNotIn("creation", result["data"][0])
+
+        expanded = loan_api.get_loans_by_id(names, expand="book,member")["data"][0]
+        self.assertEqual(expanded.book_title, "Test Book")
+        self.assertEqual(expanded.member_fullname, "Test Member")
+
+        with self.assertRaises(ValidationError):
+            loan_api.get_loans_by_id(names, expand=["loan_date"])
+
+    def test_compact_response_encodes_list_rows_by_column(self):
+        from library_management import compact_response
+        from library_management.api import book_api, loan_api
+
+        frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.book.name,
+            "member": self.member.name,
+            "loan_date": "2025-06-01",
+            "return_date": "2025-06-05"
+        }).insert(ignore_permissions=True)
+
+        def decode(values):
+            if isinstance(values, dict):
+                return [values["dictionary"][i] for i in values["indexes"]]
+            return values
+
+        try:
+            frappe.local.form_dict = frappe._dict(response_format=compact_response.COLUMNAR)
+            response = book_api.get_books()
+            self.assertEqual(response.mimetype, compact_response.COLUMNAR_TYPE)
+            message = json.loads(response.get_data())["message"]
+            books = [dict(zip(message["columns"], row, strict=True))
+                     for row in zip(*map(decode, message["values"]), strict=True)]
+            self.assertEqual(len(books), message["length"])
+            self.assertIn(
+                {"name": self.book.name, "title": "Test Book", "author": "Test Author",
+                 "publish_date": "2022-01-01", "isbn": "1234567890"},
+                books,
+            )
+
+            # Paged lists keep their cursor and only encode `data`
+            page = json.loads(loan_api.get_loans(filters={"member": self.member.name}).get_data())["message"]
+            self.assertIn("next_cursor", page)
+            columns = dict(zip(page["data"]["columns"], map(decode, page["data"]["values"]), strict=True))
+            self.assertEqual(columns["loan_date"], ["2025-06-01"])
+
+            frappe.local.form_dict = frappe._dict()
+            self.assertIsInstance(book_api.get_books(), list)
+        finally:
+            frappe.local.form_dict = frappe._dict()
+
+
+class TestConcurrentCheckout(unittest.TestCase):
+    # Workers commit, so this runs against committed synthetic rows of its own.
+    def setUp(self):
+        frappe.set_user("Administrator")
+        frappe.db.rollback()
+
+    def test_parallel_checkouts_never_double_loan_a_book(self):
+        from library_management.benchmarks.checkout_stress import run
+
+        result = run(processes=8, books=2, attempts=15)
+        self.assertEqual(result["double_loans"], 0)
+        self.assertEqual(result["errors"], {})
+        self.assertGreater(result["created"], 0)
+        self.assertEqual(result["created"] + result["conflicts"], result["attempts"])
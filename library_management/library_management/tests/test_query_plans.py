@@ -0,0 +1,302 @@
+# file: library_management/tests/test_query_plans.py
+#
+# Runs the circulation APIs against a seeded database, records every SELECT
+# they issue against the library tables, and EXPLAINs it. A plan that falls
+# back to a full table scan (`type = ALL`) fails the test, so a dropped index
+# or a rewritten query that stops using one shows up in CI.
+
+import io
+import json
+import random
+import re
+import unittest
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import add_days, add_to_date, now_datetime, nowdate
+
+from library_management import change_feed, member_search, report_cache, waitlist
+from library_management.api import (
+    book_api,
+    dashboard_api,
+    loan_api,
+    member_api,
+    report_api,
+    reservation_api,
+    sync_api,
+)
+from library_management.availability import rebuild_availability
+from library_management.indexes import ensure_indexes
+from library_management.loan_archive import create_archive_table
+from library_management.loan_export import write_loans_csv
+from library_management.overdue_notification import send_overdue_shard
+
+PREFIX = "QP-"
+BOOKS = 1000
+MEMBERS = 300
+LOANS = 6000
+RESERVATIONS = 600
+
+LIBRARY_TABLES = re.compile(r"`(tab(Loan|Reservation|Book|Member)|__loan_archive|__member_search)`")
+
+# Endpoints that return (most of) a whole table by design. A full scan is the
+# correct plan for them; anything else in this file must use an index.
+ALLOWED_FULL_SCANS = {
+    "loan_api.get_overdue_books": "every loan past its return date, i.e. most of the loan history",
+    "report_api.get_overdue_loans": "every loan past its return date, i.e. most of the loan history",
+}
+
+
+def explain_queries(fn, *args, **kwargs):
+    """Call `fn`, then return [(query, explain_rows)] for each library-table SELECT it ran.
+
+    Validation and permission errors are swallowed: the conflict-check paths
+    we want to inspect usually end in one.
+    """
+    captured = []
+    real_sql = frappe.db.sql
+
+    def recording_sql(query, values=(), *a, **kw):
+        if isinstance(query, str) and query.lstrip().upper().startswith("SELECT") and LIBRARY_TABLES.search(query):
+            captured.append((query, values))
+        return real_sql(query, values, *a, **kw)
+
+    with patch.object(frappe.db, "sql", recording_sql):
+        try:
+            fn(*args, **kwargs)
+        except (frappe.ValidationError, frappe.PermissionError):
+            pass
+
+    return [(query, real_sql(f"EXPLAIN {query}", values, as_dict=True)) for query, values in captured]
+
+
+class TestCirculationQueryPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        frappe.set_user("Administrator")
+        ensure_indexes()
+        create_archive_table()
+        change_feed.create_tombstone_table()
+        cls._seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        for doctype in ("Reservation", "Loan", "Member", "Book"):
+            frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE `name` LIKE %s", (PREFIX + "%",))
+        frappe.db.sql(f"DELETE FROM `{member_search.SEARCH_TABLE}` WHERE `member` LIKE %s", (PREFIX + "%",))
+        frappe.db.commit()
+        frappe.set_user("Administrator")
+
+    def tearDown(self):
+        frappe.db.rollback()
+        frappe.local.form_dict = frappe._dict()
+        frappe.set_user("Administrator")
+
+    @classmethod
+    def _seed(cls):
+        rng = random.Random(7)
+        today = nowdate()
+
+        books = [f"{PREFIX}BOOK-{i:05d}" for i in range(BOOKS)]
+        members = [f"{PREFIX}MEM-{i:05d}" for i in range(MEMBERS)]
+        frappe.db.bulk_insert(
+            "Book", ["name", "title", "author", "isbn", "publish_date"],
+            [(b, f"Title {b}", f"Author {i % 50}", f"{PREFIX}{i:010d}", "2000-01-01") for i, b in enumerate(books)],
+        )
+        frappe.db.bulk_insert(
+            "Member", ["name", "fullname", "membership_id", "email", "phone"],
+            [(m, f"Member {m}", m, f"{m.lower()}@example.com", "1234567") for m in members],
+        )
+
+        # Mostly historical loans, plus a small set of active ones (about 5%).
+        loans = []
+        for i in range(LOANS):
+            if i % 20 == 0:
+                loan_date = add_days(today, -rng.randint(0, 10))
+            else:
+                loan_date = add_days(today, -rng.randint(30, 1000))
+            loans.append((f"{PREFIX}LOAN-{i:06d}", rng.choice(books), rng.choice(members),
+                          loan_date, add_days(loan_date, 14), 1))
+        frappe.db.bulk_insert("Loan", ["name", "book", "member", "loan_date", "return_date", "docstatus"], loans)
+
+        frappe.db.bulk_insert(
+            "Reservation", ["name", "book", "member", "reservation_date", "status", "queue_seq"],
+            [(f"{PREFIX}RES-{i:05d}", rng.choice(books), rng.choice(members),
+              add_days(today, -rng.randint(0, 400)), "Waiting", i + 1) for i in range(RESERVATIONS)],
+        )
+
+        # bulk_insert bypasses the Loan and Member hooks that maintain Book
+        # availability and the member search index.
+        rebuild_availability()
+        member_search.rebuild_index()
+
+        for table in ("tabBook", "tabMember", "tabLoan", "tabReservation"):
+            frappe.db.sql(f"ANALYZE TABLE `{table}`")
+        frappe.db.commit()
+
+        cls.active_loan = frappe._dict(zip(("name", "book", "member"), loans[0][:3], strict=True))
+        cls.member_email = f"{cls.active_loan.member.lower()}@example.com"
+        cls.reservation = f"{PREFIX}RES-00000"
+
+    def assertNoFullScan(self, label, fn, *args, **kwargs):
+        plans = explain_queries(fn, *args, **kwargs)
+        self.assertTrue(plans, f"{label} issued no queries against the library tables")
+
+        if label in ALLOWED_FULL_SCANS:
+            return
+
+        for query, rows in plans:
+            # <derivedN>/<unionN> rows read an already filtered temporary result, not a base table.
+            scans = [
+                row for row in rows
+                if (row.get("type") or "").upper() == "ALL" and not (row.get("table") or "").startswith("<")
+            ]
+            self.assertFalse(
+                scans,
+                f"{label} does a full table scan on {[r.get('table') for r in scans]}:\n{query}\n{rows}",
+            )
+
+    # ---------------- book_api ----------------
+
+    def test_books_by_id_plan(self):
+        self.assertNoFullScan(
+            "book_api.get_books_by_id", book_api.get_books_by_id,
+            [f"{PREFIX}BOOK-{i:05d}" for i in range(0, BOOKS, 10)],
+        )
+
+    def test_availability_calendar_plan(self):
+        books = [f"{PREFIX}BOOK-{i:05d}" for i in range(0, BOOKS, 5)]
+        self.assertNoFullScan(
+            "book_api.get_availability_calendar", book_api.get_availability_calendar, json.dumps(books),
+            from_date=add_days(nowdate(), -30), to_date=add_days(nowdate(), 60),
+        )
+
+    # ---------------- loan_api ----------------
+
+    def test_loan_api_plans(self):
+        self.assertNoFullScan("loan_api.get_loans", loan_api.get_loans)
+        self.assertNoFullScan(
+            "loan_api.get_loans (member, overdue)", loan_api.get_loans,
+            filters={"member": self.active_loan.member, "overdue": 1}, sort_by="return_date",
+        )
+        self.assertNoFullScan("loan_api.get_books_on_loan", loan_api.get_books_on_loan)
+        self.assertNoFullScan(
+            "loan_api.get_loans_by_id", loan_api.get_loans_by_id,
+            json.dumps([f"{PREFIX}LOAN-{i:06d}" for i in range(0, LOANS, 60)]), expand=["book", "member"],
+        )
+        self.assertNoFullScan("loan_api.get_overdue_books", loan_api.get_overdue_books)
+
+        frappe.local.form_dict = frappe._dict(data=json.dumps({
+            "book": self.active_loan.book,
+            "member": self.active_loan.member,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 14),
+        }))
+        self.assertNoFullScan("loan_api.create_loan", loan_api.create_loan)
+
+        frappe.local.form_dict = frappe._dict(
+            loan_id=f"{PREFIX}LOAN-000001", data=json.dumps({"book": self.active_loan.book})
+        )
+        self.assertNoFullScan("loan_api.update_loan", loan_api.update_loan)
+
+    def test_loan_validate_plan(self):
+        doc = frappe.get_doc({
+            "doctype": "Loan",
+            "book": self.active_loan.book,
+            "member": self.active_loan.member,
+            "loan_date": nowdate(),
+            "return_date": add_days(nowdate(), 14),
+        })
+        self.assertNoFullScan("Loan.validate", doc.validate)
+
+    # ---------------- member_api ----------------
+
+    def test_member_api_plans(self):
+        self.assertNoFullScan("member_api.get_members", member_api.get_members)
+        self.assertNoFullScan(
+            "member_api.get_members_by_id", member_api.get_members_by_id,
+            [f"{PREFIX}MEM-{i:05d}" for i in range(0, MEMBERS, 3)],
+        )
+        first = member_api.get_members(page_length=20)
+        self.assertNoFullScan(
+            "member_api.get_members (next page)", member_api.get_members,
+            cursor=first["next_cursor"], page_length=20,
+        )
+        self.assertNoFullScan("member_api.search_members (name)", member_api.search_members, "member qp")
+        self.assertNoFullScan("member_api.search_members (email)", member_api.search_members, self.member_email)
+
+    # ---------------- reservation_api ----------------
+
+    def test_reservation_api_plans(self):
+        self.assertNoFullScan("reservation_api.get_reservations", reservation_api.get_reservations)
+        self.assertNoFullScan("reservation_api.get_reservation", reservation_api.get_reservation, self.reservation)
+        self.assertNoFullScan(
+            "reservation_api.get_reservations_by_id", reservation_api.get_reservations_by_id,
+            [f"{PREFIX}RES-{i:05d}" for i in range(0, RESERVATIONS, 6)], expand="book,member",
+        )
+        self.assertNoFullScan("reservation_api.get_waitlist", reservation_api.get_waitlist, self.active_loan.book)
+        # Behind reservation_api.get_my_queue_position
+        self.assertNoFullScan("waitlist.get_position", waitlist.get_position, self.reservation)
+        self.assertNoFullScan("reservation_api.create_reservation", reservation_api.create_reservation, {
+            "book": self.active_loan.book,
+            "member": f"{PREFIX}MEM-00001",
+        })
+
+    def test_member_reservation_plans(self):
+        frappe.set_user(self.member_email)
+        self.assertNoFullScan("reservation_api.get_my_reservations", reservation_api.get_my_reservations)
+        self.assertNoFullScan(
+            "reservation_api.create_my_reservation", reservation_api.create_my_reservation, self.active_loan.book
+        )
+        self.assertNoFullScan(
+            "reservation_api.cancel_my_reservation", reservation_api.cancel_my_reservation, self.reservation
+        )
+
+    def test_reservation_validate_plan(self):
+        doc = frappe.get_doc({
+            "doctype": "Reservation",
+            "book": self.active_loan.book,
+            "member": f"{PREFIX}MEM-00001",
+            "reservation_date": nowdate(),
+        })
+        self.assertNoFullScan("Reservation.validate", doc.validate)
+
+    # ---------------- sync_api ----------------
+
+    def test_sync_api_plans(self):
+        since = str(add_to_date(now_datetime(), hours=-1))
+        for doctype in sync_api.FEEDS:
+            token = change_feed.encode_token(doctype, None, {
+                "modified": since, "name": "", "deleted": since, "round": None,
+            })
+            self.assertNoFullScan(f"sync_api.get_changes ({doctype})", sync_api.get_changes, doctype)
+            self.assertNoFullScan(
+                f"sync_api.get_changes ({doctype}, token)", sync_api.get_changes, doctype, sync_token=token
+            )
+
+        frappe.set_user(self.member_email)
+        self.assertNoFullScan("sync_api.get_changes (member loans)", sync_api.get_changes, "Loan")
+
+    # ---------------- report_api ----------------
+
+    def test_report_api_plans(self):
+        # Start cold so the report queries actually run.
+        report_cache.invalidate()
+        self.assertNoFullScan("report_api.get_current_loans", report_api.get_current_loans)
+        self.assertNoFullScan("report_api.get_overdue_loans", report_api.get_overdue_loans)
+        # export_member_loans_csv / export_loans_csv wrap this in a file response.
+        self.assertNoFullScan(
+            "loan_export.write_loans_csv (member)",
+            write_loans_csv, io.StringIO(), member=self.active_loan.member,
+        )
+        self.assertNoFullScan(
+            "loan_export.write_loans_csv (date range)",
+            write_loans_csv, io.StringIO(), from_date=add_days(nowdate(), -7), to_date=nowdate(),
+        )
+        self.assertNoFullScan("report_api.get_member_loans", report_api.get_member_loans, self.member_email)
+        self.assertNoFullScan("dashboard_api.get_dashboard_summary", dashboard_api.get_dashboard_summary)
+
+    def test_overdue_notification_plan(self):
+        # Flags loans and writes the shard watermark; tearDown rolls both back.
+        with patch("frappe.sendmail"), patch.object(frappe.db, "commit"):
+            self.assertNoFullScan("overdue_notification.send_overdue_shard", send_overdue_shard, 0, 1)
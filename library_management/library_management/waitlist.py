@@ -0,0 +1,203 @@
+# file: library_management/waitlist.py
+#
+# Per-book reservation waitlist.
+#
+# Each Reservation gets a `queue_seq` from a per-book counter on Book at
+# insert time. Sequence numbers only ever grow, so cancelling a reservation
+# leaves a gap instead of renumbering the queue. A member's place in line is
+# the number of Waiting entries with a smaller sequence for the same book,
+# which is an index-only range count on (book, status, queue_seq) bounded by
+# the length of that one book's queue.
+#
+# When a book stops being on loan, the head of its queue is promoted to
+# Ready in the same transaction as the Loan write. A Ready reservation holds
+# the book for its member until it is borrowed (Fulfilled), cancelled, or
+# left uncollected for `reservation_hold_days` (site config), after which it
+# is Expired and the next member in line is promoted.
+
+import frappe
+from frappe.utils import add_days, cint, now, nowdate
+
+from library_management import report_cache
+from library_management.availability import get_active_loan
+
+WAITING = "Waiting"
+READY = "Ready"
+FULFILLED = "Fulfilled"
+EXPIRED = "Expired"
+ACTIVE_STATUSES = (WAITING, READY)
+
+# Days a Ready reservation holds the book before it expires
+HOLD_DAYS = 3
+
+
+def next_sequence(book):
+    """Atomically allocate the next queue sequence number for `book`.
+
+    The counter row is locked by the UPDATE until commit, so concurrent
+    reservations for the same book get distinct, increasing numbers.
+    """
+    frappe.db.sql("""
+        UPDATE `tabBook`
+        SET `waitlist_seq` = LAST_INSERT_ID(IFNULL(`waitlist_seq`, 0) + 1)
+        WHERE `name` = %s
+    """, (book,))
+    return frappe.db.sql("SELECT LAST_INSERT_ID()")[0][0]
+
+
+def get_position(reservation):
+    """Return the 1-based place in line of a Waiting reservation, 0 if Ready, None otherwise."""
+    row = frappe.db.get_value("Reservation", reservation, ["book", "status", "queue_seq"], as_dict=True)
+    if not row or row.status not in ACTIVE_STATUSES:
+        return None
+    if row.status == READY:
+        return 0
+
+    ahead = frappe.db.sql("""
+        SELECT COUNT(*)
+        FROM `tabReservation`
+        WHERE `book` = %s AND `status` = %s AND `queue_seq` < %s
+    """, (row.book, WAITING, row.queue_seq))[0][0]
+    return ahead + 1
+
+
+def get_ready_reservation(book):
+    """Return {name, member} of the reservation currently holding `book`, if any."""
+    return frappe.db.get_value(
+        "Reservation", {"book": book, "status": READY}, ["name", "member"], as_dict=True
+    )
+
+
+def get_ready_holds(books):
+    """Return {book: member} for every book in `books` held by a Ready reservation (one query)."""
+    books = tuple(set(books))
+    if not books:
+        return {}
+    return dict(frappe.db.sql("""
+        SELECT `book`, `member`
+        FROM `tabReservation`
+        WHERE `book` IN %(books)s AND `status` = %(status)s
+    """, {"books": books, "status": READY}))
+
+
+def promote_next(book, exclude_reservation=None):
+    """Move the head of `book`'s queue to Ready if the book is free and not already held.
+
+    Returns the promoted reservation name, or None.
+    """
+    if not book or get_active_loan(book):
+        return None
+
+    ready = get_ready_reservation(book)
+    if ready and ready.name != exclude_reservation:
+        return None
+
+    head = frappe.db.sql("""
+        SELECT `name`
+        FROM `tabReservation`
+        WHERE `book` = %(book)s AND `status` = %(status)s AND `name` != %(exclude)s
+        ORDER BY `queue_seq` ASC
+        LIMIT 1
+        FOR UPDATE
+    """, {"book": book, "status": WAITING, "exclude": exclude_reservation or ""})
+    if not head:
+        return None
+
+    frappe.db.set_value("Reservation", head[0][0], {"status": READY, "ready_date": nowdate()})
+    return head[0][0]
+
+
+def hold_days():
+    return cint(frappe.conf.get("reservation_hold_days")) or HOLD_DAYS
+
+
+def fulfil(pairs):
+    """Mark active reservations as Fulfilled for each (book, member) that has just borrowed the book."""
+    pairs = list(set(pairs))
+    if not pairs:
+        return
+    conditions = " OR ".join(["(`book` = %s AND `member` = %s)"] * len(pairs))
+    frappe.db.sql(f"""
+        UPDATE `tabReservation`
+        SET `status` = %s, `modified` = %s
+        WHERE `status` IN %s AND ({conditions})
+    """, [FULFILLED, now(), ACTIVE_STATUSES, *(v for pair in pairs for v in pair)])
+
+
+def promote_lapsed_loans():
+    """Daily job: promote queues of books whose loan has run out.
+
+    Loans end by their return date passing, which fires no doc_event. Every
+    free book with people waiting and nobody Ready is picked up, whether
+    `refresh_lapsed_availability` has already cleared its loan or it is still
+    past its due date, so a day the scheduler missed is caught up.
+    """
+    books = frappe.db.sql_list("""
+        SELECT DISTINCT r.`book`
+        FROM `tabReservation` r
+        JOIN `tabBook` b ON b.`name` = r.`book`
+        WHERE r.`status` = %(waiting)s
+            AND (b.`current_loan` IS NULL OR b.`due_date` < %(today)s)
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabReservation` h WHERE h.`book` = r.`book` AND h.`status` = %(ready)s
+            )
+    """, {"waiting": WAITING, "ready": READY, "today": nowdate()})
+    for book in books:
+        promote_next(book)
+    frappe.db.commit()
+
+
+def expire_ready_holds():
+    """Daily job: expire Ready reservations left uncollected and promote the next in line.
+
+    A hold made ready on day D is kept through D + hold_days(). Ready rows from
+    before `ready_date` was recorded count from their last modification.
+    """
+    rows = frappe.db.sql("""
+        SELECT `name`, `book`
+        FROM `tabReservation`
+        WHERE `status` = %(ready)s AND IFNULL(`ready_date`, DATE(`modified`)) < %(cutoff)s
+        FOR UPDATE
+    """, {"ready": READY, "cutoff": add_days(nowdate(), -hold_days())})
+    if not rows:
+        return
+
+    frappe.db.sql("""
+        UPDATE `tabReservation`
+        SET `status` = %s, `modified` = %s
+        WHERE `name` IN %s
+    """, (EXPIRED, now(), tuple(r[0] for r in rows)))
+    for book in {r[1] for r in rows}:
+        promote_next(book)
+    report_cache.invalidate(report_cache.DASHBOARD_SUMMARY)
+    frappe.db.commit()
+
+
+# ---------------- doc_events ----------------
+
+def on_loan_update(doc, method=None):
+    if get_active_loan(doc.book):
+        fulfil([(doc.book, doc.member)])
+    else:
+        promote_next(doc.book)
+
+    previous = doc.get_doc_before_save()
+    if previous and previous.book and previous.book != doc.book:
+        promote_next(previous.book)
+
+
+def on_loan_end(doc, method=None):
+    # on_cancel / on_trash: availability has already been refreshed.
+    promote_next(doc.book)
+
+
+def on_reservation_update(doc, method=None):
+    # A Ready reservation moved to another book releases its hold on the old one.
+    previous = doc.get_doc_before_save()
+    if previous and previous.status == READY and previous.book != doc.book:
+        promote_next(previous.book)
+
+
+def on_reservation_trash(doc, method=None):
+    if doc.status == READY:
+        promote_next(doc.book, exclude_reservation=doc.name)